@@ -1,20 +1,73 @@
-from fastapi import FastAPI, APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, CollectionInvalid, DuplicateKeyError, OperationFailure
+from bson import Binary
+import bson
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, EmailStr, ConfigDict, ValidationError
+from typing import List, Optional, Dict, Any, Tuple, Callable, Awaitable
+from collections import Counter, OrderedDict, deque
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+import time
 import json
+import hashlib
+import hmac
+import base64
 import tempfile
+import io
+import html
+import abc
+import functools
+import contextlib
+import contextvars
+import cProfile
+import pstats
+import sys
+import heapq
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import escape as xml_escape
+from urllib.parse import parse_qsl
+import sqlite3
+import threading
 import asyncio
+import math
+import random
+import re
+import zlib
 import httpx
+import requests
 import resend
+from resend.exceptions import ResendError
+
+try:
+    import zstandard
+except ImportError:  # Large resume sections are stored uncompressed without it
+    zstandard = None
+
+try:
+    from reportlab import platypus
+    from reportlab.lib import pagesizes, styles as reportlab_styles
+except ImportError:  # PDF export is unavailable without it
+    platypus = None
+
+try:
+    import docx
+    from docx.shared import Pt, Inches
+except ImportError:  # DOCX export is unavailable without it
+    docx = None
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # Only needed for CACHE_BACKEND=redis
+    redis_asyncio = None
 
 # Import AI integration
 from emergentintegrations.llm.chat import FileContentWithMimeType, LlmChat, UserMessage
@@ -26,6 +79,8 @@ load_dotenv(ROOT_DIR / '.env')
 mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
+# Scratch database for `python server.py benchmark-storage`, kept apart from application data
+BENCHMARK_DB_NAME = os.environ.get('BENCHMARK_DB_NAME', f"{os.environ['DB_NAME']}_benchmark")
 
 # Create the main app without a prefix
 app = FastAPI()
@@ -44,6 +99,98 @@ ADZUNA_APP_KEY = os.environ.get('ADZUNA_APP_KEY')
 if not ADZUNA_APP_ID or not ADZUNA_APP_KEY:
     raise ValueError("ADZUNA_APP_ID and ADZUNA_APP_KEY environment variables are required")
 
+# Adzuna country endpoints to register as job sources, e.g. "us,gb,ca"
+ADZUNA_COUNTRIES = [country.strip().lower() for country in os.environ.get('ADZUNA_COUNTRIES', 'us').split(',') if country.strip()]
+DEFAULT_JOB_SOURCES = [source.strip() for source in os.environ.get('DEFAULT_JOB_SOURCES', 'adzuna').split(',') if source.strip()]
+JOB_INGEST_CONCURRENCY = int(os.environ.get('JOB_INGEST_CONCURRENCY', 4))
+JOB_INGEST_TIMEOUT_SECONDS = float(os.environ.get('JOB_INGEST_TIMEOUT_SECONDS', 20))
+
+# Background job crawler; disabled by default so only one deployment runs it
+CRAWLER_ENABLED = os.environ.get('CRAWLER_ENABLED', 'false').lower() == 'true'
+CRAWLER_POLL_SECONDS = float(os.environ.get('CRAWLER_POLL_SECONDS', 60))
+CRAWLER_LEASE_SECONDS = int(os.environ.get('CRAWLER_LEASE_SECONDS', 900))  # A crawl whose worker died is re-run after this
+
+# How long hybrid job search waits for remote results before answering with local hits only
+HYBRID_SEARCH_REMOTE_WAIT_SECONDS = float(os.environ.get('HYBRID_SEARCH_REMOTE_WAIT_SECONDS', 1.5))
+
+# External provider resilience: per-call timeouts, circuit breaker and LLM request hedging
+GEMINI_TIMEOUT_SECONDS = float(os.environ.get('GEMINI_TIMEOUT_SECONDS', 60))
+ADZUNA_TIMEOUT_SECONDS = float(os.environ.get('ADZUNA_TIMEOUT_SECONDS', 15))
+RESEND_TIMEOUT_SECONDS = float(os.environ.get('RESEND_TIMEOUT_SECONDS', 30))
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', 5))  # Consecutive failures that open the circuit
+CIRCUIT_RESET_SECONDS = float(os.environ.get('CIRCUIT_RESET_SECONDS', 30))
+LLM_HEDGE_ENABLED = os.environ.get('LLM_HEDGE_ENABLED', 'false').lower() == 'true'
+LLM_HEDGE_PERCENTILE = float(os.environ.get('LLM_HEDGE_PERCENTILE', 0.95))
+LLM_HEDGE_MIN_SAMPLES = int(os.environ.get('LLM_HEDGE_MIN_SAMPLES', 20))
+
+# Cache tier shared by request handlers: memory (per worker), disk (per host) or redis (shared)
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory').lower()
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 10000))
+CACHE_DIR = os.environ.get('CACHE_DIR', tempfile.gettempdir())
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+CACHE_KEY_PREFIX = os.environ.get('CACHE_KEY_PREFIX', 'resume-app')
+ANALYSIS_CACHE_TTL_SECONDS = float(os.environ.get('ANALYSIS_CACHE_TTL_SECONDS', 300))
+JOB_SEARCH_CACHE_TTL_SECONDS = float(os.environ.get('JOB_SEARCH_CACHE_TTL_SECONDS', 60))
+
+# Resume export rendering; set RESUME_ATTACHMENT_FORMAT empty to send applications without a file
+RESUME_EXPORT_WORKERS = int(os.environ.get('RESUME_EXPORT_WORKERS', 2))
+RESUME_EXPORT_CACHE_DAYS = int(os.environ.get('RESUME_EXPORT_CACHE_DAYS', 30))
+RESUME_ATTACHMENT_FORMAT = os.environ.get('RESUME_ATTACHMENT_FORMAT', 'pdf')
+RESUME_ATTACHMENT_TEMPLATE = os.environ.get('RESUME_ATTACHMENT_TEMPLATE', 'classic')
+
+# Bulk user data export: documents fetched per cursor batch and NDJSON bytes buffered per streamed chunk
+USER_EXPORT_BATCH_SIZE = int(os.environ.get('USER_EXPORT_BATCH_SIZE', 500))
+USER_EXPORT_CHUNK_BYTES = int(os.environ.get('USER_EXPORT_CHUNK_BYTES', 64 * 1024))
+
+# Requirement extraction at ingest; bump JOB_EXTRACTION_VERSION when the extractor changes to re-extract stored jobs
+JOB_EXTRACTION_VERSION = 2
+JOB_REQUIREMENTS_MAX = int(os.environ.get('JOB_REQUIREMENTS_MAX', 12))
+JOB_EXTRACTION_BACKFILL_ENABLED = os.environ.get('JOB_EXTRACTION_BACKFILL_ENABLED', 'true').lower() == 'true'
+JOB_EXTRACTION_BACKFILL_BATCH = int(os.environ.get('JOB_EXTRACTION_BACKFILL_BATCH', 500))
+
+# Optional JSON file of extra skills, {"Canonical Name": ["synonym", ...]}, merged into SKILL_TAXONOMY
+SKILL_TAXONOMY_FILE = os.environ.get('SKILL_TAXONOMY_FILE')
+
+# Conditional GETs: how long a worker trusts its own record of a resource's ETag.
+# Writes made through other workers become visible once the entry expires.
+ETAG_VERSION_MAP_TTL_SECONDS = float(os.environ.get('ETAG_VERSION_MAP_TTL_SECONDS', 5))
+GZIP_MINIMUM_SIZE = int(os.environ.get('GZIP_MINIMUM_SIZE', 1024))
+
+# Admission control for LLM-backed routes
+ADMISSION_CONTROL_ENABLED = os.environ.get('ADMISSION_CONTROL_ENABLED', 'true').lower() == 'true'
+ADMISSION_GLOBAL_LIMIT = int(os.environ.get('ADMISSION_GLOBAL_LIMIT', 8))  # Concurrent expensive requests per worker
+ADMISSION_PER_USER_LIMIT = int(os.environ.get('ADMISSION_PER_USER_LIMIT', 2))
+ADMISSION_QUEUE_SIZE = int(os.environ.get('ADMISSION_QUEUE_SIZE', 64))
+ADMISSION_PER_USER_QUEUE_SIZE = int(os.environ.get('ADMISSION_PER_USER_QUEUE_SIZE', 8))
+ADMISSION_MAX_WAIT_SECONDS = float(os.environ.get('ADMISSION_MAX_WAIT_SECONDS', 20))
+ADMISSION_BODY_PEEK_BYTES = 65536  # JSON bodies up to this size are read for their user_id
+
+# Request profiling: requests carrying X-Profile, or a sample of them while enabled from the admin API.
+# The admin endpoints and the X-Profile header only work when ADMIN_TOKEN is set, and require it.
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'false').lower() == 'true'
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0.01))
+PROFILING_BACKEND = os.environ.get('PROFILING_BACKEND', 'spans')  # spans, sampler or cprofile
+PROFILING_SAMPLER_INTERVAL_MS = float(os.environ.get('PROFILING_SAMPLER_INTERVAL_MS', 5))
+PROFILING_TOP_ENTRIES = int(os.environ.get('PROFILING_TOP_ENTRIES', 40))  # Functions or stacks kept per profile
+PROFILE_STORE_BYTES = int(os.environ.get('PROFILE_STORE_BYTES', 64 * 1024 * 1024))  # Size of the capped request_profiles collection
+
+# Token budgets for the variable (resume/job) part of LLM prompts
+ANALYSIS_PROMPT_TOKEN_BUDGET = int(os.environ.get('ANALYSIS_PROMPT_TOKEN_BUDGET', 6000))
+COVER_LETTER_PROMPT_TOKEN_BUDGET = int(os.environ.get('COVER_LETTER_PROMPT_TOKEN_BUDGET', 2500))
+
+# Near-duplicate job detection
+NEAR_DUPLICATE_THRESHOLD = float(os.environ.get('NEAR_DUPLICATE_THRESHOLD', 0.7))
+JOB_DUPLICATE_INDEX_REFRESH_SECONDS = float(os.environ.get('JOB_DUPLICATE_INDEX_REFRESH_SECONDS', 60))
+# Jobs get created_at before they are written, so each refresh re-reads this far back for late commits
+JOB_DUPLICATE_INDEX_OVERLAP_SECONDS = float(os.environ.get('JOB_DUPLICATE_INDEX_OVERLAP_SECONDS', 300))
+
+# Stale job expiry: TTLs on the hot jobs collection and the archive/compaction schedule
+JOB_POSTING_TTL_DAYS = int(os.environ.get('JOB_POSTING_TTL_DAYS', 60))  # Counted from posted_date
+JOB_RETENTION_DAYS = int(os.environ.get('JOB_RETENTION_DAYS', 90))  # Counted from created_at
+JOB_COMPACTION_ENABLED = os.environ.get('JOB_COMPACTION_ENABLED', 'true').lower() == 'true'
+JOB_COMPACTION_INTERVAL_SECONDS = float(os.environ.get('JOB_COMPACTION_INTERVAL_SECONDS', 3600))
+
 # Email configuration
 RESEND_API_KEY = os.environ.get('RESEND_API_KEY')
 SENDER_EMAIL = os.environ.get('SENDER_EMAIL', 'noreply@emergent.com')
@@ -52,6 +199,33 @@ if not RESEND_API_KEY:
 
 resend.api_key = RESEND_API_KEY
 
+# Email outbox dispatcher configuration
+OUTBOX_DISPATCHER_ENABLED = os.environ.get('OUTBOX_DISPATCHER_ENABLED', 'true').lower() == 'true'
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', 20))
+OUTBOX_CONCURRENCY = int(os.environ.get('OUTBOX_CONCURRENCY', 4))
+OUTBOX_RATE_PER_SECOND = float(os.environ.get('OUTBOX_RATE_PER_SECOND', 2))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 6))
+OUTBOX_LEASE_SECONDS = int(os.environ.get('OUTBOX_LEASE_SECONDS', 120))
+OUTBOX_POLL_INTERVAL = float(os.environ.get('OUTBOX_POLL_INTERVAL', 2))
+OUTBOX_BACKOFF_BASE_SECONDS = float(os.environ.get('OUTBOX_BACKOFF_BASE_SECONDS', 30))
+OUTBOX_BACKOFF_MAX_SECONDS = float(os.environ.get('OUTBOX_BACKOFF_MAX_SECONDS', 3600))
+
+# Email event webhook: events are buffered and applied as bulk counter updates every flush interval
+RESEND_WEBHOOK_SECRET = os.environ.get('RESEND_WEBHOOK_SECRET')  # whsec_... signing secret; the webhook is disabled when unset
+# Local development only: accept unsigned events when no secret is configured
+RESEND_WEBHOOK_ALLOW_UNSIGNED = os.environ.get('RESEND_WEBHOOK_ALLOW_UNSIGNED', 'false').lower() == 'true'
+EMAIL_EVENT_FLUSH_SECONDS = float(os.environ.get('EMAIL_EVENT_FLUSH_SECONDS', 2))
+EMAIL_EVENT_BUFFER_MAX = int(os.environ.get('EMAIL_EVENT_BUFFER_MAX', 5000))  # Buffered events that trigger an early flush
+EMAIL_WEBHOOK_TOLERANCE_SECONDS = int(os.environ.get('EMAIL_WEBHOOK_TOLERANCE_SECONDS', 300))
+
+# Compact resume/analysis storage
+RESUME_COMPRESSION_MIN_BYTES = int(os.environ.get('RESUME_COMPRESSION_MIN_BYTES', 2048))
+ANALYSIS_HISTORY_FULL = int(os.environ.get('ANALYSIS_HISTORY_FULL', 5))  # Newest analyses kept in full
+ANALYSIS_HISTORY_MAX = int(os.environ.get('ANALYSIS_HISTORY_MAX', 30))  # Analyses kept per resume in total
+
+# Company directory refresh interval when change streams are unavailable
+COMPANY_DIRECTORY_REFRESH_SECONDS = float(os.environ.get('COMPANY_DIRECTORY_REFRESH_SECONDS', 60))
+
 # Resume Models (existing)
 class ResumeContent(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -65,9 +239,64 @@ class ResumeContent(BaseModel):
     projects: List[Dict[str, Any]] = Field(default_factory=list)
     languages: List[Dict[str, str]] = Field(default_factory=list)
     additional_sections: Dict[str, Any] = Field(default_factory=dict)
+    version: int = 1
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+# Typed resume subdocuments used by the storage codec; unknown keys are kept
+class PersonalInfo(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    name: str = ""
+    email: str = ""
+    phone: str = ""
+    address: str = ""
+    linkedin: str = ""
+    github: str = ""
+
+class ExperienceEntry(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    title: str = ""
+    company: str = ""
+    location: str = ""
+    start_date: str = ""
+    end_date: str = ""
+    description: str = ""
+    achievements: List[str] = Field(default_factory=list)
+
+class EducationEntry(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    degree: str = ""
+    institution: str = ""
+    location: str = ""
+    graduation_date: str = ""
+    gpa: str = ""
+
+class CertificationEntry(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    name: str = ""
+    issuer: str = ""
+    date: str = ""
+
+class ProjectEntry(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    name: str = ""
+    description: str = ""
+    technologies: List[str] = Field(default_factory=list)
+    date: str = ""
+
+class LanguageEntry(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    name: str = ""
+    proficiency: str = ""
+
+class ResumeHistoryEntry(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    resume_id: str
+    version: int  # Version produced by this change
+    changed_sections: List[str] = Field(default_factory=list)
+    diff: Dict[str, Any] = Field(default_factory=dict)  # Reverse diffs, one per changed section
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
 class ResumeAnalysis(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     resume_id: str
@@ -78,6 +307,10 @@ class ResumeAnalysis(BaseModel):
     suggestions: List[str] = Field(default_factory=list)
     keyword_optimization: Dict[str, Any] = Field(default_factory=dict)
     section_scores: Dict[str, float] = Field(default_factory=dict)
+    section_results: Dict[str, Dict[str, Any]] = Field(default_factory=dict)  # Per-section score and feedback
+    section_hashes: Dict[str, str] = Field(default_factory=dict)  # Content hash of each section when it was scored
+    reanalyzed_sections: List[str] = Field(default_factory=list)  # Sections sent to the LLM for this analysis
+    compacted: bool = False  # Older history entry reduced to scores only
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class CoverLetter(BaseModel):
@@ -87,6 +320,9 @@ class CoverLetter(BaseModel):
     company_name: str
     position_title: str
     content: str
+    resume_hash: Optional[str] = None  # Hash of the resume sections used in the prompt
+    job_hash: Optional[str] = None  # Hash of the job posting
+    prompt_version: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class JobPosting(BaseModel):
@@ -107,9 +343,17 @@ class JobListing(BaseModel):
     salary_currency: str = "USD"
     description: str
     requirements: List[str] = Field(default_factory=list)
+    seniority: Optional[str] = None  # One of SENIORITY_LEVELS, from the title or required experience
+    min_years_experience: Optional[int] = None
+    skills: List[str] = Field(default_factory=list)  # Canonical taxonomy skills
+    extraction_version: int = 0  # JOB_EXTRACTION_VERSION that filled requirements, seniority and skills
+    requirements_extracted: bool = False  # Requirements came from the extractor rather than the job source
     posted_date: datetime
     application_url: str
     source: str = "adzuna"  # Job board source
+    fingerprint: Optional[str] = None  # Content hash used to dedupe the same job across sources, never within one
+    minhash: List[int] = Field(default_factory=list, exclude=True)  # MinHash signature of the posting text, stored but never serialized
+    duplicate_of: Optional[str] = None  # Id of the first stored near-duplicate of this job
     created_at: datetime = Field(default_factory=datetime.utcnow)
     
 class JobApplication(BaseModel):
@@ -119,7 +363,7 @@ class JobApplication(BaseModel):
     job_id: str
     company_name: str
     position_title: str
-    status: str = "pending"  # pending, sent, rejected, accepted
+    status: str = "pending"  # pending, sent, delivered, opened, bounced, replied, failed, rejected, accepted
     cover_letter_id: Optional[str] = None
     application_date: datetime = Field(default_factory=datetime.utcnow)
     email_sent: bool = False
@@ -142,12 +386,81 @@ class EmailCampaign(BaseModel):
     email_subject: str
     email_template: str
     target_companies: List[str] = Field(default_factory=list)
+    position: str = "Open Position"
+    resume_id: Optional[str] = None  # Resume the applicant name is taken from; defaults to the user's latest
     status: str = "draft"  # draft, active, completed, paused
     emails_sent: int = 0
-    emails_opened: int = 0
+    emails_delivered: int = 0
+    emails_opened: int = 0  # Open events as reported, so repeated opens count again
+    emails_bounced: int = 0
     replies_received: int = 0
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+class OutboxEmail(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    application_id: Optional[str] = None
+    user_id: Optional[str] = None
+    applicant_name: str
+    company_name: str
+    position: str
+    cover_letter: str
+    recipient_emails: List[str]
+    status: str = "pending"  # pending, sending, sent, failed
+    attempts: int = 0
+    next_attempt_at: datetime = Field(default_factory=datetime.utcnow)
+    lease_expires_at: Optional[datetime] = None
+    locked_by: Optional[str] = None
+    last_error: Optional[str] = None
+    email_id: Optional[str] = None
+    sent_at: Optional[datetime] = None
+    attachment_key: Optional[str] = None  # db.resume_exports key of the attached resume
+    attachment_filename: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class SavedJobQuery(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str
+    keywords: str
+    location: Optional[str] = None
+    salary_min: Optional[float] = None
+    salary_max: Optional[float] = None
+    sources: List[str] = Field(default_factory=list)  # Empty means DEFAULT_JOB_SOURCES
+    max_results: int = 200  # Per source and run
+    interval_minutes: int = 60
+    enabled: bool = True
+    watermarks: Dict[str, datetime] = Field(default_factory=dict)  # Newest posted_date seen, per source
+    next_run_at: datetime = Field(default_factory=datetime.utcnow)
+    locked_by: Optional[str] = None  # Crawler worker running the query
+    lease_expires_at: Optional[datetime] = None
+    last_run_at: Optional[datetime] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class CrawlRun(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    query_id: str
+    query_name: str
+    started_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+    duration_ms: float = 0
+    pages_fetched: int = 0
+    jobs_fetched: int = 0
+    jobs_stored: int = 0
+    avg_page_latency_ms: float = 0
+    jobs_per_second: float = 0
+    errors: List[str] = Field(default_factory=list)
+
+class UserStats(BaseModel):
+    user_id: str
+    resumes: int = 0
+    analyses: int = 0
+    cover_letters: int = 0
+    applications_total: int = 0
+    applications_by_status: Dict[str, int] = Field(default_factory=dict)
+    application_emails_sent: int = 0
+    campaigns: int = 0
+    campaign_emails_sent: int = 0
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
 # Request/Response Models
 class ResumeCreateRequest(BaseModel):
     user_id: str
@@ -160,6 +473,18 @@ class ResumeCreateRequest(BaseModel):
     projects: Optional[List[Dict[str, Any]]] = None
     languages: Optional[List[Dict[str, str]]] = None
 
+class ResumePatchRequest(BaseModel):
+    personal_info: Optional[Dict[str, Any]] = None
+    summary: Optional[str] = None
+    experience: Optional[List[Dict[str, Any]]] = None
+    education: Optional[List[Dict[str, Any]]] = None
+    skills: Optional[List[str]] = None
+    certifications: Optional[List[Dict[str, Any]]] = None
+    projects: Optional[List[Dict[str, Any]]] = None
+    languages: Optional[List[Dict[str, str]]] = None
+    additional_sections: Optional[Dict[str, Any]] = None
+    base_version: Optional[int] = None  # Reject the patch if the stored version moved on
+
 class CoverLetterRequest(BaseModel):
     resume_id: str
     job_posting: JobPosting
@@ -170,19 +495,801 @@ class JobSearchRequest(BaseModel):
     salary_min: Optional[float] = None
     salary_max: Optional[float] = None
     limit: int = 20
+    sources: Optional[List[str]] = None  # Job source names, defaults to DEFAULT_JOB_SOURCES
+    collapse_duplicates: bool = True  # Return one job per near-duplicate group
+    max_days_old: Optional[int] = None
+    source: str = "remote"  # local: stored jobs only, remote: job boards, hybrid: both
+    page: int = 1  # Page of results, `limit` per page
+    seniority: Optional[List[str]] = None  # Keep jobs at these SENIORITY_LEVELS
+    max_years_experience: Optional[int] = None  # Keep jobs asking for at most this many years
+    skills: Optional[List[str]] = None  # Keep jobs that list every one of these skills
+
+class SavedJobQueryRequest(BaseModel):
+    name: str
+    keywords: str
+    location: Optional[str] = None
+    salary_min: Optional[float] = None
+    salary_max: Optional[float] = None
+    sources: List[str] = Field(default_factory=list)
+    max_results: int = 200
+    interval_minutes: int = 60
+
+class SkillExtractRequest(BaseModel):
+    text: str
+
+class ProfilingSettingsRequest(BaseModel):
+    enabled: Optional[bool] = None
+    sample_rate: Optional[float] = None  # Fraction of matching requests profiled while enabled
+    backend: Optional[str] = None  # One of PROFILING_BACKENDS
+    path_prefix: Optional[str] = None  # Only requests under this path are sampled
 
 class JobApplicationRequest(BaseModel):
     user_id: str
     resume_id: str
     job_ids: List[str]
     send_emails: bool = True
+    regenerate_cover_letters: bool = False
+    allow_duplicates: bool = False  # Apply even if the user already applied to a near-duplicate
 
 class EmailCampaignRequest(BaseModel):
     user_id: str
     campaign_name: str
     email_subject: str
-    email_template: str
+    email_template: str  # Plain text with {{ company }}, {{ contact_person }}, {{ position }} and {{ applicant_name }}
     target_companies: List[str]
+    position: str = "Open Position"
+    resume_id: Optional[str] = None
+
+# Resume sections that can be patched, diffed and cached independently
+RESUME_SECTIONS = (
+    "personal_info", "summary", "experience", "education", "skills",
+    "certifications", "projects", "languages", "additional_sections",
+)
+
+# Labels used when rendering resume sections into prompts
+RESUME_SECTION_LABELS = {
+    "personal_info": "Personal Information",
+    "summary": "Summary",
+    "experience": "Experience",
+    "education": "Education",
+    "skills": "Skills",
+    "certifications": "Certifications",
+    "projects": "Projects",
+    "languages": "Languages",
+    "additional_sections": "Additional Sections",
+}
+
+# Feedback lists kept per section and merged into the top-level analysis
+ANALYSIS_FEEDBACK_FIELDS = ("strengths", "weaknesses", "missing_information", "suggestions")
+
+# Bump when the cover letter prompt changes so cached letters are regenerated
+COVER_LETTER_PROMPT_VERSION = "2"
+
+# Resume sections that feed the cover letter prompt; edits elsewhere keep cached letters valid
+COVER_LETTER_RESUME_SECTIONS = ("personal_info", "summary", "skills", "experience", "education")
+
+# In-process cover letter cache counters, reported by /cover-letters/cache-stats
+cover_letter_cache_stats = {"hits": 0, "misses": 0, "regenerated": 0}
+
+# In-process prompt size counters per prompt kind, reported by /llm/prompt-stats
+prompt_size_stats: Dict[str, Dict[str, int]] = {}
+
+# Canonical skills by category with the synonyms that normalize to them. Terms are
+# matched case-insensitively on word boundaries; names that are also everyday words
+# go in AMBIGUOUS_SKILL_TERMS, which normalize but are not detected in free text.
+SKILL_TAXONOMY: Dict[str, Dict[str, Tuple[str, ...]]] = {
+    "language": {
+        "Python": ("python3",),
+        "JavaScript": ("js", "ecmascript", "es6"),
+        "TypeScript": (),
+        "Java": (),
+        "C++": ("cpp",),
+        "C#": ("csharp", "c sharp"),
+        "Go": ("golang",),
+        "Rust": (),
+        "Ruby": (),
+        "PHP": (),
+        "Kotlin": (),
+        "Swift": (),
+        "Scala": (),
+        "SQL": (),
+        "Bash": ("shell scripting",),
+    },
+    "frontend": {
+        "React": ("react.js", "reactjs"),
+        "Angular": ("angularjs", "angular.js"),
+        "Vue.js": ("vue", "vuejs"),
+        "HTML": ("html5",),
+        "CSS": ("css3",),
+        "Tailwind CSS": ("tailwind",),
+        "Redux": (),
+    },
+    "backend": {
+        "Node.js": ("nodejs",),
+        "Django": (),
+        "Flask": (),
+        "FastAPI": (),
+        "Spring Boot": ("spring", "spring framework"),
+        "Ruby on Rails": ("rails",),
+        "Express.js": ("express", "expressjs"),
+        ".NET": ("dotnet", "asp.net"),
+        "GraphQL": (),
+        "REST APIs": ("restful", "rest api", "restful apis"),
+        "Microservices": ("microservice",),
+    },
+    "data": {
+        "Pandas": (),
+        "NumPy": (),
+        "Machine Learning": ("ml",),
+        "Deep Learning": (),
+        "TensorFlow": (),
+        "PyTorch": (),
+        "scikit-learn": ("sklearn",),
+        "Data Analysis": ("data analytics",),
+        "Spark": ("apache spark", "pyspark"),
+        "Tableau": (),
+        "Power BI": ("powerbi",),
+        "Excel": ("microsoft excel",),
+        "NLP": ("natural language processing",),
+    },
+    "database": {
+        "PostgreSQL": ("postgres",),
+        "MySQL": (),
+        "MongoDB": ("mongo",),
+        "Redis": (),
+        "Elasticsearch": ("elastic search",),
+        "DynamoDB": (),
+    },
+    "cloud": {
+        "AWS": ("amazon web services",),
+        "Azure": ("microsoft azure",),
+        "Google Cloud": ("gcp", "google cloud platform"),
+    },
+    "devops": {
+        "Docker": (),
+        "Kubernetes": ("k8s",),
+        "Terraform": (),
+        "CI/CD": ("continuous integration", "continuous delivery", "continuous deployment"),
+        "Git": ("github", "gitlab"),
+        "Linux": ("unix",),
+        "Jenkins": (),
+        "Ansible": (),
+    },
+    "practice": {
+        "Agile": ("scrum", "kanban"),
+        "Project Management": (),
+        "Product Management": (),
+        "Test Automation": ("automated testing",),
+        "System Design": (),
+        "SEO": ("search engine optimization",),
+        "UX Design": ("user experience", "ux"),
+        "Figma": (),
+    },
+    "soft": {
+        "Communication": ("communication skills",),
+        "Leadership": ("team leadership",),
+        "Stakeholder Management": (),
+        "Problem Solving": ("problem-solving",),
+    },
+}
+
+AMBIGUOUS_SKILL_TERMS = {"go", "rust", "swift", "spring", "express", "excel", "rails"}
+
+# Application statuses that count as a response from the employer
+APPLICATION_RESPONSE_STATUSES = ["replied", "interview", "accepted", "rejected"]
+
+# Request profiling
+PROFILING_BACKENDS = ("spans", "sampler", "cprofile")
+
+class StackSampler:
+    """Samples the event loop thread's stack from a background thread
+
+    The loop thread is shared, so samples include whatever else it ran while
+    the profiled request was in flight.
+    """
+
+    def __init__(self, thread_id: int):
+        self.thread_id = thread_id
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        while not self.stopped.wait(PROFILING_SAMPLER_INTERVAL_MS / 1000):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < 64:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "samples": self.samples,
+            "interval_ms": PROFILING_SAMPLER_INTERVAL_MS,
+            "stacks": [{"stack": stack, "samples": count} for stack, count in self.stacks.most_common(PROFILING_TOP_ENTRIES)],
+        }
+
+# cProfile installs a process-wide hook and the sampler runs a thread, so each profiles one request at a time
+cprofile_lock = threading.Lock()
+sampler_lock = threading.Lock()
+
+class RequestProfile:
+    """Timed spans of one request, plus a stack or function profile from the chosen backend"""
+
+    def __init__(self, method: str, path: str, backend: str, trigger: str):
+        self.id = str(uuid.uuid4())
+        self.method = method
+        self.path = path
+        self.backend = backend if backend in PROFILING_BACKENDS else "spans"
+        self.trigger = trigger
+        self.started_at = datetime.utcnow()
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.spans: List[Dict[str, Any]] = []
+        self.sampler: Optional[StackSampler] = None
+        self.profiler: Optional[cProfile.Profile] = None
+
+    def start(self):
+        if self.backend == "sampler":
+            if sampler_lock.acquire(blocking=False):
+                self.sampler = StackSampler(threading.get_ident())
+                self.sampler.start()
+            else:
+                self.backend = "spans"
+        elif self.backend == "cprofile":
+            if cprofile_lock.acquire(blocking=False):
+                try:
+                    self.profiler = cProfile.Profile()
+                    self.profiler.enable()
+                except ValueError:  # Another profiler, such as a debugger, holds the hook
+                    self.profiler = None
+                    cprofile_lock.release()
+                    self.backend = "spans"
+            else:
+                self.backend = "spans"
+
+    def stop(self):
+        self.duration = time.perf_counter() - self.started
+        if self.sampler is not None:
+            self.sampler.stop()
+            sampler_lock.release()
+        if self.profiler is not None:
+            self.profiler.disable()
+            cprofile_lock.release()
+
+    def add_span(self, name: str, started: float, ended: float):
+        if len(self.spans) < 1000:
+            self.spans.append({
+                "name": name,
+                "start_ms": round((started - self.started) * 1000, 3),
+                "duration_ms": round((ended - started) * 1000, 3),
+            })
+
+    def functions(self) -> List[Dict[str, Any]]:
+        stats = pstats.Stats(self.profiler).stats
+        top = heapq.nlargest(PROFILING_TOP_ENTRIES, stats.items(), key=lambda item: item[1][3])
+        return [{
+            "function": f"{name} ({os.path.basename(filename)}:{line})",
+            "calls": calls,
+            "total_ms": round(total * 1000, 3),
+            "cumulative_ms": round(cumulative * 1000, 3),
+        } for (filename, line, name), (_, calls, total, cumulative, _) in top]
+
+    def to_document(self, status_code: int) -> Dict[str, Any]:
+        span_totals: Dict[str, Dict[str, float]] = {}
+        for span in self.spans:
+            totals = span_totals.setdefault(span["name"], {"count": 0, "total_ms": 0.0})
+            totals["count"] += 1
+            totals["total_ms"] = round(totals["total_ms"] + span["duration_ms"], 3)
+        document = {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status_code": status_code,
+            "trigger": self.trigger,
+            "backend": self.backend,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3),
+            "spans": self.spans,
+            "span_totals": span_totals,
+        }
+        if self.sampler is not None:
+            document["sampler"] = self.sampler.report()
+        if self.profiler is not None:
+            document["functions"] = self.functions()
+        return document
+
+current_profile: contextvars.ContextVar[Optional[RequestProfile]] = contextvars.ContextVar("current_profile", default=None)
+
+@contextlib.contextmanager
+def profile_span(name: str):
+    """Time a block, usually one await, into the current request's profile; does nothing when not profiling"""
+    profile = current_profile.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_span(name, started, time.perf_counter())
+
+# External provider guards
+class ProviderUnavailableError(HTTPException):
+    """Raised without calling a provider while its circuit is open"""
+
+    def __init__(self, provider: str, retry_after: float):
+        super().__init__(
+            status_code=503,
+            detail=f"{provider} is temporarily unavailable",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+        self.provider = provider
+
+# Transport errors of the clients behind the guards: httpx for job boards, requests inside the Resend SDK
+PROVIDER_TRANSPORT_ERRORS = (
+    httpx.TransportError, requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+    ConnectionError, TimeoutError
+)
+
+def provider_error_status(error: Exception) -> Optional[int]:
+    """HTTP status a provider error carries, if any"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code
+    if isinstance(error, ResendError):
+        status = error.code
+    else:
+        # The LLM client raises litellm's OpenAI-style exceptions, which carry status_code
+        status = getattr(error, "status_code", None)
+    try:
+        return int(status)
+    except (TypeError, ValueError):
+        return None
+
+def is_provider_failure(error: Exception) -> bool:
+    """Errors that say the provider is unhealthy: timeouts, connection errors, 5xx and 429
+
+    Rejected requests (other 4xx) and local bugs in the guarded call do not count,
+    so one bad email address or prompt cannot open the circuit for every user.
+    """
+    if isinstance(error, PROVIDER_TRANSPORT_ERRORS):
+        return True
+    status = provider_error_status(error)
+    return status is not None and (status >= 500 or status in (408, 429))
+
+class ProviderGuard:
+    """Timeout, circuit breaker and optional request hedging for one external provider
+
+    After `failure_threshold` consecutive failures the circuit opens and calls fail
+    fast for `reset_seconds`. Then one trial call is let through, and its outcome
+    closes or re-opens the circuit. Hedged calls start a second attempt once the
+    first has run longer than the provider's recent latency percentile.
+    """
+
+    def __init__(self, name: str, timeout: float):
+        self.name = name
+        self.timeout = timeout
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+        self.latencies = deque(maxlen=200)
+        self.stats = {"calls": 0, "failures": 0, "timeouts": 0, "rejected": 0, "hedged": 0, "hedge_wins": 0}
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= CIRCUIT_RESET_SECONDS:
+            return "half_open"
+        return "open"
+
+    def retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, CIRCUIT_RESET_SECONDS - (time.monotonic() - self.opened_at))
+
+    def hedge_delay(self) -> Optional[float]:
+        if len(self.latencies) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * LLM_HEDGE_PERCENTILE))]
+
+    def record_success(self, latency: float):
+        self.latencies.append(latency)
+        self.consecutive_failures = 0
+        if self.opened_at is not None:
+            logging.info(f"Circuit for {self.name} closed")
+        self.opened_at = None
+
+    def record_failure(self):
+        self.stats["failures"] += 1
+        self.consecutive_failures += 1
+        # A failed half-open trial re-opens the circuit for another reset period
+        if self.opened_at is not None or self.consecutive_failures >= CIRCUIT_FAILURE_THRESHOLD:
+            if self.opened_at is None:
+                logging.warning(f"Circuit for {self.name} opened after {self.consecutive_failures} failures")
+            self.opened_at = time.monotonic()
+
+    async def call(self, attempt: Callable[[], Awaitable[Any]], hedge: bool = False) -> Any:
+        """Run attempt() under the provider's timeout and circuit breaker"""
+        state = self.state
+        if state == "open" or (state == "half_open" and self.trial_in_flight):
+            self.stats["rejected"] += 1
+            raise ProviderUnavailableError(self.name, self.retry_after() or CIRCUIT_RESET_SECONDS)
+
+        trial = state == "half_open"
+        self.trial_in_flight = self.trial_in_flight or trial
+        self.stats["calls"] += 1
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(self.run_attempts(attempt, hedge and not trial), self.timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            self.record_failure()
+            raise HTTPException(status_code=504, detail=f"{self.name} did not respond within {self.timeout:.0f}s")
+        except Exception as e:
+            if is_provider_failure(e):
+                self.record_failure()
+            raise
+        finally:
+            if trial:
+                self.trial_in_flight = False
+        self.record_success(time.perf_counter() - started)
+        return result
+
+    async def run_attempts(self, attempt: Callable[[], Awaitable[Any]], hedge: bool) -> Any:
+        delay = self.hedge_delay() if hedge else None
+        if delay is None:
+            return await attempt()
+
+        first = asyncio.ensure_future(attempt())
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+
+        self.stats["hedged"] += 1
+        second = asyncio.ensure_future(attempt())
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+            # Both attempts failed; report the original one
+            return first.result()
+        finally:
+            first.cancel()
+            second.cancel()
+
+provider_guards: Dict[str, ProviderGuard] = {
+    "gemini": ProviderGuard("gemini", GEMINI_TIMEOUT_SECONDS),
+    "adzuna": ProviderGuard("adzuna", ADZUNA_TIMEOUT_SECONDS),
+    "resend": ProviderGuard("resend", RESEND_TIMEOUT_SECONDS),
+}
+
+# Cache backends
+class CacheBackend(abc.ABC):
+    """Async byte store with per-key TTLs and tag sets; keys and tags arrive fully qualified"""
+
+    @abc.abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abc.abstractmethod
+    async def set(self, key: str, value: bytes, ttl: Optional[float], tags: List[str]):
+        ...
+
+    @abc.abstractmethod
+    async def delete(self, key: str):
+        ...
+
+    @abc.abstractmethod
+    async def invalidate_tags(self, tags: List[str]) -> int:
+        """Drop every key stored under any of the tags; returns how many were dropped"""
+
+    async def close(self):
+        pass
+
+class MemoryCacheBackend(CacheBackend):
+    """LRU dict private to this worker"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: OrderedDict = OrderedDict()  # key -> (value, expires_at, tags)
+        self.tags: Dict[str, set] = {}
+
+    def remove(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry:
+            for tag in entry[2]:
+                keys = self.tags.get(tag)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self.tags[tag]
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.monotonic():
+            self.remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float], tags: List[str]):
+        self.remove(key)
+        self.entries[key] = (value, time.monotonic() + ttl if ttl else None, tuple(tags))
+        for tag in tags:
+            self.tags.setdefault(tag, set()).add(key)
+        while len(self.entries) > self.max_entries:
+            self.remove(next(iter(self.entries)))
+
+    async def delete(self, key: str):
+        self.remove(key)
+
+    async def invalidate_tags(self, tags: List[str]) -> int:
+        keys = set()
+        for tag in tags:
+            keys |= self.tags.get(tag, set())
+        for key in keys:
+            self.remove(key)
+        return len(keys)
+
+class DiskCacheBackend(CacheBackend):
+    """SQLite file shared by every worker on the host, evicted least-recently-used"""
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.local = threading.local()
+
+    def connection(self) -> sqlite3.Connection:
+        # asyncio.to_thread runs on pool threads, each with its own connection
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB, expires_at REAL, accessed_at REAL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS tags (tag TEXT, key TEXT, PRIMARY KEY (tag, key))")
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+            self.local.conn = conn
+        return conn
+
+    def get_sync(self, key: str) -> Optional[bytes]:
+        conn = self.connection()
+        now = time.time()
+        row = conn.execute("SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] is not None and row[1] <= now:
+            self.delete_sync(key)
+            return None
+        conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def set_sync(self, key: str, value: bytes, ttl: Optional[float], tags: List[str]):
+        conn = self.connection()
+        now = time.time()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl if ttl else None, now)
+            )
+            conn.execute("DELETE FROM tags WHERE key = ?", (key,))
+            conn.executemany("INSERT OR IGNORE INTO tags (tag, key) VALUES (?, ?)", [(tag, key) for tag in tags])
+            excess = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed_at LIMIT ?)", (excess,)
+                )
+                conn.execute("DELETE FROM tags WHERE key NOT IN (SELECT key FROM entries)")
+
+    def delete_sync(self, key: str):
+        conn = self.connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            conn.execute("DELETE FROM tags WHERE key = ?", (key,))
+
+    def invalidate_tags_sync(self, tags: List[str]) -> int:
+        conn = self.connection()
+        placeholders = ",".join("?" * len(tags))
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            keys = [row[0] for row in conn.execute(f"SELECT DISTINCT key FROM tags WHERE tag IN ({placeholders})", tags)]
+            conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in keys])
+            conn.executemany("DELETE FROM tags WHERE key = ?", [(key,) for key in keys])
+        return len(keys)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self.get_sync, key)
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float], tags: List[str]):
+        await asyncio.to_thread(self.set_sync, key, value, ttl, tags)
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self.delete_sync, key)
+
+    async def invalidate_tags(self, tags: List[str]) -> int:
+        if not tags:
+            return 0
+        return await asyncio.to_thread(self.invalidate_tags_sync, tags)
+
+class RedisCacheBackend(CacheBackend):
+    """Any server speaking the Redis protocol; tags are Redis sets of keys"""
+
+    def __init__(self, url: str):
+        if redis_asyncio is None:
+            raise RuntimeError("CACHE_BACKEND=redis requires the redis package")
+        self.client = redis_asyncio.from_url(url)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float], tags: List[str]):
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.set(key, value, px=int(ttl * 1000) if ttl else None)
+            for tag in tags:
+                pipe.sadd(tag, key)
+                if ttl:
+                    # Tag sets outlive their newest key only briefly
+                    pipe.expire(tag, math.ceil(ttl))
+            await pipe.execute()
+
+    async def delete(self, key: str):
+        await self.client.delete(key)
+
+    async def invalidate_tags(self, tags: List[str]) -> int:
+        keys = set()
+        for tag in tags:
+            keys |= await self.client.smembers(tag)
+        if keys or tags:
+            await self.client.delete(*keys, *tags)
+        return len(keys)
+
+    async def close(self):
+        await self.client.close()
+
+def create_cache_backend() -> CacheBackend:
+    if CACHE_BACKEND == "disk":
+        return DiskCacheBackend(os.path.join(CACHE_DIR, f"{CACHE_KEY_PREFIX}-cache.sqlite3"), CACHE_MAX_ENTRIES)
+    if CACHE_BACKEND == "redis":
+        return RedisCacheBackend(CACHE_REDIS_URL)
+    return MemoryCacheBackend(CACHE_MAX_ENTRIES)
+
+def cache_json_default(value: Any) -> str:
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+class Cache:
+    """Namespaced JSON cache over a backend
+
+    Backend errors are logged and treated as misses, so a cache outage only costs
+    latency. Stats are counted per namespace in this worker.
+    """
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    def key(self, namespace: str, key: str) -> str:
+        return f"{CACHE_KEY_PREFIX}:{namespace}:{key}"
+
+    def tag(self, namespace: str, tag: str) -> str:
+        return f"{CACHE_KEY_PREFIX}:{namespace}#tag:{tag}"
+
+    def count(self, namespace: str, counter: str, amount: int = 1):
+        stats = self.stats.setdefault(
+            namespace, {"hits": 0, "misses": 0, "sets": 0, "deletes": 0, "invalidated": 0, "errors": 0}
+        )
+        stats[counter] += amount
+
+    async def get(self, namespace: str, key: str) -> Optional[Any]:
+        try:
+            value = await self.backend.get(self.key(namespace, key))
+        except Exception as e:
+            logging.warning(f"Cache get failed for {namespace}: {str(e)}")
+            self.count(namespace, "errors")
+            return None
+        self.count(namespace, "hits" if value is not None else "misses")
+        return json.loads(value) if value is not None else None
+
+    async def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None, tags: Tuple[str, ...] = ()):
+        try:
+            await self.backend.set(
+                self.key(namespace, key),
+                json.dumps(value, separators=(",", ":"), default=cache_json_default).encode("utf-8"),
+                ttl,
+                [self.tag(namespace, tag) for tag in tags]
+            )
+            self.count(namespace, "sets")
+        except Exception as e:
+            logging.warning(f"Cache set failed for {namespace}: {str(e)}")
+            self.count(namespace, "errors")
+
+    async def delete(self, namespace: str, key: str):
+        try:
+            await self.backend.delete(self.key(namespace, key))
+            self.count(namespace, "deletes")
+        except Exception as e:
+            logging.warning(f"Cache delete failed for {namespace}: {str(e)}")
+            self.count(namespace, "errors")
+
+    async def invalidate(self, namespace: str, *tags: str):
+        try:
+            dropped = await self.backend.invalidate_tags([self.tag(namespace, tag) for tag in tags])
+            self.count(namespace, "invalidated", dropped)
+        except Exception as e:
+            logging.warning(f"Cache invalidation failed for {namespace}: {str(e)}")
+            self.count(namespace, "errors")
+
+cache = Cache(create_cache_backend())
+
+# Conditional GET helpers
+class VersionMap:
+    """Recently served ETags by resource key, so unchanged resources can get a 304 without a read"""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.entries: OrderedDict = OrderedDict()  # key -> (etag, recorded_at)
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[1] > ETAG_VERSION_MAP_TTL_SECONDS:
+            del self.entries[key]
+            return None
+        return entry[0]
+
+    def set(self, key: str, etag: str):
+        self.entries[key] = (etag, time.monotonic())
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def discard(self, key: str):
+        self.entries.pop(key, None)
+
+    def discard_prefix(self, prefix: str):
+        for key in [key for key in self.entries if key.startswith(prefix)]:
+            del self.entries[key]
+
+resource_versions = VersionMap()
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Weak comparison of If-None-Match against an ETag"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    strip = lambda tag: tag.strip().removeprefix("W/")
+    return strip(etag) in {strip(tag) for tag in header.split(",")}
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+def set_etag(response: Response, etag: str):
+    # no-cache makes browsers revalidate with If-None-Match instead of reusing stale copies
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
 
 # Helper Functions
 async def create_ai_chat(session_id: str) -> LlmChat:
@@ -200,163 +1307,1345 @@ async def create_ai_chat(session_id: str) -> LlmChat:
 Always provide specific, actionable advice and maintain a professional tone."""
     ).with_model("gemini", "gemini-2.0-flash")
 
-async def search_jobs_adzuna(keywords: str, location: str = None, salary_min: float = None, limit: int = 20) -> List[Dict]:
-    """Search for jobs using Adzuna API"""
-    try:
-        base_url = "https://api.adzuna.com/v1/api/jobs/us/search/1"
+async def send_llm_message(session_id: str, message: UserMessage, hedge: bool = LLM_HEDGE_ENABLED) -> str:
+    """Send one prompt to Gemini through its provider guard and return the response text
+
+    Every attempt uses its own chat so a hedged duplicate does not share history.
+    """
+    async def attempt() -> str:
+        chat = await create_ai_chat(session_id)
+        response = await chat.send_message(message)
+        return response if isinstance(response, str) else response.text
+
+    with profile_span("llm.gemini"):
+        return await provider_guards["gemini"].call(attempt, hedge=hedge)
+
+class JobSource(abc.ABC):
+    """A job board that can be searched one page at a time
+
+    Results are plain dicts with the JobListing fields; `name` is stored in
+    JobListing.source.
+    """
+    name = ""
+    provider = ""  # Key into provider_guards; sources without one are called unguarded
+    page_size = 50
+
+    @abc.abstractmethod
+    async def fetch_page(self, http_client: httpx.AsyncClient, search: JobSearchRequest, page: int, per_page: int) -> List[Dict]:
+        ...
+
+class AdzunaJobSource(JobSource):
+    """Adzuna search for one country endpoint"""
+    provider = "adzuna"
+    page_size = 50  # Adzuna's maximum results_per_page
+
+    def __init__(self, country: str = "us"):
+        self.country = country
+        # US results keep the original source name so existing documents still dedupe
+        self.name = "adzuna" if country == "us" else f"adzuna-{country}"
+
+    async def fetch_page(self, http_client: httpx.AsyncClient, search: JobSearchRequest, page: int, per_page: int) -> List[Dict]:
+        base_url = f"https://api.adzuna.com/v1/api/jobs/{self.country}/search/{page}"
         params = {
             "app_id": ADZUNA_APP_ID,
             "app_key": ADZUNA_APP_KEY,
-            "what": keywords,
-            "results_per_page": limit,
+            "what": search.keywords,
+            "results_per_page": per_page,
             "sort_by": "date"
         }
         
-        if location:
-            params["where"] = location
-        if salary_min:
-            params["salary_min"] = int(salary_min)
-            
-        async with httpx.AsyncClient() as client:
-            response = await client.get(base_url, params=params)
-            response.raise_for_status()
-            
-            data = response.json()
-            jobs = []
-            
-            for job in data.get("results", []):
-                job_data = {
-                    "external_id": str(job.get("id", "")),
-                    "title": job.get("title", ""),
-                    "company": job.get("company", {}).get("display_name", ""),
-                    "location": job.get("location", {}).get("display_name", ""),
-                    "salary_min": job.get("salary_min"),
-                    "salary_max": job.get("salary_max"),
-                    "description": job.get("description", ""),
-                    "posted_date": datetime.fromisoformat(job.get("created").replace("Z", "+00:00")) if job.get("created") else datetime.utcnow(),
-                    "application_url": job.get("redirect_url", ""),
-                    "source": "adzuna"
-                }
-                jobs.append(job_data)
-            
-            return jobs
+        if search.location:
+            params["where"] = search.location
+        if search.salary_min:
+            params["salary_min"] = int(search.salary_min)
+        if search.salary_max:
+            params["salary_max"] = int(search.salary_max)
+        if search.max_days_old:
+            params["max_days_old"] = search.max_days_old
             
-    except Exception as e:
-        logging.error(f"Error searching jobs: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error searching jobs: {str(e)}")
-
-async def send_job_application_email(applicant_name: str, company_name: str, position: str, cover_letter: str, recipient_emails: List[str]) -> Dict:
-    """Send job application email using Resend"""
-    try:
-        html_content = f"""
-        <html>
-            <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-                <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                    <h2 style="color: #2c3e50;">Job Application: {position}</h2>
-                    
-                    <p>Dear {company_name} Hiring Team,</p>
-                    
-                    <p>I hope this email finds you well. My name is {applicant_name}, and I am writing to express my strong interest in the <strong>{position}</strong> position at {company_name}.</p>
-                    
-                    <div style="background-color: #f8f9fa; padding: 15px; border-left: 4px solid #007bff; margin: 20px 0;">
-                        <h3 style="margin-top: 0; color: #007bff;">Cover Letter</h3>
-                        <p>{cover_letter}</p>
-                    </div>
-                    
-                    <p>I have attached my resume for your review and would welcome the opportunity to discuss how my skills and experience align with your team's needs.</p>
-                    
-                    <p>Thank you for considering my application. I look forward to hearing from you.</p>
-                    
-                    <p>Best regards,<br>
-                    <strong>{applicant_name}</strong></p>
-                    
-                    <hr style="margin: 30px 0; border: none; border-top: 1px solid #eee;">
-                    <p style="font-size: 12px; color: #666;">
-                        This email was sent via our job application platform. 
-                        If you received this in error, please disregard.
-                    </p>
-                </div>
-            </body>
-        </html>
-        """
+        response = await http_client.get(base_url, params=params)
+        response.raise_for_status()
         
-        params = {
-            "from": f"{applicant_name} <{SENDER_EMAIL}>",
-            "to": recipient_emails,
-            "subject": f"Application for {position} Position - {applicant_name}",
-            "html": html_content,
-        }
+        data = response.json()
+        jobs = []
         
-        email = resend.Emails.send(params)
-        return email
+        for job in data.get("results", []):
+            job_data = {
+                "external_id": str(job.get("id", "")),
+                "title": job.get("title", ""),
+                "company": job.get("company", {}).get("display_name", ""),
+                "location": job.get("location", {}).get("display_name", ""),
+                "salary_min": job.get("salary_min"),
+                "salary_max": job.get("salary_max"),
+                "description": job.get("description", ""),
+                "posted_date": datetime.fromisoformat(job.get("created").replace("Z", "+00:00")) if job.get("created") else datetime.utcnow(),
+                "application_url": job.get("redirect_url", ""),
+                "source": self.name
+            }
+            jobs.append(job_data)
         
-    except Exception as e:
-        logging.error(f"Error sending email: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error sending email: {str(e)}")
+        return jobs
 
-async def analyze_resume_with_ai(resume_content: ResumeContent) -> Dict[str, Any]:
-    """Analyze resume content using AI"""
-    try:
-        chat = await create_ai_chat(f"resume-analysis-{resume_content.id}")
-        
-        # Convert resume to text format for analysis
-        resume_text = f"""
-Personal Information: {json.dumps(resume_content.personal_info, indent=2)}
-Summary: {resume_content.summary}
-Experience: {json.dumps(resume_content.experience, indent=2)}
-Education: {json.dumps(resume_content.education, indent=2)}
-Skills: {', '.join(resume_content.skills)}
-Certifications: {json.dumps(resume_content.certifications, indent=2)}
-Projects: {json.dumps(resume_content.projects, indent=2)}
-Languages: {json.dumps(resume_content.languages, indent=2)}
-Additional Sections: {json.dumps(resume_content.additional_sections, indent=2)}
-"""
+async def fetch_source_page(http_client: httpx.AsyncClient, source: JobSource, search: JobSearchRequest, page: int, per_page: int) -> List[Dict]:
+    """Fetch one page through the source's provider guard"""
+    guard = provider_guards.get(source.provider)
+    if guard is None:
+        return await source.fetch_page(http_client, search, page, per_page)
+    return await guard.call(lambda: source.fetch_page(http_client, search, page, per_page))
 
-        analysis_prompt = f"""
-Analyze this resume and provide a comprehensive assessment in JSON format with the following structure:
-{{
-    "ats_score": <score from 0-100>,
-    "strengths": [<list of strengths>],
-    "weaknesses": [<list of weaknesses>],
-    "missing_information": [<list of missing critical information>],
-    "suggestions": [<list of specific improvement suggestions>],
-    "keyword_optimization": {{
+# Registered job sources by name
+job_sources: Dict[str, JobSource] = {}
+for adzuna_country in ADZUNA_COUNTRIES:
+    adzuna_source = AdzunaJobSource(adzuna_country)
+    job_sources[adzuna_source.name] = adzuna_source
+
+def to_naive_utc(value: datetime) -> datetime:
+    """Drop tzinfo after converting to UTC, matching how Mongo returns datetimes"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def job_fingerprint(job: Dict) -> str:
+    """Content fingerprint of a posting that is stable across job boards
+
+    Distinct openings with the same title at the same company and location share
+    a fingerprint, so it only matches jobs from other sources; within a source,
+    (source, external_id) identifies a posting.
+    """
+    def normalize(text: str) -> str:
+        return " ".join(re.sub(r"[^a-z0-9]+", " ", (text or "").lower()).split())
+    return section_content_hash([
+        normalize(job.get("title", "")),
+        normalize_company_name(job.get("company", "")),
+        normalize(job.get("location", "")),
+    ])
+
+# MinHash with 64 permutations split into 16 LSH bands of 4 rows
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16
+LSH_ROWS = MINHASH_PERMUTATIONS // LSH_BANDS
+MINHASH_PRIME = (1 << 61) - 1
+minhash_random = random.Random(1361)
+MINHASH_COEFFICIENTS = [
+    (minhash_random.randrange(1, MINHASH_PRIME), minhash_random.randrange(0, MINHASH_PRIME))
+    for _ in range(MINHASH_PERMUTATIONS)
+]
+
+def job_shingles(job: Dict) -> set:
+    """Hashed word 3-grams of a posting's title, company and description"""
+    text = f"{job.get('title', '')} {job.get('company', '')} {job.get('description', '')}"
+    words = re.sub(r"[^a-z0-9]+", " ", text.lower()).split()
+    if len(words) < 3:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))}
+    return {zlib.crc32(" ".join(words[i:i + 3]).encode("utf-8")) for i in range(len(words) - 2)}
+
+def compute_minhash(job: Dict) -> List[int]:
+    """MinHash signature of a posting"""
+    shingles = job_shingles(job)
+    return [min((a * shingle + b) % MINHASH_PRIME for shingle in shingles) for a, b in MINHASH_COEFFICIENTS]
+
+def minhash_similarity(first: List[int], second: List[int]) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    if not first or len(first) != len(second):
+        return 0.0
+    return sum(1 for a, b in zip(first, second) if a == b) / len(first)
+
+SENIORITY_LEVELS = ("intern", "junior", "mid", "senior", "lead", "executive")
+SENIORITY_PATTERNS = [
+    ("executive", re.compile(r"\b(chief|cto|ceo|cfo|vp|vice president|director|head of)\b")),
+    ("lead", re.compile(r"\b(lead|principal|staff|architect|(?:engineering|software|development|technical|tech|team) manager)\b")),
+    ("senior", re.compile(r"\b(senior|sr\.?|snr)\b")),
+    ("intern", re.compile(r"\b(intern|internship|apprentice|trainee|placement)\b")),
+    ("junior", re.compile(r"\b(junior|jr\.?|graduate|entry[ -]level|associate)\b")),
+    ("mid", re.compile(r"\b(mid[ -]?level|intermediate)\b")),
+]
+YEARS_EXPERIENCE_RE = re.compile(
+    r"(\d{1,2})\s*\+?\s*(?:(?:-|–|to)\s*\d{1,2}\s*)?(?:years?|yrs?)\b(?:[^.;\n]{0,40}?\bexperience\b|\s+(?:of|in)\b)",
+    re.IGNORECASE
+)
+REQUIREMENTS_HEADING_RE = re.compile(
+    r"^\s*(requirements|qualifications|what you(?:'ll| will) (?:need|bring)|you(?:'ll)? have|skills(?: required)?|about you)\s*:?\s*$",
+    re.IGNORECASE
+)
+REQUIREMENT_BULLET_RE = re.compile(r"^\s*(?:[-*•·▪]|\d+[.)])\s+")
+REQUIREMENT_CUE_RE = re.compile(
+    r"\b(experience|required|must|proficien\w*|degree|knowledge of|familiar\w*|ability to|skills? in|understanding of|qualifi\w*)\b",
+    re.IGNORECASE
+)
+
+def extract_requirements(description: str) -> List[str]:
+    """Requirement lines of a posting: the bullets under a requirements heading, else sentences with requirement cues"""
+    lines = (description or "").splitlines()
+    requirements = []
+    in_section = False
+    for line in lines:
+        if REQUIREMENTS_HEADING_RE.match(line):
+            in_section = True
+        elif in_section and REQUIREMENT_BULLET_RE.match(line):
+            requirements.append(REQUIREMENT_BULLET_RE.sub("", line).strip())
+        elif in_section and line.strip() and requirements:
+            break
+    if not requirements:
+        requirements = [sentence for sentence in split_sentences(description) if REQUIREMENT_CUE_RE.search(sentence)]
+    return [truncate_to_tokens(requirement, 60) for requirement in requirements[:JOB_REQUIREMENTS_MAX]]
+
+def extract_years_experience(text: str) -> Optional[int]:
+    """Largest minimum of the experience ranges a posting asks for"""
+    years = [int(match.group(1)) for match in YEARS_EXPERIENCE_RE.finditer(text or "")]
+    years = [value for value in years if value <= 30]
+    return max(years) if years else None
+
+def extract_seniority(title: str, years: Optional[int]) -> Optional[str]:
+    """Seniority named in the title, else implied by the required years of experience"""
+    title = (title or "").lower()
+    for level, pattern in SENIORITY_PATTERNS:
+        if pattern.search(title):
+            return level
+    if years is None:
+        return None
+    return "junior" if years < 2 else "mid" if years < 5 else "senior"
+
+def extract_job_details(job: Dict) -> Dict[str, Any]:
+    """Requirements, seniority, years of experience and skills of a posting, computed once at ingest"""
+    description = job.get("description") or ""
+    # Jobs extracted before the flag existed only ever had extracted requirements
+    extracted = job.get("requirements_extracted", bool(job.get("extraction_version")))
+    source_requirements = [] if extracted else job.get("requirements") or []
+    requirements = source_requirements or extract_requirements(description)
+    years = extract_years_experience(description)
+    return {
+        "requirements": requirements,
+        "requirements_extracted": not source_requirements,
+        "seniority": extract_seniority(job.get("title", ""), years),
+        "min_years_experience": years,
+        "skills": skill_matcher.extract("\n".join([job.get("title") or "", description, *requirements])),
+        "extraction_version": JOB_EXTRACTION_VERSION,
+    }
+
+def prepare_job_listing(job_data: Dict) -> JobListing:
+    """Build a JobListing from source data with its dedupe fingerprint, MinHash and extracted details"""
+    return JobListing(**{**job_data, **extract_job_details(job_data)}, fingerprint=job_fingerprint(job_data), minhash=compute_minhash(job_data))
+
+async def backfill_job_details(batch_size: int = JOB_EXTRACTION_BACKFILL_BATCH) -> int:
+    """Extract details for stored jobs from before the current extractor, a batch at a time"""
+    updated = 0
+    while True:
+        jobs = await db.jobs.find(
+            {"extraction_version": {"$not": {"$gte": JOB_EXTRACTION_VERSION}}},
+            {"title": 1, "description": 1, "requirements": 1, "requirements_extracted": 1, "extraction_version": 1}
+        ).limit(batch_size).to_list(batch_size)
+        if not jobs:
+            return updated
+        await db.jobs.bulk_write([
+            UpdateOne({"_id": job["_id"]}, {"$set": extract_job_details(job)})
+            for job in jobs
+        ], ordered=False)
+        updated += len(jobs)
+        # Let request handlers in between batches
+        await asyncio.sleep(0)
+
+async def run_job_details_backfill():
+    try:
+        updated = await backfill_job_details()
+        if updated:
+            await cache.invalidate("job_search", "jobs")
+            logging.info(f"Extracted requirements for {updated} stored jobs")
+    except Exception as e:
+        logging.error(f"Error backfilling job details: {str(e)}")
+
+job_details_backfill_task: Optional[asyncio.Task] = None
+
+class JobDuplicateIndex:
+    """In-memory LSH index over job MinHash signatures
+
+    Candidate lookup is a handful of dict probes, so checking a job for
+    near-duplicates stays well under a millisecond. Jobs stored by other
+    workers are picked up by polling db.jobs by created_at, with an overlap
+    window for jobs that commit after newer ones.
+    """
+
+    def __init__(self):
+        self.buckets: Dict[Tuple[int, int], set] = {}
+        self.signatures: Dict[str, List[int]] = {}
+        self.canonical: Dict[str, str] = {}
+        self.groups: Dict[str, set] = {}
+        self.created: Dict[str, datetime] = {}
+        self.posted: Dict[str, datetime] = {}
+        self.loaded_until: Optional[datetime] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def band_keys(signature: List[int]):
+        for band in range(LSH_BANDS):
+            yield band, hash(tuple(signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]))
+
+    def add(
+        self, job_id: str, signature: List[int], canonical_id: Optional[str] = None,
+        created_at: Optional[datetime] = None, posted_date: Optional[datetime] = None
+    ):
+        if len(signature) != MINHASH_PERMUTATIONS or job_id in self.signatures:
+            return
+        canonical_id = canonical_id or job_id
+        self.signatures[job_id] = signature
+        self.created[job_id] = to_naive_utc(created_at or datetime.utcnow())
+        if posted_date:
+            self.posted[job_id] = to_naive_utc(posted_date)
+        self.canonical[job_id] = canonical_id
+        self.groups.setdefault(canonical_id, set()).add(job_id)
+        for key in self.band_keys(signature):
+            self.buckets.setdefault(key, set()).add(job_id)
+
+    def remove(self, job_id: str):
+        signature = self.signatures.pop(job_id, None)
+        if signature is None:
+            return
+        canonical_id = self.canonical.pop(job_id)
+        self.created.pop(job_id, None)
+        self.posted.pop(job_id, None)
+        self.groups.get(canonical_id, set()).discard(job_id)
+        if not self.groups.get(canonical_id, True):
+            del self.groups[canonical_id]
+        for key in self.band_keys(signature):
+            self.buckets.get(key, set()).discard(job_id)
+
+    def find_duplicate(self, signature: List[int]) -> Optional[str]:
+        """Canonical id of the most similar indexed job above NEAR_DUPLICATE_THRESHOLD"""
+        if len(signature) != MINHASH_PERMUTATIONS:
+            return None
+        candidates = set()
+        for key in self.band_keys(signature):
+            candidates |= self.buckets.get(key, set())
+        best_id, best_score = None, NEAR_DUPLICATE_THRESHOLD
+        for candidate in candidates:
+            score = minhash_similarity(signature, self.signatures[candidate])
+            if score >= best_score:
+                best_id, best_score = candidate, score
+        return self.canonical[best_id] if best_id else None
+
+    def prune(self, created_before: datetime, posted_before: datetime) -> int:
+        """Forget jobs that either jobs TTL, on created_at or posted_date, has already expired"""
+        expired = [
+            job_id for job_id, created_at in self.created.items()
+            if created_at < created_before or self.posted.get(job_id, created_before) < posted_before
+        ]
+        for job_id in expired:
+            self.remove(job_id)
+        return len(expired)
+
+    def canonical_id(self, job_id: str) -> str:
+        return self.canonical.get(job_id, job_id)
+
+    def duplicates_of(self, job_id: str) -> List[str]:
+        """Ids of every other job in the same near-duplicate group"""
+        return [other for other in self.groups.get(self.canonical_id(job_id), set()) if other != job_id]
+
+    async def backfill(self, batch_size: int = 500):
+        """Compute signatures for jobs stored before duplicate detection existed"""
+        while True:
+            jobs = await db.jobs.find(
+                {"minhash": {"$exists": False}},
+                {"id": 1, "title": 1, "company": 1, "description": 1}
+            ).limit(batch_size).to_list(batch_size)
+            if not jobs:
+                return
+            await db.jobs.bulk_write([
+                UpdateOne({"_id": job["_id"]}, {"$set": {"minhash": compute_minhash(job)}})
+                for job in jobs
+            ], ordered=False)
+
+    async def refresh(self):
+        query = {"minhash.0": {"$exists": True}}
+        if self.loaded_until:
+            # Another worker's job can commit after newer ones; re-read an overlap window, add() skips known ids
+            query["created_at"] = {"$gte": self.loaded_until - timedelta(seconds=JOB_DUPLICATE_INDEX_OVERLAP_SECONDS)}
+        cursor = db.jobs.find(
+            query, {"id": 1, "minhash": 1, "duplicate_of": 1, "created_at": 1, "posted_date": 1}
+        ).sort("created_at", 1)
+        async for job in cursor:
+            self.add(job["id"], job["minhash"], job.get("duplicate_of"), job["created_at"], job.get("posted_date"))
+            self.loaded_until = job["created_at"]
+
+    async def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.follow())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def follow(self):
+        try:
+            await self.backfill()
+        except Exception as e:
+            logging.error(f"Error backfilling job signatures: {str(e)}")
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Error refreshing job duplicate index: {str(e)}")
+            await asyncio.sleep(JOB_DUPLICATE_INDEX_REFRESH_SECONDS)
+
+job_duplicate_index = JobDuplicateIndex()
+
+def collapse_duplicate_jobs(jobs: List[JobListing]) -> List[JobListing]:
+    """Keep the first job of each near-duplicate group"""
+    seen = set()
+    collapsed = []
+    for job in jobs:
+        group = job.duplicate_of or job_duplicate_index.canonical_id(job.id)
+        if group not in seen:
+            seen.add(group)
+            collapsed.append(job)
+    return collapsed
+
+async def store_job_page(jobs: List[JobListing]) -> List[JobListing]:
+    """Upsert one page of jobs and return the stored documents
+
+    Jobs already stored, under the same (source, external_id) or the same
+    fingerprint from another source, come back as the stored copy so their
+    ids stay valid for /jobs/apply.
+    """
+    if not jobs:
+        return []
+
+    source = jobs[0].source
+    existing = {}
+    elsewhere = {}
+    async for doc in db.jobs.find({"$or": [
+        {"source": source, "external_id": {"$in": [job.external_id for job in jobs]}},
+        {"source": {"$ne": source}, "fingerprint": {"$in": [job.fingerprint for job in jobs]}}
+    ]}, {"minhash": 0}):
+        if doc["source"] == source:
+            existing[doc["external_id"]] = doc
+        else:
+            elsewhere.setdefault(doc["fingerprint"], doc)
+
+    stored = []
+    new_jobs = []
+    for job in jobs:
+        doc = existing.get(job.external_id) or elsewhere.get(job.fingerprint)
+        if doc:
+            stored.append(JobListing(**doc))
+        else:
+            # Link near-duplicates to the first stored copy, including earlier jobs of this page
+            job.duplicate_of = job_duplicate_index.find_duplicate(job.minhash)
+            job_duplicate_index.add(job.id, job.minhash, job.duplicate_of, job.created_at, job.posted_date)
+            new_jobs.append(job)
+
+    if new_jobs:
+        try:
+            result = await db.jobs.bulk_write([
+                UpdateOne(
+                    {"source": job.source, "external_id": job.external_id},
+                    {"$setOnInsert": {**job.dict(), "minhash": job.minhash}},
+                    upsert=True
+                )
+                for job in new_jobs
+            ], ordered=False)
+            upserted = set(result.upserted_ids)
+        except BulkWriteError as e:
+            # Concurrent upserts of the same job collide on the unique index; the other insert wins
+            if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                raise
+            upserted = {entry["index"] for entry in e.details["upserted"]}
+        if upserted:
+            await cache.invalidate("job_search", "jobs")
+            resource_versions.discard_prefix("jobs/recent:")
+        raced = [job for index, job in enumerate(new_jobs) if index not in upserted]
+        stored.extend(job for index, job in enumerate(new_jobs) if index in upserted)
+        # Another request inserted these between our read and write, use its copies
+        if raced:
+            for job in raced:
+                job_duplicate_index.remove(job.id)
+            async for doc in db.jobs.find({"source": source, "external_id": {"$in": [job.external_id for job in raced]}}, {"minhash": 0}):
+                stored.append(JobListing(**doc))
+    return stored
+
+async def ingest_jobs(search: JobSearchRequest) -> List[JobListing]:
+    """Fetch pages from every requested source concurrently, storing each page as it arrives"""
+    source_names = search.sources or DEFAULT_JOB_SOURCES
+    unknown = [name for name in source_names if name not in job_sources]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown job sources: {', '.join(unknown)}")
+
+    semaphore = asyncio.Semaphore(JOB_INGEST_CONCURRENCY)
+
+    async def fetch(http_client: httpx.AsyncClient, source: JobSource, page: int, per_page: int) -> List[JobListing]:
+        async with semaphore:
+            page_jobs = await fetch_source_page(http_client, source, search, page, per_page)
+        return [prepare_job_listing(job_data) for job_data in page_jobs]
+
+    async with httpx.AsyncClient(timeout=JOB_INGEST_TIMEOUT_SECONDS) as http_client:
+        tasks = []
+        for name in source_names:
+            source = job_sources[name]
+            per_page = min(search.limit, source.page_size)
+            # Each requested page of `limit` results maps onto the next run of source pages
+            pages_per_request = math.ceil(search.limit / per_page)
+            first_page = (max(search.page, 1) - 1) * pages_per_request + 1
+            for page in range(first_page, first_page + pages_per_request):
+                tasks.append(asyncio.ensure_future(fetch(http_client, source, page, per_page)))
+
+        jobs = []
+        seen = set()
+        fingerprint_sources = {}
+        failures = []
+        try:
+            for next_page in asyncio.as_completed(tasks):
+                try:
+                    page_jobs = await next_page
+                except Exception as e:
+                    logging.error(f"Error fetching job page: {str(e)}")
+                    failures.append(e)
+                    continue
+                fresh = []
+                for job in page_jobs:
+                    # Fingerprints only dedupe across sources; within one, external_id does
+                    if (job.source, job.external_id) in seen:
+                        continue
+                    if fingerprint_sources.setdefault(job.fingerprint, job.source) != job.source:
+                        continue
+                    seen.add((job.source, job.external_id))
+                    fresh.append(job)
+                jobs.extend(await store_job_page(fresh))
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    if tasks and len(failures) == len(tasks):
+        if isinstance(failures[0], HTTPException):
+            raise failures[0]
+        raise HTTPException(status_code=500, detail=f"Error searching jobs: {str(failures[0])}")
+
+    # Pages finish out of order; present the newest postings first
+    jobs.sort(key=lambda job: to_naive_utc(job.posted_date), reverse=True)
+    return jobs[:search.limit]
+
+def local_job_filter(search: JobSearchRequest) -> Dict[str, Any]:
+    """Mongo filter for searching stored jobs"""
+    query: Dict[str, Any] = {}
+    if search.keywords.strip():
+        query["$text"] = {"$search": search.keywords}
+    if search.location:
+        query["location"] = {"$regex": re.escape(search.location), "$options": "i"}
+    # Keep jobs whose salary range overlaps the requested one; jobs without salaries still match
+    if search.salary_min:
+        query["$and"] = query.get("$and", []) + [{"$or": [
+            {"salary_max": {"$gte": search.salary_min}},
+            {"salary_max": None}
+        ]}]
+    if search.salary_max:
+        query["$and"] = query.get("$and", []) + [{"$or": [
+            {"salary_min": {"$lte": search.salary_max}},
+            {"salary_min": None}
+        ]}]
+    if search.seniority:
+        query["seniority"] = {"$in": search.seniority}
+    # Jobs that do not state a number of years still match
+    if search.max_years_experience is not None:
+        query["$and"] = query.get("$and", []) + [{"$or": [
+            {"min_years_experience": {"$lte": search.max_years_experience}},
+            {"min_years_experience": None}
+        ]}]
+    if search.skills:
+        query["skills"] = {"$all": [skill_matcher.normalize(skill) for skill in search.skills]}
+    return query
+
+def filter_job_details(jobs: List[JobListing], search: JobSearchRequest) -> List[JobListing]:
+    """Apply the seniority, experience and skill filters of local_job_filter to fetched jobs"""
+    skills = {skill_matcher.normalize(skill) for skill in search.skills or []}
+    return [
+        job for job in jobs
+        if (not search.seniority or job.seniority in search.seniority)
+        and (search.max_years_experience is None or job.min_years_experience is None
+             or job.min_years_experience <= search.max_years_experience)
+        and skills.issubset(job.skills)
+    ]
+
+async def search_local_job_groups(query: Dict[str, Any], page: int, limit: int) -> Tuple[List[Dict[str, Any]], int]:
+    """One page of the best-ranked job of each near-duplicate group, and the number of groups
+
+    Groups are collapsed before skip/limit so pages stay full. Duplicates whose
+    first copy has expired still group together under its id.
+    """
+    order = {"score": -1, "posted_date": -1, "id": 1} if "$text" in query else {"posted_date": -1, "id": 1}
+    pipeline: List[Dict[str, Any]] = [{"$match": query}, {"$project": {"minhash": 0}}]
+    if "$text" in query:
+        pipeline.append({"$addFields": {"score": {"$meta": "textScore"}}})
+    pipeline += [
+        {"$sort": order},
+        {"$group": {"_id": {"$ifNull": ["$duplicate_of", "$id"]}, "job": {"$first": "$$ROOT"}}},
+        {"$replaceRoot": {"newRoot": "$job"}},
+        {"$sort": order},
+        {"$facet": {
+            "jobs": [{"$skip": (page - 1) * limit}, {"$limit": limit}],
+            "total": [{"$count": "count"}],
+        }},
+    ]
+    result = (await db.jobs.aggregate(pipeline, allowDiskUse=True).to_list(1))[0]
+    return result["jobs"], result["total"][0]["count"] if result["total"] else 0
+
+async def search_local_jobs(search: JobSearchRequest) -> Tuple[List[JobListing], int]:
+    """Ranked, paginated search over db.jobs using the text index; returns the page and total matches"""
+    cache_key = section_content_hash(local_job_filter(search) | {
+        "page": search.page, "limit": search.limit, "collapse": search.collapse_duplicates
+    })
+    cached = await cache.get("job_search", cache_key)
+    if cached is not None:
+        return [JobListing(**job) for job in cached["jobs"]], cached["total"]
+
+    query = local_job_filter(search)
+    page = max(search.page, 1)
+    if search.collapse_duplicates:
+        jobs, total = await search_local_job_groups(query, page, search.limit)
+    else:
+        if "$text" in query:
+            cursor = db.jobs.find(query, {"score": {"$meta": "textScore"}, "minhash": 0}).sort(
+                [("score", {"$meta": "textScore"}), ("posted_date", -1)]
+            )
+        else:
+            cursor = db.jobs.find(query, {"minhash": 0}).sort("posted_date", -1)
+        jobs, total = await asyncio.gather(
+            cursor.skip((page - 1) * search.limit).limit(search.limit).to_list(search.limit),
+            db.jobs.count_documents(query)
+        )
+    listings = [JobListing(**job) for job in jobs]
+    await cache.set(
+        "job_search", cache_key, {"jobs": [job.dict() for job in listings], "total": total},
+        ttl=JOB_SEARCH_CACHE_TTL_SECONDS, tags=("jobs",)
+    )
+    return listings, total
+
+# Remote ingestions that outlived a hybrid search request
+background_ingestions = set()
+
+def track_background_ingestion(task: asyncio.Task):
+    """Keep a reference to a detached ingestion and log its failure"""
+    background_ingestions.add(task)
+
+    def done(finished: asyncio.Task):
+        background_ingestions.discard(finished)
+        if not finished.cancelled() and finished.exception():
+            logging.error(f"Background job ingestion failed: {str(finished.exception())}")
+
+    task.add_done_callback(done)
+
+def merge_job_results(local_jobs: List[JobListing], remote_jobs: List[JobListing], limit: int) -> List[JobListing]:
+    """Local hits first, then remote jobs that are not already among them
+
+    Remote jobs are the stored copies, so a job known from another source already has its id.
+    """
+    seen = {job.id for job in local_jobs}
+    merged = list(local_jobs)
+    for job in remote_jobs:
+        if job.id not in seen:
+            merged.append(job)
+            seen.add(job.id)
+    return merged[:limit]
+
+TEMPLATE_VARIABLE_RE = re.compile(r"{{\s*([A-Za-z_][A-Za-z0-9_]*)\s*}}")
+
+def html_text(value: Any) -> str:
+    """Escape a plain-text value for HTML, keeping its line breaks"""
+    return html.escape(str(value)).replace("\n", "<br>\n")
+
+class EmailTemplate:
+    """A template compiled once into a str.format string with {{ variable }} slots
+
+    Rendering is a single format_map call. Literal text is used as written;
+    with html=True the substituted values are HTML-escaped.
+    """
+
+    def __init__(self, source: str, variables: Tuple[str, ...], html: bool = False):
+        pieces = TEMPLATE_VARIABLE_RE.split(source)
+        unknown = sorted({name for name in pieces[1::2] if name not in variables})
+        if unknown:
+            raise ValueError(f"Unknown template variables: {', '.join(unknown)}")
+        self.variables = variables
+        self.html = html
+        self.format_string = "".join(
+            "{" + piece + "}" if index % 2 else piece.replace("{", "{{").replace("}", "}}")
+            for index, piece in enumerate(pieces)
+        )
+
+    def render(self, values: Dict[str, Any]) -> str:
+        if self.html:
+            return self.format_string.format_map({name: html_text(values.get(name, "")) for name in self.variables})
+        return self.format_string.format_map({name: values.get(name, "") for name in self.variables})
+
+# Layout of application and campaign emails, compiled once at import
+APPLICATION_EMAIL_TEMPLATE = EmailTemplate('''
+        <html>
+            <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+                <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+                    <h2 style="color: #2c3e50;">Job Application: {{ position }}</h2>
+                    
+                    <p>Dear {{ company_name }} Hiring Team,</p>
+                    
+                    <p>I hope this email finds you well. My name is {{ applicant_name }}, and I am writing to express my strong interest in the <strong>{{ position }}</strong> position at {{ company_name }}.</p>
+                    
+                    <div style="background-color: #f8f9fa; padding: 15px; border-left: 4px solid #007bff; margin: 20px 0;">
+                        <h3 style="margin-top: 0; color: #007bff;">Cover Letter</h3>
+                        <p>{{ cover_letter }}</p>
+                    </div>
+                    
+                    <p>I have attached my resume for your review and would welcome the opportunity to discuss how my skills and experience align with your team's needs.</p>
+                    
+                    <p>Thank you for considering my application. I look forward to hearing from you.</p>
+                    
+                    <p>Best regards,<br>
+                    <strong>{{ applicant_name }}</strong></p>
+                    
+                    <hr style="margin: 30px 0; border: none; border-top: 1px solid #eee;">
+                    <p style="font-size: 12px; color: #666;">
+                        This email was sent via our job application platform. 
+                        If you received this in error, please disregard.
+                    </p>
+                </div>
+            </body>
+        </html>
+''', ("position", "company_name", "applicant_name", "cover_letter"), html=True)
+
+# Variables available to campaign subjects and bodies
+CAMPAIGN_TEMPLATE_VARIABLES = ("company", "contact_person", "position", "applicant_name")
+
+@functools.lru_cache(maxsize=256)
+def compile_campaign_template(source: str) -> EmailTemplate:
+    """Campaign subjects and bodies are plain text; they are escaped when placed in the email layout"""
+    return EmailTemplate(source, CAMPAIGN_TEMPLATE_VARIABLES)
+
+def validate_campaign_templates(subject: str, body: str):
+    """Compile a campaign's subject and body, rejecting unknown placeholders before anything is sent"""
+    try:
+        compile_campaign_template(subject)
+        compile_campaign_template(body)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+async def send_job_application_email(applicant_name: str, company_name: str, position: str, cover_letter: str, recipient_emails: List[str], attachments: Optional[List[Dict[str, Any]]] = None, subject: Optional[str] = None, tags: Optional[Dict[str, str]] = None, idempotency_key: Optional[str] = None) -> Dict:
+    """Send job application email using Resend; sends repeated with the same idempotency_key are delivered once"""
+    try:
+        html_content = APPLICATION_EMAIL_TEMPLATE.render({
+            "position": position,
+            "company_name": company_name,
+            "applicant_name": applicant_name,
+            "cover_letter": cover_letter,
+        })
+        
+        params = {
+            "from": f"{applicant_name} <{SENDER_EMAIL}>",
+            "to": recipient_emails,
+            "subject": subject or f"Application for {position} Position - {applicant_name}",
+            "html": html_content,
+        }
+        if attachments:
+            params["attachments"] = attachments
+        # Tags come back on webhook events and tie them to the application or campaign
+        if tags:
+            params["tags"] = [{"name": name, "value": value} for name, value in tags.items()]
+        
+        options = {"idempotency_key": idempotency_key} if idempotency_key else None
+        # The Resend SDK is synchronous, keep it off the event loop
+        email = await provider_guards["resend"].call(lambda: asyncio.to_thread(resend.Emails.send, params, options))
+        return email
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error sending email: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error sending email: {str(e)}")
+
+def user_stats_update(counters: Dict[str, int]) -> Dict[str, Any]:
+    """$inc update document for a user's dashboard counters"""
+    return {"$inc": counters, "$set": {"updated_at": datetime.utcnow()}}
+
+def user_stats_operation(user_id: str, counters: Dict[str, int]) -> UpdateOne:
+    """Counter update for use in bulk writes"""
+    return UpdateOne({"user_id": user_id}, user_stats_update(counters), upsert=True)
+
+async def increment_user_stats(user_id: str, counters: Dict[str, int]):
+    """Bump a user's dashboard counters at write time"""
+    await db.user_stats.update_one({"user_id": user_id}, user_stats_update(counters), upsert=True)
+
+async def compute_user_stats(user_id: str) -> UserStats:
+    """Count a user's data from the source collections"""
+    resume_ids = await db.resumes.distinct("id", {"user_id": user_id})
+    analyses, cover_letters, application_counts, campaign_totals = await asyncio.gather(
+        db.analyses.count_documents({"resume_id": {"$in": resume_ids}}),
+        db.cover_letters.count_documents({"resume_id": {"$in": resume_ids}}),
+        db.applications.aggregate([
+            {"$match": {"user_id": user_id}},
+            {"$group": {
+                "_id": "$status",
+                "count": {"$sum": 1},
+                "emails_sent": {"$sum": {"$cond": ["$email_sent", 1, 0]}}
+            }}
+        ]).to_list(None),
+        db.email_campaigns.aggregate([
+            {"$match": {"user_id": user_id}},
+            {"$group": {"_id": None, "count": {"$sum": 1}, "emails_sent": {"$sum": "$emails_sent"}}}
+        ]).to_list(1)
+    )
+    return UserStats(
+        user_id=user_id,
+        resumes=len(resume_ids),
+        analyses=analyses,
+        cover_letters=cover_letters,
+        applications_total=sum(entry["count"] for entry in application_counts),
+        applications_by_status={entry["_id"]: entry["count"] for entry in application_counts},
+        application_emails_sent=sum(entry["emails_sent"] for entry in application_counts),
+        campaigns=campaign_totals[0]["count"] if campaign_totals else 0,
+        campaign_emails_sent=campaign_totals[0]["emails_sent"] if campaign_totals else 0
+    )
+
+RESUME_ENTRY_MODELS = {
+    "experience": ExperienceEntry,
+    "education": EducationEntry,
+    "certifications": CertificationEntry,
+    "projects": ProjectEntry,
+    "languages": LanguageEntry,
+}
+
+def typed_resume_entry(model, entry: Any, compact: bool) -> Any:
+    """Validate one section entry against its typed model; entries that do not fit are kept as-is"""
+    if not isinstance(entry, dict):
+        return entry
+    try:
+        return model(**entry).dict(exclude_defaults=compact)
+    except ValidationError:
+        return entry
+
+def normalize_resume_section(section: str, value: Any, compact: bool = False) -> Any:
+    """Canonical form of a section; compact drops empty fields for storage"""
+    if section in RESUME_ENTRY_MODELS and isinstance(value, list):
+        return [typed_resume_entry(RESUME_ENTRY_MODELS[section], entry, compact) for entry in value]
+    if section == "personal_info" and isinstance(value, dict):
+        # Missing and empty personal details are equivalent, so neither form restores defaults
+        return {key: item for key, item in value.items() if item not in ("", None)}
+    return value
+
+def encode_resume_section(section: str, value: Any) -> Any:
+    """Storage form of a section: typed and compact, zstd-compressed when large"""
+    value = normalize_resume_section(section, value, compact=True)
+    if zstandard is not None and section != "personal_info":
+        serialized = json.dumps(value, separators=(",", ":"), default=str).encode("utf-8")
+        if len(serialized) >= RESUME_COMPRESSION_MIN_BYTES:
+            return {"_zstd": Binary(zstandard.ZstdCompressor(level=6).compress(serialized))}
+    return value
+
+def inflate_resume_section(value: Any) -> Any:
+    """Section value as stored, decompressed if it was stored compressed"""
+    if isinstance(value, dict) and "_zstd" in value:
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read compressed resume sections")
+        return json.loads(zstandard.ZstdDecompressor().decompress(bytes(value["_zstd"])))
+    return value
+
+def decode_resume_section(section: str, value: Any) -> Any:
+    """Inverse of encode_resume_section; also canonicalizes documents written before the codec"""
+    return normalize_resume_section(section, inflate_resume_section(value))
+
+def resume_to_document(resume: ResumeContent) -> Dict[str, Any]:
+    """Mongo document for a resume"""
+    document = resume.dict()
+    for section in RESUME_SECTIONS:
+        document[section] = encode_resume_section(section, document[section])
+    return document
+
+def decode_resume_document(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Resume fields from a Mongo document with every section decoded"""
+    decoded = dict(document)
+    for section in RESUME_SECTIONS:
+        if section in decoded:
+            decoded[section] = decode_resume_section(section, decoded[section])
+    return decoded
+
+def resume_from_document(document: Dict[str, Any]) -> ResumeContent:
+    return ResumeContent(**decode_resume_document(document))
+
+async def compact_analysis_history(resume_id: str, user_id: Optional[str]):
+    """Cap a resume's analysis history, keeping older entries at one score-only entry per day
+
+    Dropped entries come off the owner's analyses counter so it keeps matching a recount.
+    """
+    entries = await db.analyses.find(
+        {"resume_id": resume_id}, {"id": 1, "created_at": 1, "compacted": 1}
+    ).sort("created_at", -1).to_list(None)
+    if len(entries) <= ANALYSIS_HISTORY_FULL:
+        return
+
+    keep, drop = [], []
+    days = set()
+    for entry in entries[ANALYSIS_HISTORY_FULL:]:
+        day = entry["created_at"].date()
+        if day in days or ANALYSIS_HISTORY_FULL + len(keep) >= ANALYSIS_HISTORY_MAX:
+            drop.append(entry["id"])
+        else:
+            days.add(day)
+            keep.append(entry)
+
+    if drop:
+        result = await db.analyses.delete_many({"id": {"$in": drop}})
+        if user_id and result.deleted_count:
+            await increment_user_stats(user_id, {"analyses": -result.deleted_count})
+    to_compact = [entry["id"] for entry in keep if not entry.get("compacted")]
+    if to_compact:
+        await db.analyses.update_many(
+            {"id": {"$in": to_compact}},
+            {
+                "$set": {"compacted": True},
+                "$unset": {field: "" for field in (
+                    *ANALYSIS_FEEDBACK_FIELDS, "keyword_optimization",
+                    "section_results", "section_hashes", "reanalyzed_sections"
+                )}
+            }
+        )
+
+def diff_resume_section(old: Any, new: Any) -> Dict[str, Any]:
+    """Build a compact reverse diff that turns the new section value back into the old one"""
+    if isinstance(old, list) and isinstance(new, list):
+        # Only items that differ are kept, so appending a skill costs a few bytes
+        items = {str(i): old[i] for i in range(len(old)) if i >= len(new) or old[i] != new[i]}
+        return {"type": "list", "length": len(old), "items": items}
+    if isinstance(old, dict) and isinstance(new, dict):
+        changed = {key: value for key, value in old.items() if key not in new or new[key] != value}
+        return {"type": "dict", "set": changed, "unset": [key for key in new if key not in old]}
+    return {"type": "value", "value": old}
+
+def restore_resume_section(current: Any, diff: Dict[str, Any]) -> Any:
+    """Apply a reverse diff produced by diff_resume_section"""
+    if diff["type"] == "list":
+        current = current or []
+        return [
+            diff["items"].get(str(i), current[i] if i < len(current) else None)
+            for i in range(diff["length"])
+        ]
+    if diff["type"] == "dict":
+        restored = {key: value for key, value in (current or {}).items() if key not in diff["unset"]}
+        restored.update(diff["set"])
+        return restored
+    return diff["value"]
+
+async def apply_resume_patch(resume_id: str, sections: Dict[str, Any], base_version: Optional[int] = None) -> Tuple[ResumeContent, List[str]]:
+    """Write only the given sections in one round trip and record their diffs in resume_history"""
+    query = {"id": resume_id}
+    if base_version is not None:
+        query["version"] = base_version
+
+    if not sections:
+        resume = await db.resumes.find_one({"id": resume_id})
+        if not resume:
+            raise HTTPException(status_code=404, detail="Resume not found")
+        if base_version is not None and resume.get("version", 1) != base_version:
+            raise HTTPException(status_code=409, detail="Resume was modified by another request")
+        return resume_from_document(resume), []
+
+    sections = {section: normalize_resume_section(section, value) for section, value in sections.items()}
+    now = datetime.utcnow()
+    previous = await db.resumes.find_one_and_update(
+        query,
+        {
+            "$set": {
+                **{section: encode_resume_section(section, value) for section, value in sections.items()},
+                "updated_at": now
+            },
+            "$inc": {"version": 1}
+        },
+        return_document=ReturnDocument.BEFORE
+    )
+    if not previous:
+        if base_version is not None and await db.resumes.count_documents({"id": resume_id}, limit=1):
+            raise HTTPException(status_code=409, detail="Resume was modified by another request")
+        raise HTTPException(status_code=404, detail="Resume not found")
+    previous = decode_resume_document(previous)
+    resource_versions.discard(f"resume:{resume_id}")
+    resource_versions.discard_prefix(f"export:{resume_id}:")
+
+    # The post-update document is the old one with our $set applied, no second read needed
+    version = previous.get("version", 1) + 1
+    updated = {**previous, **sections, "updated_at": now, "version": version}
+
+    diff = {
+        section: diff_resume_section(previous.get(section), value)
+        for section, value in sections.items()
+        if previous.get(section) != value
+    }
+    if diff:
+        entry = ResumeHistoryEntry(
+            resume_id=resume_id,
+            version=version,
+            changed_sections=list(diff),
+            diff=diff
+        )
+        await db.resume_history.insert_one(entry.dict())
+
+    return ResumeContent(**updated), list(diff)
+
+def section_content_hash(value: Any) -> str:
+    """Stable content hash of a single resume section"""
+    serialized = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()[:16]
+
+def compute_section_hashes(resume_content: ResumeContent) -> Dict[str, str]:
+    """Hash every resume section so cached per-section results can be reused"""
+    return {section: section_content_hash(getattr(resume_content, section)) for section in RESUME_SECTIONS}
+
+PROMPT_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+def estimate_tokens(text: str) -> int:
+    """Local token estimate: one per word or symbol, long words counted per 4 characters"""
+    return sum(math.ceil(len(piece) / 4) for piece in PROMPT_TOKEN_RE.findall(text))
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """Cut text at the last word that fits the token budget"""
+    used = 0
+    for match in PROMPT_TOKEN_RE.finditer(text):
+        used += math.ceil(len(match.group()) / 4)
+        if used > budget:
+            return text[:match.start()].rstrip() + " ..."
+    return text
+
+def compact_prompt_value(value: Any) -> str:
+    """Whitespace-free rendering of a resume value with empty fields dropped"""
+    if isinstance(value, dict):
+        return "; ".join(
+            f"{key}: {compact_prompt_value(item)}" for key, item in value.items() if item not in ("", None, [], {})
+        )
+    if isinstance(value, list):
+        return ", ".join(compact_prompt_value(item) for item in value if item not in ("", None, [], {}))
+    return str(value)
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence.strip() for sentence in re.split(r"(?<=[.!?])\s+|\n+", text or "") if sentence.strip()]
+
+def prompt_terms(text: str) -> set:
+    return set(re.findall(r"[a-z0-9+#]{3,}", text.lower()))
+
+def resume_section_items(section: str, value: Any) -> List[str]:
+    """Prompt items of a resume section: one per entry, or one per sentence of free text"""
+    if isinstance(value, str):
+        return split_sentences(value)
+    if section == "skills":
+        return [str(skill) for skill in value if skill]
+    if isinstance(value, list):
+        return [compact_prompt_value(entry) for entry in value if entry]
+    rendered = compact_prompt_value(value)
+    return [rendered] if rendered else []
+
+def allocate_token_budget(sizes: Dict[str, int], budget: int) -> Dict[str, int]:
+    """Split a budget across parts so small parts fit whole and large parts share the remainder"""
+    allocation = {}
+    remaining = budget
+    pending = sorted(sizes, key=lambda name: sizes[name])
+    while pending:
+        share = remaining // len(pending)
+        name = pending.pop(0)
+        allocation[name] = min(sizes[name], share)
+        remaining -= allocation[name]
+    return allocation
+
+def select_prompt_items(items: List[str], budget: int, terms: Optional[set] = None) -> Tuple[List[str], bool]:
+    """Keep the items that fit the budget, most relevant to terms first, in their original order
+
+    Without terms earlier items win, matching the newest-first order of resume sections.
+    """
+    costs = [estimate_tokens(item) for item in items]
+    if sum(costs) <= budget:
+        return items, False
+
+    ranked = list(range(len(items)))
+    if terms:
+        ranked.sort(key=lambda index: -len(prompt_terms(items[index]) & terms))
+    chosen = {}
+    used = 0
+    for index in ranked:
+        if used + costs[index] <= budget:
+            chosen[index] = items[index]
+            used += costs[index]
+    if not chosen and ranked and budget > 0:
+        chosen[ranked[0]] = truncate_to_tokens(items[ranked[0]], budget)
+    return [chosen[index] for index in sorted(chosen)], True
+
+def fit_prompt_parts(parts: Dict[str, List[str]], budget: int, terms: Optional[set] = None) -> Tuple[Dict[str, List[str]], bool]:
+    """Trim each part's items so all parts together fit the token budget"""
+    allocation = allocate_token_budget(
+        {name: sum(estimate_tokens(item) for item in items) for name, items in parts.items()}, budget
+    )
+    fitted = {}
+    truncated = False
+    for name, items in parts.items():
+        fitted[name], cut = select_prompt_items(items, allocation[name], terms)
+        truncated = truncated or cut
+    return fitted, truncated
+
+def record_prompt_size(kind: str, prompt: str, truncated: bool):
+    """Count the estimated size of a prompt about to be sent"""
+    tokens = estimate_tokens(prompt)
+    stats = prompt_size_stats.setdefault(kind, {"prompts": 0, "tokens": 0, "max_tokens": 0, "truncated": 0})
+    stats["prompts"] += 1
+    stats["tokens"] += tokens
+    stats["max_tokens"] = max(stats["max_tokens"], tokens)
+    stats["truncated"] += int(truncated)
+
+def format_resume_sections(resume_content: ResumeContent, sections, budget: int = ANALYSIS_PROMPT_TOKEN_BUDGET) -> Tuple[str, bool]:
+    """Render the given resume sections as compact prompt text within the token budget
+
+    Returns the text and whether anything had to be dropped.
+    """
+    parts = {section: resume_section_items(section, getattr(resume_content, section)) for section in sections}
+    fitted, truncated = fit_prompt_parts(parts, budget)
+    lines = []
+    for section in sections:
+        if section == "skills" or isinstance(getattr(resume_content, section), str):
+            rendered = (", " if section == "skills" else " ").join(fitted[section])
+        else:
+            rendered = "".join(f"\n- {item}" for item in fitted[section])
+        lines.append(f"{RESUME_SECTION_LABELS[section]}: {rendered}")
+    return "\n".join(lines), truncated
+
+def resume_outline(resume_content: ResumeContent) -> str:
+    """One line per section with its size, enough to judge the resume's overall structure"""
+    lines = []
+    for section in RESUME_SECTIONS:
+        items = resume_section_items(section, getattr(resume_content, section))
+        words = sum(len(item.split()) for item in items)
+        lines.append(f"- {RESUME_SECTION_LABELS[section]}: {len(items)} items, {words} words" if items else f"- {RESUME_SECTION_LABELS[section]}: empty")
+    return "\n".join(lines)
+
+class SkillMatcher:
+    """Aho-Corasick automaton over the skill taxonomy's names and synonyms
+
+    find() reports every term in one pass over the text, however many terms
+    there are; matches must sit on word boundaries, and overlapping matches
+    keep the leftmost-longest one, so "node.js" is Node.js, not JavaScript.
+    """
+
+    def __init__(self, taxonomy: Dict[str, Dict[str, Tuple[str, ...]]]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[List[Tuple[int, str]]] = [[]]  # (term length, canonical skill) ending at each node
+        self.canonical: Dict[str, str] = {}  # lowercase term -> canonical skill
+        self.categories: Dict[str, str] = {}  # canonical skill -> category
+        for category, skills in taxonomy.items():
+            for skill, synonyms in skills.items():
+                self.categories[skill] = category
+                for term in (skill, *synonyms):
+                    self.canonical[term.lower()] = skill
+                    if term.lower() not in AMBIGUOUS_SKILL_TERMS:
+                        self.add(term.lower(), skill)
+        self.build()
+
+    def add(self, term: str, skill: str):
+        node = 0
+        for char in term:
+            child = self.goto[node].get(char)
+            if child is None:
+                child = len(self.goto)
+                self.goto[node][char] = child
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            node = child
+        self.output[node].append((len(term), skill))
+
+    def build(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def find(self, text: str) -> List[Tuple[int, int, str]]:
+        """(start, end, canonical skill) for each non-overlapping match, in text order"""
+        text = text.lower()
+        matches = []
+        node = 0
+        for end, char in enumerate(text, 1):
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            for length, skill in self.output[node]:
+                start = end - length
+                if (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum()):
+                    matches.append((start, end, skill))
+
+        matches.sort(key=lambda match: (match[0], match[0] - match[1]))
+        selected = []
+        covered = 0
+        for match in matches:
+            if match[0] >= covered:
+                selected.append(match)
+                covered = match[1]
+        return selected
+
+    def extract(self, text: str) -> List[str]:
+        """Canonical skills mentioned in text, in order of first mention"""
+        return list(dict.fromkeys(skill for _, _, skill in self.find(text)))
+
+    def normalize(self, skill: str) -> str:
+        """Canonical name of a free-text skill; unknown skills are returned trimmed"""
+        return self.canonical.get(skill.strip().lower(), skill.strip())
+
+def load_skill_taxonomy() -> Dict[str, Dict[str, Tuple[str, ...]]]:
+    taxonomy = {category: dict(skills) for category, skills in SKILL_TAXONOMY.items()}
+    if SKILL_TAXONOMY_FILE:
+        with open(SKILL_TAXONOMY_FILE) as taxonomy_file:
+            extra = json.load(taxonomy_file)
+        taxonomy.setdefault("custom", {}).update({skill: tuple(synonyms) for skill, synonyms in extra.items()})
+    return taxonomy
+
+skill_matcher = SkillMatcher(load_skill_taxonomy())
+
+def resume_skill_report(resume_content: ResumeContent) -> Dict[str, Any]:
+    """Deterministic keyword data: taxonomy skills in the resume and those missing from its skills list"""
+    listed = list(dict.fromkeys(skill_matcher.normalize(skill) for skill in resume_content.skills if skill.strip()))
+    mentioned = skill_matcher.extract(" \n ".join(
+        compact_prompt_value(getattr(resume_content, section))
+        for section in RESUME_SECTIONS if section not in ("skills", "personal_info")
+    ))
+    detected = list(dict.fromkeys(listed + mentioned))
+    categories: Dict[str, List[str]] = {}
+    for skill in detected:
+        categories.setdefault(skill_matcher.categories.get(skill, "other"), []).append(skill)
+    return {
+        "detected_skills": detected,
+        "unlisted_skills": [skill for skill in mentioned if skill not in listed],
+        "skill_categories": categories,
+    }
+
+def job_skill_match(resume_skills: set, job_skills: List[str]) -> Dict[str, Any]:
+    """Share of a job's skills that the resume covers"""
+    matched = [skill for skill in job_skills if skill in resume_skills]
+    return {
+        "score": round(len(matched) / len(job_skills), 3) if job_skills else 0.0,
+        "matched_skills": matched,
+        "missing_skills": [skill for skill in job_skills if skill not in resume_skills],
+    }
+
+def extract_json_from_response(response_text: str) -> Dict[str, Any]:
+    """Pull the JSON object out of an LLM response, with or without a ```json fence"""
+    if "```json" in response_text:
+        json_start = response_text.find("```json") + 7
+        json_end = response_text.find("```", json_start)
+        json_text = response_text[json_start:json_end].strip()
+    else:
+        json_start = response_text.find("{")
+        json_end = response_text.rfind("}") + 1
+        json_text = response_text[json_start:json_end]
+    return json.loads(json_text)
+
+def normalize_section_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Coerce an LLM section result into {score, strengths, weaknesses, ...}"""
+    try:
+        score = float(result.get("score", 0))
+    except (TypeError, ValueError):
+        score = 0.0
+    normalized = {"score": score}
+    for field in ANALYSIS_FEEDBACK_FIELDS:
+        items = result.get(field) or []
+        normalized[field] = [str(item) for item in items] if isinstance(items, list) else [str(items)]
+    return normalized
+
+def merge_section_results(section_results: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Build section_scores and the top-level feedback lists from per-section results"""
+    ordered = [section for section in (*RESUME_SECTIONS, "overall_structure") if section in section_results]
+    merged = {"section_scores": {section: section_results[section]["score"] for section in ordered}}
+    for field in ANALYSIS_FEEDBACK_FIELDS:
+        items = []
+        for section in ordered:
+            for item in section_results[section].get(field, []):
+                if item not in items:
+                    items.append(item)
+        merged[field] = items
+    return merged
+
+SECTION_RESULT_SCHEMA = """{
+            "score": <score 0-100>,
+            "strengths": [<strengths of this section>],
+            "weaknesses": [<weaknesses of this section>],
+            "missing_information": [<missing critical information for this section>],
+            "suggestions": [<specific improvement suggestions for this section>]
+        }"""
+
+async def analyze_resume_with_ai(resume_content: ResumeContent, previous_analysis: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Analyze resume content using AI, re-scoring only sections changed since previous_analysis"""
+    try:
+        section_hashes = compute_section_hashes(resume_content)
+        cached_results = {}
+        if previous_analysis and previous_analysis.get("section_results"):
+            cached_hashes = previous_analysis.get("section_hashes", {})
+            cached_results = {
+                section: result
+                for section, result in previous_analysis["section_results"].items()
+                if section == "overall_structure" or cached_hashes.get(section) == section_hashes.get(section)
+            }
+
+        changed_sections = [section for section in RESUME_SECTIONS if section not in cached_results]
+        if not changed_sections:
+            return {**previous_analysis, "reanalyzed_sections": [], "unchanged": True}
+
+        if set(cached_results) - {"overall_structure"}:
+            return await reanalyze_resume_sections_with_ai(
+                resume_content, changed_sections, cached_results, previous_analysis, section_hashes
+            )
+
+        # Convert resume to text format for analysis
+        resume_text, truncated = format_resume_sections(resume_content, RESUME_SECTIONS)
+        section_names = ", ".join(f'"{section}"' for section in (*RESUME_SECTIONS, "overall_structure"))
+
+        analysis_prompt = f"""
+Analyze this resume and provide a comprehensive assessment in JSON format with the following structure:
+{{
+    "ats_score": <score from 0-100>,
+    "keyword_optimization": {{
         "recommended_keywords": [<list of keywords to add>],
         "keyword_density": <current keyword optimization score>
     }},
-    "section_scores": {{
-        "personal_info": <score 0-100>,
-        "summary": <score 0-100>,
-        "experience": <score 0-100>,
-        "education": <score 0-100>,
-        "skills": <score 0-100>,
-        "overall_structure": <score 0-100>
+    "section_results": {{
+        "<section name>": {SECTION_RESULT_SCHEMA}
     }}
 }}
 
+Include one entry in "section_results" for each of: {section_names}.
+Put feedback that concerns the resume as a whole under "overall_structure".
+
 Resume Content:
 {resume_text}
 """
 
-        response = await chat.send_message(UserMessage(text=analysis_prompt))
+        record_prompt_size("resume_analysis", analysis_prompt, truncated)
+        response_text = await send_llm_message(f"resume-analysis-{resume_content.id}", UserMessage(text=analysis_prompt))
         
         # Parse the AI response
         try:
-            # Extract JSON from response
-            response_text = response if isinstance(response, str) else response.text
-            if "```json" in response_text:
-                json_start = response_text.find("```json") + 7
-                json_end = response_text.find("```", json_start)
-                json_text = response_text[json_start:json_end].strip()
-            else:
-                # Try to find JSON in the response
-                json_start = response_text.find("{")
-                json_end = response_text.rfind("}") + 1
-                json_text = response_text[json_start:json_end]
-            
-            analysis_data = json.loads(json_text)
-            return analysis_data
-        except json.JSONDecodeError:
+            analysis_data = extract_json_from_response(response_text)
+            section_results = {
+                section: normalize_section_result(result)
+                for section, result in (analysis_data.get("section_results") or {}).items()
+                if section in RESUME_SECTION_LABELS or section == "overall_structure"
+            }
+            return {
+                "ats_score": analysis_data.get("ats_score", 0),
+                "keyword_optimization": analysis_data.get("keyword_optimization", {}),
+                "section_results": section_results,
+                # Sections the model skipped get no hash and are re-sent next time
+                "section_hashes": {section: section_hashes[section] for section in RESUME_SECTIONS if section in section_results},
+                "reanalyzed_sections": list(RESUME_SECTIONS),
+                **merge_section_results(section_results)
+            }
+        except (json.JSONDecodeError, AttributeError):
             # Fallback response if JSON parsing fails
             return {
                 "ats_score": 75.0,
@@ -377,21 +2666,140 @@ Resume Content:
                     "overall_structure": 70.0
                 }
             }
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error analyzing resume: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error analyzing resume: {str(e)}")
 
+async def reanalyze_resume_sections_with_ai(
+    resume_content: ResumeContent,
+    changed_sections: List[str],
+    cached_results: Dict[str, Dict[str, Any]],
+    previous_analysis: Dict[str, Any],
+    section_hashes: Dict[str, str]
+) -> Dict[str, Any]:
+    """Score only the changed sections and merge them with the cached per-section results
+
+    The overall structure is re-scored too, from an outline of every section.
+    Raises a 502 when the response cannot be used, rather than reporting that
+    nothing was re-scored.
+    """
+    section_names = ", ".join(f'"{section}"' for section in (*changed_sections, "overall_structure"))
+    sections_text, truncated = format_resume_sections(resume_content, changed_sections)
+
+    analysis_prompt = f"""
+Re-assess the following resume sections, which the candidate has just edited. Score each section on its own
+and respond in JSON format with the following structure:
+{{
+    "keyword_optimization": {{
+        "recommended_keywords": [<list of keywords to add>],
+        "keyword_density": <current keyword optimization score>
+    }},
+    "section_results": {{
+        "<section name>": {SECTION_RESULT_SCHEMA}
+    }}
+}}
+
+Include one entry in "section_results" for each of: {section_names}.
+Score "overall_structure" on how the resume as a whole is organized, using the outline.
+
+Outline Of The Whole Resume:
+{resume_outline(resume_content)}
+
+Edited Sections:
+{sections_text}
+"""
+
+    record_prompt_size("resume_reanalysis", analysis_prompt, truncated)
+    response_text = await send_llm_message(f"resume-analysis-{resume_content.id}", UserMessage(text=analysis_prompt))
+    try:
+        analysis_data = extract_json_from_response(response_text)
+        fresh_results = {
+            section: normalize_section_result(result)
+            for section, result in (analysis_data.get("section_results") or {}).items()
+            if section in changed_sections or section == "overall_structure"
+        }
+    except (json.JSONDecodeError, AttributeError):
+        fresh_results = {}
+    if not set(fresh_results) & set(changed_sections):
+        logging.error(f"Could not parse section re-analysis for resume {resume_content.id}")
+        raise HTTPException(status_code=502, detail="Resume analysis returned no usable results, please retry")
+
+    # Sections the model failed to return keep their old result and hash, so they are retried next time
+    previous_results = previous_analysis.get("section_results", {})
+    section_results = {**previous_results, **cached_results, **fresh_results}
+    previous_hashes = previous_analysis.get("section_hashes", {})
+    result_hashes = {}
+    for section in RESUME_SECTIONS:
+        if section in cached_results or section in fresh_results:
+            result_hashes[section] = section_hashes[section]
+        elif section in previous_hashes:
+            result_hashes[section] = previous_hashes[section]
+
+    # Shift the overall score by the average change of the re-scored sections
+    scored_sections = list(section_results) or list(RESUME_SECTIONS)
+    score_delta = sum(
+        fresh_results[section]["score"] - previous_results.get(section, {}).get("score", fresh_results[section]["score"])
+        for section in fresh_results
+    ) / len(scored_sections)
+    ats_score = min(100.0, max(0.0, float(previous_analysis.get("ats_score", 0)) + score_delta))
+
+    return {
+        "ats_score": round(ats_score, 1),
+        "keyword_optimization": analysis_data.get("keyword_optimization") or previous_analysis.get("keyword_optimization", {}),
+        "section_results": section_results,
+        "section_hashes": result_hashes,
+        "reanalyzed_sections": list(fresh_results),
+        **merge_section_results(section_results)
+    }
+
 async def generate_cover_letter_with_ai(resume_content: ResumeContent, job_posting: JobPosting) -> str:
     """Generate a tailored cover letter using AI"""
     try:
-        chat = await create_ai_chat(f"cover-letter-{resume_content.id}")
-        
+        # Rank resume items by overlap with the job, and job sentences by overlap with the resume
+        job_terms = prompt_terms(" ".join([
+            job_posting.position_title, job_posting.job_description, *job_posting.requirements
+        ]))
+        resume_terms = prompt_terms(" ".join(resume_content.skills))
+        skills = sorted(
+            resume_section_items("skills", resume_content.skills),
+            key=lambda skill: -len(prompt_terms(skill) & job_terms)
+        )[:10]
+        experience = sorted(
+            resume_section_items("experience", resume_content.experience),
+            key=lambda entry: -len(prompt_terms(entry) & job_terms)
+        )[:2]
+        resume_parts, resume_truncated = fit_prompt_parts({
+            "summary": split_sentences(resume_content.summary),
+            "experience": experience,
+            "education": resume_section_items("education", resume_content.education),
+        }, COVER_LETTER_PROMPT_TOKEN_BUDGET // 2, job_terms)
+        # Requirements and description share the job's half of the budget
+        sentences = split_sentences(job_posting.job_description)
+        job_allocation = allocate_token_budget({
+            "requirements": sum(estimate_tokens(requirement) for requirement in job_posting.requirements),
+            "description": sum(estimate_tokens(sentence) for sentence in sentences),
+        }, COVER_LETTER_PROMPT_TOKEN_BUDGET - COVER_LETTER_PROMPT_TOKEN_BUDGET // 2)
+        title_terms = prompt_terms(job_posting.position_title)
+        requirements, requirements_truncated = select_prompt_items(
+            job_posting.requirements, job_allocation["requirements"], resume_terms | title_terms
+        )
+        description, description_truncated = select_prompt_items(
+            sentences, job_allocation["description"],
+            resume_terms | prompt_terms(" ".join(job_posting.requirements)) | title_terms
+        )
+        job_truncated = requirements_truncated or description_truncated
+
+        experience_text = "".join(f"\n- {entry}" for entry in resume_parts["experience"]) or "None"
+        education_text = "".join(f"\n- {entry}" for entry in resume_parts["education"]) or "None"
+
         resume_summary = f"""
 Name: {resume_content.personal_info.get('name', 'N/A')}
-Summary: {resume_content.summary}
-Key Skills: {', '.join(resume_content.skills[:10])}  # Top 10 skills
-Recent Experience: {json.dumps(resume_content.experience[:2], indent=2) if resume_content.experience else 'None'}
-Education: {json.dumps(resume_content.education, indent=2)}
+Summary: {' '.join(resume_parts['summary'])}
+Key Skills: {', '.join(skills)}
+Relevant Experience: {experience_text}
+Education: {education_text}
 """
 
         cover_letter_prompt = f"""
@@ -410,18 +2818,275 @@ Resume Summary:
 Job Posting:
 Company: {job_posting.company_name}
 Position: {job_posting.position_title}
-Description: {job_posting.job_description}
-Requirements: {', '.join(job_posting.requirements)}
+Description: {' '.join(description)}
+Requirements: {', '.join(requirements)}
 
 Generate a complete cover letter that effectively matches the candidate's background to this specific role.
 """
 
-        response = await chat.send_message(UserMessage(text=cover_letter_prompt))
-        return response if isinstance(response, str) else response.text
+        record_prompt_size("cover_letter", cover_letter_prompt, resume_truncated or job_truncated)
+        return await send_llm_message(f"cover-letter-{resume_content.id}", UserMessage(text=cover_letter_prompt))
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error generating cover letter: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error generating cover letter: {str(e)}")
 
+def cover_letter_resume_hash(resume_content: ResumeContent) -> str:
+    """Hash of the resume sections that the cover letter prompt reads"""
+    return section_content_hash({
+        section: getattr(resume_content, section) for section in COVER_LETTER_RESUME_SECTIONS
+    })
+
+def cover_letter_job_hash(job_posting: JobPosting) -> str:
+    """Hash of the job posting content"""
+    return section_content_hash(job_posting.dict())
+
+async def get_or_generate_cover_letter(resume_content: ResumeContent, job_posting: JobPosting, regenerate: bool = False) -> Tuple[CoverLetter, bool]:
+    """Return the cached cover letter for this resume and job, generating it on a miss
+
+    The second element of the result is True when the letter came from the cache.
+    """
+    cache_key = {
+        "resume_id": resume_content.id,
+        "resume_hash": cover_letter_resume_hash(resume_content),
+        "job_hash": cover_letter_job_hash(job_posting),
+        "prompt_version": COVER_LETTER_PROMPT_VERSION,
+    }
+
+    if not regenerate:
+        cached = await db.cover_letters.find_one(cache_key)
+        if cached:
+            cover_letter_cache_stats["hits"] += 1
+            return CoverLetter(**cached), True
+        cover_letter_cache_stats["misses"] += 1
+    else:
+        cover_letter_cache_stats["regenerated"] += 1
+
+    content = await generate_cover_letter_with_ai(resume_content, job_posting)
+    cover_letter = CoverLetter(
+        job_posting=job_posting.job_description,
+        company_name=job_posting.company_name,
+        position_title=job_posting.position_title,
+        content=content,
+        **cache_key
+    )
+
+    # Upsert on the cache key so a regenerated letter keeps the id applications already reference
+    insert_fields = cover_letter.dict(exclude={"content", "created_at"})
+    try:
+        stored = await db.cover_letters.find_one_and_update(
+            cache_key,
+            {
+                "$set": {"content": cover_letter.content, "created_at": cover_letter.created_at},
+                "$setOnInsert": insert_fields
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # A concurrent request inserted the same letter first
+        stored = await db.cover_letters.find_one(cache_key)
+    if stored["id"] == cover_letter.id:
+        await increment_user_stats(resume_content.user_id, {"cover_letters": 1})
+    return CoverLetter(**stored), False
+
+# Resume export
+RESUME_EXPORT_TEMPLATES = {
+    "classic": {"margin": 0.75, "name_size": 20, "heading_size": 13, "body_size": 10.5},
+    "compact": {"margin": 0.5, "name_size": 16, "heading_size": 11, "body_size": 9},
+}
+
+# Bump when rendering changes so cached artifacts are re-rendered
+RESUME_EXPORT_RENDER_VERSION = "1"
+
+def resume_export_blocks(resume: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """Flatten a resume into (kind, text) blocks shared by the PDF and DOCX renderers
+
+    Kinds are name, contact, heading, entry (a bold line), text and bullet.
+    """
+    join = lambda *parts, separator=", ": separator.join(str(part) for part in parts if part)
+    info = resume.get("personal_info") or {}
+    blocks = [("name", info.get("name") or "Resume")]
+    contact = join(info.get("email"), info.get("phone"), info.get("address"), info.get("linkedin"), info.get("github"), separator=" | ")
+    if contact:
+        blocks.append(("contact", contact))
+    if resume.get("summary"):
+        blocks += [("heading", "Summary"), ("text", resume["summary"])]
+
+    if resume.get("experience"):
+        blocks.append(("heading", "Experience"))
+        for entry in resume["experience"]:
+            dates = join(entry.get("start_date"), entry.get("end_date"), separator=" - ")
+            blocks.append(("entry", join(join(entry.get("title"), entry.get("company"), separator=" - "), entry.get("location"))
+                           + (f" ({dates})" if dates else "")))
+            if entry.get("description"):
+                blocks.append(("text", entry["description"]))
+            blocks += [("bullet", achievement) for achievement in entry.get("achievements") or [] if achievement]
+    if resume.get("education"):
+        blocks.append(("heading", "Education"))
+        for entry in resume["education"]:
+            graduated = entry.get("graduation_date")
+            blocks.append(("entry", join(join(entry.get("degree"), entry.get("institution"), separator=" - "), entry.get("location"))
+                           + (f" ({graduated})" if graduated else "")))
+            if entry.get("gpa"):
+                blocks.append(("text", f"GPA: {entry['gpa']}"))
+    if resume.get("skills"):
+        blocks += [("heading", "Skills"), ("text", join(*resume["skills"]))]
+    if resume.get("certifications"):
+        blocks.append(("heading", "Certifications"))
+        for entry in resume["certifications"]:
+            blocks.append(("bullet", join(join(entry.get("name"), entry.get("issuer"), separator=" - "), entry.get("date"))))
+    if resume.get("projects"):
+        blocks.append(("heading", "Projects"))
+        for entry in resume["projects"]:
+            blocks.append(("entry", join(entry.get("name"), entry.get("date"))))
+            if entry.get("description"):
+                blocks.append(("text", entry["description"]))
+            if entry.get("technologies"):
+                blocks.append(("text", f"Technologies: {join(*entry['technologies'])}"))
+    if resume.get("languages"):
+        blocks += [("heading", "Languages"), ("text", join(*(
+            join(entry.get("name"), entry.get("proficiency"), separator=" - ") for entry in resume["languages"]
+        )))]
+    for title, content in (resume.get("additional_sections") or {}).items():
+        blocks.append(("heading", str(title)))
+        if isinstance(content, list):
+            blocks += [("bullet", compact_prompt_value(item)) for item in content if item]
+        elif content:
+            blocks.append(("text", compact_prompt_value(content)))
+    return blocks
+
+def render_resume_pdf(resume: Dict[str, Any], template: str) -> bytes:
+    """Lay a resume out as PDF; runs in the export process pool"""
+    layout = RESUME_EXPORT_TEMPLATES[template]
+    sample = reportlab_styles.getSampleStyleSheet()
+    body = reportlab_styles.ParagraphStyle(
+        "ResumeBody", parent=sample["BodyText"], fontSize=layout["body_size"], leading=layout["body_size"] * 1.3
+    )
+    paragraph_styles = {
+        "name": reportlab_styles.ParagraphStyle("ResumeName", parent=sample["Title"], fontSize=layout["name_size"], leading=layout["name_size"] * 1.2),
+        "contact": reportlab_styles.ParagraphStyle("ResumeContact", parent=body, alignment=1),
+        "heading": reportlab_styles.ParagraphStyle("ResumeHeading", parent=sample["Heading2"], fontSize=layout["heading_size"], spaceBefore=8, spaceAfter=3),
+        "entry": reportlab_styles.ParagraphStyle("ResumeEntry", parent=body, fontName="Helvetica-Bold", spaceBefore=4),
+        "text": body,
+        "bullet": reportlab_styles.ParagraphStyle("ResumeBullet", parent=body, leftIndent=12, bulletIndent=2),
+    }
+    margin = layout["margin"] * 72
+    buffer = io.BytesIO()
+    document = platypus.SimpleDocTemplate(
+        buffer, pagesize=pagesizes.LETTER, leftMargin=margin, rightMargin=margin, topMargin=margin, bottomMargin=margin
+    )
+    story = [
+        platypus.Paragraph(xml_escape(text), paragraph_styles[kind], bulletText="\u2022" if kind == "bullet" else None)
+        for kind, text in resume_export_blocks(resume)
+    ]
+    document.build(story)
+    return buffer.getvalue()
+
+def render_resume_docx(resume: Dict[str, Any], template: str) -> bytes:
+    """Lay a resume out as DOCX; runs in the export process pool"""
+    layout = RESUME_EXPORT_TEMPLATES[template]
+    document = docx.Document()
+    for section in document.sections:
+        section.left_margin = section.right_margin = section.top_margin = section.bottom_margin = Inches(layout["margin"])
+    document.styles["Normal"].font.size = Pt(layout["body_size"])
+    for kind, text in resume_export_blocks(resume):
+        if kind == "name":
+            document.add_heading(text, level=0)
+        elif kind == "heading":
+            document.add_heading(text, level=1)
+        elif kind == "entry":
+            document.add_paragraph().add_run(text).bold = True
+        elif kind == "bullet":
+            document.add_paragraph(text, style="List Bullet")
+        else:
+            document.add_paragraph(text)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+# format -> (media type, renderer, required library)
+RESUME_EXPORT_FORMATS = {
+    "pdf": ("application/pdf", render_resume_pdf, platypus),
+    "docx": ("application/vnd.openxmlformats-officedocument.wordprocessingml.document", render_resume_docx, docx),
+}
+
+# Created on first export so workers that never render do not fork
+resume_export_executor: Optional[ProcessPoolExecutor] = None
+
+# Renders in progress in this worker, so concurrent requests for one artifact render it once
+resume_export_renders: Dict[str, asyncio.Future] = {}
+
+def resume_export_key(resume_content: ResumeContent, export_format: str, template: str) -> str:
+    """Cache key from the resume content, format, template and renderer version"""
+    return section_content_hash({
+        "sections": {section: getattr(resume_content, section) for section in RESUME_SECTIONS},
+        "format": export_format,
+        "template": template,
+        "version": RESUME_EXPORT_RENDER_VERSION,
+    })
+
+def resume_export_filename(resume_content: ResumeContent, export_format: str) -> str:
+    name = re.sub(r"[^A-Za-z0-9]+", "_", resume_content.personal_info.get("name") or "").strip("_")
+    return f"{name or 'resume'}_Resume.{export_format}"
+
+async def get_or_render_resume_export(resume_content: ResumeContent, export_format: str, template: str) -> Tuple[str, bytes]:
+    """Return the cached rendering of a resume, rendering it in the process pool on a miss"""
+    global resume_export_executor
+    if export_format not in RESUME_EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(RESUME_EXPORT_FORMATS)}")
+    if template not in RESUME_EXPORT_TEMPLATES:
+        raise HTTPException(status_code=400, detail=f"template must be one of {', '.join(RESUME_EXPORT_TEMPLATES)}")
+    _, renderer, library = RESUME_EXPORT_FORMATS[export_format]
+    if library is None:
+        raise HTTPException(status_code=501, detail=f"{export_format.upper()} export is not installed on this server")
+
+    key = resume_export_key(resume_content, export_format, template)
+    cached = await db.resume_exports.find_one({"key": key}, {"content": 1})
+    if cached:
+        return key, bytes(cached["content"])
+
+    pending = resume_export_renders.get(key)
+    if pending is not None:
+        return key, await asyncio.shield(pending)
+
+    future = asyncio.get_running_loop().create_future()
+    resume_export_renders[key] = future
+    try:
+        if resume_export_executor is None:
+            resume_export_executor = ProcessPoolExecutor(max_workers=RESUME_EXPORT_WORKERS)
+        content = await asyncio.get_running_loop().run_in_executor(
+            resume_export_executor, renderer, resume_content.dict(), template
+        )
+        try:
+            await db.resume_exports.update_one(
+                {"key": key},
+                {"$setOnInsert": {
+                    "key": key,
+                    "resume_id": resume_content.id,
+                    "format": export_format,
+                    "template": template,
+                    "content": Binary(content),
+                    "size": len(content),
+                    "created_at": datetime.utcnow()
+                }},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            pass  # Another worker stored the same artifact first
+        future.set_result(content)
+        return key, content
+    except Exception as e:
+        future.set_exception(e)
+        # Waiters see the error; mark it retrieved so an unwaited future does not log it
+        future.exception()
+        raise
+    finally:
+        if not future.done():
+            future.cancel()
+        del resume_export_renders[key]
+
 # Existing API Endpoints
 @api_router.get("/")
 async def root():
@@ -443,20 +3108,33 @@ async def create_resume(resume_data: ResumeCreateRequest):
             languages=resume_data.languages or []
         )
         
-        await db.resumes.insert_one(resume.dict())
-        return resume
+        document = resume_to_document(resume)
+        await db.resumes.insert_one(document)
+        await increment_user_stats(resume.user_id, {"resumes": 1})
+        return resume_from_document(document)
     except Exception as e:
         logging.error(f"Error creating resume: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error creating resume: {str(e)}")
 
 @api_router.get("/resume/{resume_id}", response_model=ResumeContent)
-async def get_resume(resume_id: str):
+async def get_resume(resume_id: str, request: Request, response: Response):
     """Get a resume by ID"""
     try:
+        etag = resource_versions.get(f"resume:{resume_id}")
+        if etag and etag_matches(request, etag):
+            return not_modified(etag)
         resume = await db.resumes.find_one({"id": resume_id})
         if not resume:
             raise HTTPException(status_code=404, detail="Resume not found")
-        return ResumeContent(**resume)
+        # Every write bumps the version, so it identifies the content
+        etag = f'W/"resume-{resume_id}-{resume.get("version", 1)}"'
+        resource_versions.set(f"resume:{resume_id}", etag)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        set_etag(response, etag)
+        return resume_from_document(resume)
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error getting resume: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error getting resume: {str(e)}")
@@ -465,30 +3143,73 @@ async def get_resume(resume_id: str):
 async def update_resume(resume_id: str, resume_data: ResumeCreateRequest):
     """Update an existing resume"""
     try:
-        existing_resume = await db.resumes.find_one({"id": resume_id})
-        if not existing_resume:
-            raise HTTPException(status_code=404, detail="Resume not found")
-        
-        update_data = {
-            "personal_info": resume_data.personal_info or existing_resume.get("personal_info", {}),
-            "summary": resume_data.summary or existing_resume.get("summary", ""),
-            "experience": resume_data.experience or existing_resume.get("experience", []),
-            "education": resume_data.education or existing_resume.get("education", []),
-            "skills": resume_data.skills or existing_resume.get("skills", []),
-            "certifications": resume_data.certifications or existing_resume.get("certifications", []),
-            "projects": resume_data.projects or existing_resume.get("projects", []),
-            "languages": resume_data.languages or existing_resume.get("languages", []),
-            "updated_at": datetime.utcnow()
+        # Empty fields keep their stored value, so only non-empty sections are written
+        sections = {
+            section: value
+            for section, value in resume_data.dict(exclude={"user_id"}).items()
+            if value
         }
-        
-        await db.resumes.update_one({"id": resume_id}, {"$set": update_data})
-        
-        updated_resume = await db.resumes.find_one({"id": resume_id})
-        return ResumeContent(**updated_resume)
+        resume, _ = await apply_resume_patch(resume_id, sections)
+        return resume
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error updating resume: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error updating resume: {str(e)}")
 
+@api_router.patch("/resume/{resume_id}", response_model=ResumeContent)
+async def patch_resume(resume_id: str, patch: ResumePatchRequest):
+    """Update only the sections present in the request"""
+    try:
+        sections = {
+            section: value
+            for section, value in patch.dict(exclude_unset=True, exclude={"base_version"}).items()
+            if value is not None
+        }
+        resume, _ = await apply_resume_patch(resume_id, sections, patch.base_version)
+        return resume
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error patching resume: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error patching resume: {str(e)}")
+
+@api_router.get("/resume/{resume_id}/history", response_model=List[ResumeHistoryEntry])
+async def get_resume_history(resume_id: str):
+    """Get the change history for a resume, newest first"""
+    try:
+        entries = await db.resume_history.find({"resume_id": resume_id}).sort("version", -1).to_list(100)
+        return [ResumeHistoryEntry(**entry) for entry in entries]
+    except Exception as e:
+        logging.error(f"Error getting resume history: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error getting resume history: {str(e)}")
+
+@api_router.get("/resume/{resume_id}/versions/{version}", response_model=ResumeContent)
+async def get_resume_version(resume_id: str, version: int):
+    """Reconstruct an earlier version of a resume from its reverse diffs"""
+    try:
+        resume = await db.resumes.find_one({"id": resume_id})
+        if not resume:
+            raise HTTPException(status_code=404, detail="Resume not found")
+        resume = decode_resume_document(resume)
+        current_version = resume.get("version", 1)
+        if version < 1 or version > current_version:
+            raise HTTPException(status_code=404, detail="Resume version not found")
+
+        entries = db.resume_history.find(
+            {"resume_id": resume_id, "version": {"$gt": version}}
+        ).sort("version", -1)
+        async for entry in entries:
+            for section, diff in entry["diff"].items():
+                resume[section] = restore_resume_section(resume.get(section), diff)
+        resume["version"] = version
+        return ResumeContent(**resume)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error getting resume version: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error getting resume version: {str(e)}")
+
 @api_router.post("/resume/{resume_id}/analyze", response_model=ResumeAnalysis)
 async def analyze_resume(resume_id: str):
     """Analyze a resume for ATS optimization"""
@@ -497,8 +3218,31 @@ async def analyze_resume(resume_id: str):
         if not resume:
             raise HTTPException(status_code=404, detail="Resume not found")
         
-        resume_content = ResumeContent(**resume)
-        analysis_data = await analyze_resume_with_ai(resume_content)
+        resume_content = resume_from_document(resume)
+        previous_analysis = await db.analyses.find_one(
+            {"resume_id": resume_id},
+            sort=[("created_at", -1)]
+        )
+        try:
+            analysis_data = await analyze_resume_with_ai(resume_content, previous_analysis)
+        except HTTPException as e:
+            # Serve the last analysis while Gemini is failing or its circuit is open
+            if e.status_code not in (503, 504) or not previous_analysis:
+                raise
+            logging.warning(f"Serving cached analysis for resume {resume_id}: {e.detail}")
+            return ResumeAnalysis(**previous_analysis)
+        
+        # Nothing changed since the last analysis, so it is still current
+        if analysis_data.get("unchanged"):
+            return ResumeAnalysis(**previous_analysis)
+        
+        # Skill data comes from the taxonomy so it is the same on every run
+        skill_report = resume_skill_report(resume_content)
+        keyword_optimization = {**(analysis_data.get("keyword_optimization") or {}), **skill_report}
+        keyword_optimization["recommended_keywords"] = list(dict.fromkeys(
+            list(keyword_optimization.get("recommended_keywords") or []) + skill_report["unlisted_skills"]
+        ))
+        analysis_data["keyword_optimization"] = keyword_optimization
         
         analysis = ResumeAnalysis(
             resume_id=resume_id,
@@ -506,61 +3250,231 @@ async def analyze_resume(resume_id: str):
         )
         
         await db.analyses.insert_one(analysis.dict())
+        await cache.delete("analysis", resume_id)
+        resource_versions.discard(f"analysis:{resume_id}")
+        await increment_user_stats(resume_content.user_id, {"analyses": 1})
+        await compact_analysis_history(resume_id, resume_content.user_id)
         return analysis
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error analyzing resume: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error analyzing resume: {str(e)}")
 
 @api_router.get("/resume/{resume_id}/analysis", response_model=ResumeAnalysis)
-async def get_resume_analysis(resume_id: str):
+async def get_resume_analysis(resume_id: str, request: Request, response: Response):
     """Get the latest analysis for a resume"""
     try:
-        analysis = await db.analyses.find_one(
-            {"resume_id": resume_id}, 
+        etag = resource_versions.get(f"analysis:{resume_id}")
+        if etag and etag_matches(request, etag):
+            return not_modified(etag)
+        # The latest id is a small indexed read; it identifies the content, since analyses are
+        # immutable, and tells whether a cached copy is current, whichever worker wrote it
+        latest = await db.analyses.find_one(
+            {"resume_id": resume_id},
+            {"_id": 0, "id": 1},
             sort=[("created_at", -1)]
         )
-        if not analysis:
+        if not latest:
             raise HTTPException(status_code=404, detail="Analysis not found")
-        return ResumeAnalysis(**analysis)
+        etag = f'"analysis-{latest["id"]}"'
+        resource_versions.set(f"analysis:{resume_id}", etag)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        cached = await cache.get("analysis", resume_id)
+        if cached is not None and cached.get("id") == latest["id"]:
+            analysis = ResumeAnalysis(**cached)
+        else:
+            analysis = await db.analyses.find_one({"id": latest["id"]})
+            if not analysis:
+                raise HTTPException(status_code=404, detail="Analysis not found")
+            analysis = ResumeAnalysis(**analysis)
+            await cache.set("analysis", resume_id, analysis.dict(), ttl=ANALYSIS_CACHE_TTL_SECONDS)
+        set_etag(response, etag)
+        return analysis
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error getting analysis: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error getting analysis: {str(e)}")
 
 @api_router.post("/resume/{resume_id}/cover-letter", response_model=CoverLetter)
-async def generate_cover_letter(resume_id: str, job_data: JobPosting):
-    """Generate a tailored cover letter"""
+async def generate_cover_letter(resume_id: str, job_data: JobPosting, response: Response, regenerate: bool = False):
+    """Generate a tailored cover letter, reusing a cached one for the same resume and job"""
     try:
         resume = await db.resumes.find_one({"id": resume_id})
         if not resume:
             raise HTTPException(status_code=404, detail="Resume not found")
         
-        resume_content = ResumeContent(**resume)
-        cover_letter_content = await generate_cover_letter_with_ai(resume_content, job_data)
-        
-        cover_letter = CoverLetter(
-            resume_id=resume_id,
-            job_posting=job_data.job_description,
-            company_name=job_data.company_name,
-            position_title=job_data.position_title,
-            content=cover_letter_content
-        )
-        
-        await db.cover_letters.insert_one(cover_letter.dict())
+        resume_content = resume_from_document(resume)
+        cover_letter, cached = await get_or_generate_cover_letter(resume_content, job_data, regenerate)
+        response.headers["X-Cache"] = "HIT" if cached else "MISS"
         return cover_letter
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error generating cover letter: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error generating cover letter: {str(e)}")
 
+@api_router.get("/resume/{resume_id}/export")
+async def export_resume(resume_id: str, request: Request, format: str = "pdf", template: str = "classic"):
+    """Download a resume as a formatted PDF or DOCX document"""
+    try:
+        version_key = f"export:{resume_id}:{format}:{template}"
+        etag = resource_versions.get(version_key)
+        if etag and etag_matches(request, etag):
+            return not_modified(etag)
+        resume = await db.resumes.find_one({"id": resume_id})
+        if not resume:
+            raise HTTPException(status_code=404, detail="Resume not found")
+        resume_content = resume_from_document(resume)
+        # The ETag is the cache key of the rendering, so a revalidation never has to render
+        etag = f'"export-{resume_export_key(resume_content, format, template)}"'
+        if etag_matches(request, etag):
+            resource_versions.set(version_key, etag)
+            return not_modified(etag)
+        _, content = await get_or_render_resume_export(resume_content, format, template)
+        resource_versions.set(version_key, etag)
+        return Response(
+            content=content,
+            media_type=RESUME_EXPORT_FORMATS[format][0],
+            headers={
+                "Content-Disposition": f'attachment; filename="{resume_export_filename(resume_content, format)}"',
+                "ETag": etag,
+                "Cache-Control": "no-cache"
+            }
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error exporting resume: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error exporting resume: {str(e)}")
+
+@api_router.get("/cover-letters/cache-stats")
+async def get_cover_letter_cache_stats():
+    """Get cover letter cache hit rates for this worker"""
+    lookups = cover_letter_cache_stats["hits"] + cover_letter_cache_stats["misses"]
+    return {
+        **cover_letter_cache_stats,
+        "hit_rate": cover_letter_cache_stats["hits"] / lookups if lookups else 0.0
+    }
+
+@api_router.get("/llm/prompt-stats")
+async def get_prompt_stats():
+    """Get estimated LLM prompt sizes per prompt kind for this worker"""
+    return {
+        kind: {**stats, "avg_tokens": stats["tokens"] / stats["prompts"] if stats["prompts"] else 0.0}
+        for kind, stats in prompt_size_stats.items()
+    }
+
 @api_router.get("/user/{user_id}/resumes", response_model=List[ResumeContent])
 async def get_user_resumes(user_id: str):
     """Get all resumes for a user"""
     try:
         resumes = await db.resumes.find({"user_id": user_id}).to_list(100)
-        return [ResumeContent(**resume) for resume in resumes]
+        return [resume_from_document(resume) for resume in resumes]
     except Exception as e:
         logging.error(f"Error getting user resumes: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error getting user resumes: {str(e)}")
 
+@api_router.get("/user/{user_id}/stats", response_model=UserStats)
+async def get_user_stats(user_id: str, refresh: bool = False):
+    """Get a user's dashboard counters in one read"""
+    try:
+        stats = await db.user_stats.find_one({"user_id": user_id})
+        if stats and stats.get("initialized") and not refresh:
+            return UserStats(**stats)
+        
+        # First read for this user (or an explicit refresh): count from the source collections
+        user_stats = await compute_user_stats(user_id)
+        try:
+            # Every increment bumps updated_at, so only replace counters that none has touched since
+            # the read; otherwise the recount would drop or double-count that increment
+            await db.user_stats.update_one(
+                {"user_id": user_id, "updated_at": (stats or {}).get("updated_at")},
+                {"$set": {**user_stats.dict(), "initialized": True}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            pass  # An increment won the race; the stored counters stand and the next refresh recounts
+        return user_stats
+    except Exception as e:
+        logging.error(f"Error getting user stats: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error getting user stats: {str(e)}")
+
+# Exportable collections and the date field their since/until filters apply to
+USER_EXPORT_COLLECTIONS = {
+    "resumes": "created_at",
+    "analyses": "created_at",
+    "cover_letters": "created_at",
+    "applications": "application_date",
+}
+
+async def stream_user_export(user_id: str, resume_ids: List[str], collections: List[str],
+                             since: Optional[datetime], until: Optional[datetime], compress: bool):
+    """NDJSON lines of a user's documents, one collection after another
+
+    Cursors are read a batch at a time and output is flushed in fixed-size
+    chunks, so memory use does not grow with the user's history.
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None  # gzip container
+    buffer = bytearray()
+
+    def chunk(data: bytes) -> bytes:
+        return compressor.compress(data) if compressor else data
+
+    for collection in collections:
+        query: Dict[str, Any] = {"user_id": user_id} if collection in ("resumes", "applications") else {"resume_id": {"$in": resume_ids}}
+        date_field = USER_EXPORT_COLLECTIONS[collection]
+        if since or until:
+            query[date_field] = {key: value for key, value in (("$gte", since), ("$lt", until)) if value}
+        cursor = db[collection].find(query, {"_id": 0}).batch_size(USER_EXPORT_BATCH_SIZE)
+        async for document in cursor:
+            if collection == "resumes":
+                document = decode_resume_document(document)
+            buffer += json.dumps({"collection": collection, **document}, default=cache_json_default).encode("utf-8")
+            buffer += b"\n"
+            if len(buffer) >= USER_EXPORT_CHUNK_BYTES:
+                data = chunk(bytes(buffer))
+                buffer.clear()
+                if data:
+                    yield data
+    data = chunk(bytes(buffer))
+    if compressor:
+        data += compressor.flush()
+    if data:
+        yield data
+
+@api_router.get("/user/{user_id}/export")
+async def export_user_data(user_id: str, collections: Optional[str] = None, since: Optional[datetime] = None,
+                           until: Optional[datetime] = None, compress: bool = False):
+    """Stream a user's resumes, analyses, cover letters and applications as NDJSON
+
+    collections is a comma-separated subset of USER_EXPORT_COLLECTIONS; since
+    and until bound each collection's date field. compress=true returns a
+    .ndjson.gz file.
+    """
+    try:
+        selected = [name.strip() for name in collections.split(",") if name.strip()] if collections else list(USER_EXPORT_COLLECTIONS)
+        unknown = [name for name in selected if name not in USER_EXPORT_COLLECTIONS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown collections: {', '.join(unknown)}")
+        since = to_naive_utc(since) if since else None
+        until = to_naive_utc(until) if until else None
+        resume_ids = await db.resumes.distinct("id", {"user_id": user_id})
+
+        filename = f"user-{re.sub(r'[^A-Za-z0-9_-]+', '_', user_id)}-export.ndjson" + (".gz" if compress else "")
+        return StreamingResponse(
+            stream_user_export(user_id, resume_ids, selected, since, until, compress),
+            media_type="application/gzip" if compress else "application/x-ndjson",
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error exporting user data: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error exporting user data: {str(e)}")
+
 @api_router.post("/resume/parse-upload")
 async def parse_uploaded_resume(file: UploadFile = File(...), user_id: str = Form(...)):
     """Parse an uploaded resume file and create a new resume entry"""
@@ -570,7 +3484,8 @@ async def parse_uploaded_resume(file: UploadFile = File(...), user_id: str = For
         
         # Save uploaded file temporarily
         with tempfile.NamedTemporaryFile(delete=False, suffix=f".{file.filename.split('.')[-1]}") as tmp_file:
-            content = await file.read()
+            with profile_span("upload.read"):
+                content = await file.read()
             tmp_file.write(content)
             tmp_file_path = tmp_file.name
         
@@ -582,7 +3497,6 @@ async def parse_uploaded_resume(file: UploadFile = File(...), user_id: str = For
             )
             
             # Analyze with AI
-            chat = await create_ai_chat(f"parse-resume-{uuid.uuid4()}")
             
             parse_prompt = """
             Parse this resume and extract structured information in JSON format:
@@ -641,40 +3555,39 @@ async def parse_uploaded_resume(file: UploadFile = File(...), user_id: str = For
             }
             """
             
-            response = await chat.send_message(UserMessage(
-                text=parse_prompt,
-                file_contents=[file_content]
-            ))
+            # Hedging would upload the file twice
+            response_text = await send_llm_message(
+                f"parse-resume-{uuid.uuid4()}",
+                UserMessage(text=parse_prompt, file_contents=[file_content]),
+                hedge=False
+            )
             
             # Parse AI response
             try:
-                response_text = response if isinstance(response, str) else response.text
-                if "```json" in response_text:
-                    json_start = response_text.find("```json") + 7
-                    json_end = response_text.find("```", json_start)
-                    json_text = response_text[json_start:json_end].strip()
-                else:
-                    json_start = response_text.find("{")
-                    json_end = response_text.rfind("}") + 1
-                    json_text = response_text[json_start:json_end]
-                
-                parsed_data = json.loads(json_text)
+                with profile_span("json.parse"):
+                    parsed_data = extract_json_from_response(response_text)
                 
                 # Create resume from parsed data
-                resume = ResumeContent(
-                    user_id=user_id,
-                    personal_info=parsed_data.get("personal_info", {}),
-                    summary=parsed_data.get("summary", ""),
-                    experience=parsed_data.get("experience", []),
-                    education=parsed_data.get("education", []),
-                    skills=parsed_data.get("skills", []),
-                    certifications=parsed_data.get("certifications", []),
-                    projects=parsed_data.get("projects", []),
-                    languages=parsed_data.get("languages", [])
-                )
+                with profile_span("pydantic.resume"):
+                    resume = ResumeContent(
+                        user_id=user_id,
+                        personal_info=parsed_data.get("personal_info", {}),
+                        summary=parsed_data.get("summary", ""),
+                        experience=parsed_data.get("experience", []),
+                        education=parsed_data.get("education", []),
+                        skills=parsed_data.get("skills", []),
+                        certifications=parsed_data.get("certifications", []),
+                        projects=parsed_data.get("projects", []),
+                        languages=parsed_data.get("languages", [])
+                    )
+                    document = resume_to_document(resume)
                 
-                await db.resumes.insert_one(resume.dict())
-                return resume
+                with profile_span("mongo.resumes.insert"):
+                    await db.resumes.insert_one(document)
+                with profile_span("mongo.user_stats.update"):
+                    await increment_user_stats(user_id, {"resumes": 1})
+                with profile_span("pydantic.resume"):
+                    return resume_from_document(document)
                 
             except json.JSONDecodeError as e:
                 logging.error(f"JSON parsing error: {str(e)}")
@@ -684,68 +3597,480 @@ async def parse_uploaded_resume(file: UploadFile = File(...), user_id: str = For
             # Clean up temporary file
             os.unlink(tmp_file_path)
             
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error parsing uploaded resume: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error parsing resume: {str(e)}")
+
+# New API Endpoints for Job Search and Email Automation
+@api_router.post("/jobs/search")
+async def search_jobs(search_request: JobSearchRequest):
+    """Search stored jobs, job boards, or both"""
+    try:
+        if search_request.source == "local":
+            jobs, total = await search_local_jobs(search_request)
+            return {"jobs": [job.dict() for job in jobs], "count": len(jobs), "total": total, "page": search_request.page}
+        
+        if search_request.source == "hybrid":
+            remote_task = asyncio.ensure_future(ingest_jobs(search_request))
+            local_jobs, total = await search_local_jobs(search_request)
+            try:
+                remote_jobs = filter_job_details(
+                    await asyncio.wait_for(asyncio.shield(remote_task), HYBRID_SEARCH_REMOTE_WAIT_SECONDS), search_request
+                )
+            except asyncio.TimeoutError:
+                # Answer with local hits now; the remote pages are still stored for the next search
+                track_background_ingestion(remote_task)
+                return {
+                    "jobs": [job.dict() for job in local_jobs],
+                    "count": len(local_jobs),
+                    "total": total,
+                    "page": search_request.page,
+                    "remote_pending": True
+                }
+            except Exception as e:
+                logging.error(f"Remote job search failed, serving local results: {str(e)}")
+                remote_jobs = []
+            jobs = merge_job_results(local_jobs, remote_jobs, search_request.limit)
+            if search_request.collapse_duplicates:
+                jobs = collapse_duplicate_jobs(jobs)
+            return {"jobs": [job.dict() for job in jobs], "count": len(jobs), "total": total, "page": search_request.page, "remote_pending": False}
+        
+        if search_request.source != "remote":
+            raise HTTPException(status_code=400, detail="source must be one of local, remote or hybrid")
+        try:
+            jobs = filter_job_details(await ingest_jobs(search_request), search_request)
+        except ProviderUnavailableError as e:
+            # Job boards are failing fast; stored postings are better than an error
+            logging.warning(f"Serving local job results: {e.detail}")
+            jobs, total = await search_local_jobs(search_request)
+            return {"jobs": [job.dict() for job in jobs], "count": len(jobs), "total": total, "degraded": True}
+        if search_request.collapse_duplicates:
+            jobs = collapse_duplicate_jobs(jobs)
+        return {"jobs": [job.dict() for job in jobs], "count": len(jobs)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error searching jobs: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error searching jobs: {str(e)}")
+
+@api_router.get("/jobs/recent")
+async def get_recent_jobs(request: Request, response: Response, limit: int = 50):
+    """Get recently saved jobs"""
+    try:
+        key = f"jobs/recent:{limit}"
+        etag = resource_versions.get(key)
+        if etag and etag_matches(request, etag):
+            return not_modified(etag)
+        # Jobs are not edited after insert, so the ids on the page identify its content
+        page_etag = lambda jobs: f'W/"jobs-{section_content_hash([[job["id"], job.get("duplicate_of")] for job in jobs])}"'
+        heads = await db.jobs.find({}, {"_id": 0, "id": 1, "duplicate_of": 1}).sort("created_at", -1).limit(limit).to_list(limit)
+        etag = page_etag(heads)
+        if etag_matches(request, etag):
+            resource_versions.set(key, etag)
+            return not_modified(etag)
+        jobs = await db.jobs.find({}, {"minhash": 0}).sort("created_at", -1).limit(limit).to_list(limit)
+        # Tag what is actually returned, in case jobs arrived between the two reads
+        etag = page_etag(jobs)
+        resource_versions.set(key, etag)
+        set_etag(response, etag)
+        return [JobListing(**job) for job in jobs]
+    except Exception as e:
+        logging.error(f"Error getting recent jobs: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error getting recent jobs: {str(e)}")
+
+async def find_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Look a job up in the hot collection, then in the archive"""
+    job = await db.jobs.find_one({"id": job_id})
+    if not job:
+        job = await db.jobs_archive.find_one({"id": job_id})
+    return job
+
+def archive_job_operation(job: Dict[str, Any]) -> UpdateOne:
+    """Upsert that copies a job into db.jobs_archive so it outlives the jobs TTL"""
+    archived = {key: value for key, value in job.items() if key != "_id"}
+    return UpdateOne(
+        {"id": job["id"]},
+        {"$setOnInsert": {**archived, "archived_at": datetime.utcnow()}},
+        upsert=True
+    )
+
+async def compact_jobs() -> Dict[str, Any]:
+    """Archive every applied-to job still in the hot collection and prune expired index entries"""
+    started = time.perf_counter()
+    archived = 0
+
+    async def archive_chunk(chunk: List[str]) -> int:
+        archived_ids = set(await db.jobs_archive.distinct("id", {"id": {"$in": chunk}}))
+        missing_ids = [job_id for job_id in chunk if job_id not in archived_ids]
+        if not missing_ids:
+            return 0
+        batch = [archive_job_operation(job) async for job in db.jobs.find({"id": {"$in": missing_ids}})]
+        if not batch:
+            return 0
+        result = await db.jobs_archive.bulk_write(batch, ordered=False)
+        return result.upserted_count
+
+    # Applications written before archiving existed, or whose archive write failed.
+    # Stream the applied-to job ids instead of distinct(), which is capped at one 16MB reply
+    chunk = []
+    cursor = db.applications.aggregate([{"$group": {"_id": "$job_id"}}], allowDiskUse=True, batchSize=500)
+    async for group in cursor:
+        if group["_id"] is not None:
+            chunk.append(group["_id"])
+        if len(chunk) == 500:
+            archived += await archive_chunk(chunk)
+            chunk = []
+    if chunk:
+        archived += await archive_chunk(chunk)
+
+    now = datetime.utcnow()
+    pruned = job_duplicate_index.prune(
+        now - timedelta(days=JOB_RETENTION_DAYS), now - timedelta(days=JOB_POSTING_TTL_DAYS)
+    )
+    return {
+        "archived": archived,
+        "pruned_index_entries": pruned,
+        "hot_jobs": await db.jobs.estimated_document_count(),
+        "archived_jobs": await db.jobs_archive.estimated_document_count(),
+        "duration_ms": (time.perf_counter() - started) * 1000
+    }
+
+async def run_job_compaction_forever():
+    while True:
+        try:
+            stats = await compact_jobs()
+            logging.info(f"Job compaction: {stats}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Error compacting jobs: {str(e)}")
+        await asyncio.sleep(JOB_COMPACTION_INTERVAL_SECONDS)
+
+job_compaction_task: Optional[asyncio.Task] = None
+
+@api_router.post("/jobs/compact")
+async def run_job_compaction():
+    """Archive applied-to jobs and report hot and archive collection sizes"""
+    try:
+        return await compact_jobs()
+    except Exception as e:
+        logging.error(f"Error compacting jobs: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error compacting jobs: {str(e)}")
+
+@api_router.get("/jobs/{job_id}/duplicates", response_model=List[JobListing])
+async def get_job_duplicates(job_id: str):
+    """Get the stored near-duplicates of a job"""
+    try:
+        duplicate_ids = job_duplicate_index.duplicates_of(job_id)
+        if not duplicate_ids:
+            return []
+        jobs = await db.jobs.find({"id": {"$in": duplicate_ids}}, {"minhash": 0}).to_list(len(duplicate_ids))
+        return [JobListing(**job) for job in jobs]
+    except Exception as e:
+        logging.error(f"Error getting job duplicates: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error getting job duplicates: {str(e)}")
+
+@api_router.post("/skills/extract")
+async def extract_skills(request: SkillExtractRequest):
+    """Normalize the taxonomy skills mentioned in a piece of text"""
+    skills = skill_matcher.extract(request.text)
+    return {"skills": skills, "categories": {skill: skill_matcher.categories.get(skill, "other") for skill in skills}}
+
+@api_router.get("/resume/{resume_id}/job-matches")
+async def get_resume_job_matches(resume_id: str, limit: int = 20, scan: int = 2000):
+    """Rank the newest stored jobs by how many of their skills the resume covers"""
+    try:
+        resume = await db.resumes.find_one({"id": resume_id})
+        if not resume:
+            raise HTTPException(status_code=404, detail="Resume not found")
+        resume_skills = set(resume_skill_report(resume_from_document(resume))["detected_skills"])
+
+        scored = []
+        cursor = db.jobs.find(
+            {"duplicate_of": None},
+            {"_id": 0, "id": 1, "title": 1, "company": 1, "location": 1, "description": 1, "requirements": 1, "skills": 1, "extraction_version": 1}
+        ).sort("created_at", -1).limit(scan)
+        async for job in cursor:
+            # Jobs the backfill has not reached yet are extracted here
+            job_skills = job["skills"] if job.get("extraction_version") else extract_job_details(job)["skills"]
+            match = job_skill_match(resume_skills, job_skills)
+            if match["matched_skills"]:
+                scored.append((match["score"], len(match["matched_skills"]), {
+                    "job_id": job["id"],
+                    "title": job.get("title", ""),
+                    "company": job.get("company", ""),
+                    "location": job.get("location", ""),
+                    **match
+                }))
+        top = heapq.nlargest(limit, scored, key=lambda item: (item[0], item[1]))
+        return {"resume_skills": sorted(resume_skills), "matches": [item[2] for item in top]}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error matching jobs: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error matching jobs: {str(e)}")
+
+class JobCrawler:
+    """Runs saved job queries on a schedule and stores postings from each query's watermark on
+
+    Scheduled and manual runs claim the query with a lease through find_one_and_update,
+    like the email outbox, so several crawler processes never run the same query at once.
+    """
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run_forever())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def run_forever(self):
+        while True:
+            try:
+                query = await self.claim_due_query()
+                if query:
+                    await self.run_query(query)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Job crawler error: {str(e)}")
+            await asyncio.sleep(CRAWLER_POLL_SECONDS)
+
+    async def claim(self, match: Dict[str, Any], changes: Optional[Dict[str, Any]] = None) -> Optional[SavedJobQuery]:
+        """Lease a matching query that no live crawl holds"""
+        now = datetime.utcnow()
+        claimed = await db.saved_job_queries.find_one_and_update(
+            # A lease that was never taken or has expired, e.g. because its worker died
+            {**match, "lease_expires_at": {"$not": {"$gt": now}}},
+            {"$set": {
+                **(changes or {}),
+                "locked_by": self.worker_id,
+                "lease_expires_at": now + timedelta(seconds=CRAWLER_LEASE_SECONDS)
+            }},
+            return_document=ReturnDocument.AFTER
+        )
+        return SavedJobQuery(**claimed) if claimed else None
+
+    async def claim_due_query(self) -> Optional[SavedJobQuery]:
+        now = datetime.utcnow()
+        query = await db.saved_job_queries.find_one(
+            {"enabled": True, "next_run_at": {"$lte": now}, "lease_expires_at": {"$not": {"$gt": now}}},
+            sort=[("next_run_at", 1)]
+        )
+        if not query:
+            return None
+        return await self.claim(
+            {"id": query["id"], "next_run_at": query["next_run_at"]},
+            {"next_run_at": now + timedelta(minutes=query.get("interval_minutes", 60))}
+        )
+
+    async def crawl_source(self, http_client: httpx.AsyncClient, query: SavedJobQuery, source: JobSource, run: CrawlRun, page_latencies: List[float]) -> Optional[datetime]:
+        """Page through one source newest-first until past the watermark; returns the new watermark
+
+        Postings at the watermark are fetched again, since another one can share its
+        timestamp; store_job_page maps repeats to their stored copy by (source, external_id).
+        """
+        watermark = query.watermarks.get(source.name)
+        search = JobSearchRequest(
+            keywords=query.keywords,
+            location=query.location,
+            salary_min=query.salary_min,
+            salary_max=query.salary_max,
+            limit=query.max_results,
+            # Let the source skip old postings when it can
+            max_days_old=(datetime.utcnow() - watermark).days + 1 if watermark else None
+        )
+        newest = watermark
+        page = 1
+        fetched = 0
+        while fetched < query.max_results:
+            started = time.perf_counter()
+            page_jobs = await fetch_source_page(http_client, source, search, page, source.page_size)
+            page_latencies.append((time.perf_counter() - started) * 1000)
+            run.pages_fetched += 1
+            fetched += len(page_jobs)
+            run.jobs_fetched += len(page_jobs)
+
+            fresh = []
+            for job_data in page_jobs:
+                job_data["posted_date"] = to_naive_utc(job_data["posted_date"])
+                if watermark is None or job_data["posted_date"] >= watermark:
+                    fresh.append(prepare_job_listing(job_data))
+            if fresh:
+                fresh_ids = {job.id for job in fresh}
+                stored = await store_job_page(fresh)
+                run.jobs_stored += sum(1 for job in stored if job.id in fresh_ids)
+                newest = max([job.posted_date for job in fresh] + ([newest] if newest else []))
+
+            # Results are sorted by date, so an old posting or a short page means we are caught up
+            if len(fresh) < len(page_jobs) or len(page_jobs) < source.page_size:
+                break
+            page += 1
+        return newest
+
+    async def run_query(self, query: SavedJobQuery) -> CrawlRun:
+        run = CrawlRun(query_id=query.id, query_name=query.name)
+        started = time.perf_counter()
+        page_latencies: List[float] = []
+        watermarks = dict(query.watermarks)
+
+        async with httpx.AsyncClient(timeout=JOB_INGEST_TIMEOUT_SECONDS) as http_client:
+            for name in query.sources or DEFAULT_JOB_SOURCES:
+                source = job_sources.get(name)
+                if source is None:
+                    run.errors.append(f"Unknown job source: {name}")
+                    continue
+                try:
+                    newest = await self.crawl_source(http_client, query, source, run, page_latencies)
+                    if newest:
+                        watermarks[name] = newest
+                except Exception as e:
+                    logging.error(f"Error crawling {name} for query {query.name}: {str(e)}")
+                    run.errors.append(f"{name}: {str(e)}")
+
+        run.finished_at = datetime.utcnow()
+        run.duration_ms = (time.perf_counter() - started) * 1000
+        if page_latencies:
+            run.avg_page_latency_ms = sum(page_latencies) / len(page_latencies)
+        if run.duration_ms:
+            run.jobs_per_second = run.jobs_fetched / (run.duration_ms / 1000)
+
+        # Release the lease; a run whose lease expired and was taken over leaves the watermarks to the new holder
+        await db.saved_job_queries.update_one(
+            {"id": query.id, "locked_by": self.worker_id},
+            {
+                "$set": {"watermarks": watermarks, "last_run_at": run.finished_at},
+                "$unset": {"locked_by": "", "lease_expires_at": ""}
+            }
+        )
+        await db.crawler_runs.insert_one(run.dict())
+        logging.info(
+            f"Crawled {query.name}: {run.jobs_fetched} fetched, {run.jobs_stored} stored "
+            f"in {run.duration_ms:.0f}ms ({run.jobs_per_second:.1f} jobs/s)"
+        )
+        return run
+
+job_crawler = JobCrawler()
+
+@api_router.post("/crawler/queries", response_model=SavedJobQuery)
+async def create_saved_job_query(query_request: SavedJobQueryRequest):
+    """Add a saved query for the background job crawler"""
+    try:
+        unknown = [name for name in query_request.sources if name not in job_sources]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown job sources: {', '.join(unknown)}")
+        query = SavedJobQuery(**query_request.dict())
+        await db.saved_job_queries.insert_one(query.dict())
+        return query
+    except HTTPException:
+        raise
     except Exception as e:
-        logging.error(f"Error parsing uploaded resume: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error parsing resume: {str(e)}")
+        logging.error(f"Error creating saved job query: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error creating saved job query: {str(e)}")
 
-# New API Endpoints for Job Search and Email Automation
-@api_router.post("/jobs/search")
-async def search_jobs(search_request: JobSearchRequest):
-    """Search for jobs using Adzuna API"""
+@api_router.get("/crawler/queries", response_model=List[SavedJobQuery])
+async def get_saved_job_queries():
+    """Get all saved crawler queries"""
     try:
-        jobs_data = await search_jobs_adzuna(
-            keywords=search_request.keywords,
-            location=search_request.location,
-            salary_min=search_request.salary_min,
-            limit=search_request.limit
-        )
-        
-        # Store jobs in database
-        jobs = []
-        for job_data in jobs_data:
-            job = JobListing(**job_data)
-            jobs.append(job)
-            
-            # Check if job already exists
-            existing_job = await db.jobs.find_one({"external_id": job.external_id, "source": job.source})
-            if not existing_job:
-                await db.jobs.insert_one(job.dict())
-        
-        return {"jobs": [job.dict() for job in jobs], "count": len(jobs)}
+        queries = await db.saved_job_queries.find().to_list(100)
+        return [SavedJobQuery(**query) for query in queries]
     except Exception as e:
-        logging.error(f"Error searching jobs: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error searching jobs: {str(e)}")
+        logging.error(f"Error getting saved job queries: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error getting saved job queries: {str(e)}")
 
-@api_router.get("/jobs/recent")
-async def get_recent_jobs(limit: int = 50):
-    """Get recently saved jobs"""
+@api_router.post("/crawler/queries/{query_id}/run", response_model=CrawlRun)
+async def run_saved_job_query(query_id: str):
+    """Run a saved crawler query immediately"""
     try:
-        jobs = await db.jobs.find().sort("created_at", -1).limit(limit).to_list(limit)
-        return [JobListing(**job) for job in jobs]
+        query = await job_crawler.claim({"id": query_id})
+        if not query:
+            if not await db.saved_job_queries.find_one({"id": query_id}, {"_id": 1}):
+                raise HTTPException(status_code=404, detail="Saved query not found")
+            raise HTTPException(status_code=409, detail="Saved query is already running")
+        return await job_crawler.run_query(query)
+    except HTTPException:
+        raise
     except Exception as e:
-        logging.error(f"Error getting recent jobs: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error getting recent jobs: {str(e)}")
+        logging.error(f"Error running saved job query: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error running saved job query: {str(e)}")
+
+@api_router.get("/crawler/runs", response_model=List[CrawlRun])
+async def get_crawler_runs(limit: int = 50):
+    """Get the most recent crawler runs with their throughput and latency"""
+    try:
+        runs = await db.crawler_runs.find().sort("started_at", -1).limit(limit).to_list(limit)
+        return [CrawlRun(**run) for run in runs]
+    except Exception as e:
+        logging.error(f"Error getting crawler runs: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error getting crawler runs: {str(e)}")
 
 @api_router.post("/jobs/apply")
-async def apply_to_jobs(application_request: JobApplicationRequest, background_tasks: BackgroundTasks):
+async def apply_to_jobs(application_request: JobApplicationRequest):
     """Apply to multiple jobs automatically"""
     try:
         # Get user's resume
-        resume = await db.resumes.find_one({"id": application_request.resume_id})
+        with profile_span("mongo.resumes.find"):
+            resume = await db.resumes.find_one({"id": application_request.resume_id})
         if not resume:
             raise HTTPException(status_code=404, detail="Resume not found")
         
-        resume_content = ResumeContent(**resume)
+        with profile_span("pydantic.resume"):
+            resume_content = resume_from_document(resume)
         applicant_name = resume_content.personal_info.get('name', 'Job Applicant')
         
+        # Render the resume once for every email in this request; later applies reuse the cached file
+        attachment_key = attachment_filename = None
+        if application_request.send_emails and RESUME_ATTACHMENT_FORMAT:
+            try:
+                with profile_span("resume_export.render"):
+                    attachment_key, _ = await get_or_render_resume_export(
+                        resume_content, RESUME_ATTACHMENT_FORMAT, RESUME_ATTACHMENT_TEMPLATE
+                    )
+                attachment_filename = resume_export_filename(resume_content, RESUME_ATTACHMENT_FORMAT)
+            except Exception as e:
+                logging.warning(f"Sending applications without a resume attachment: {str(e)}")
+        
         applications = []
+        outbox_emails = []
+        cached_cover_letters = 0
+        skipped_duplicates = []
+        applied_jobs = []
+        
+        # Near-duplicate groups this user has already applied to
+        with profile_span("mongo.applications.find"):
+            previous_applications = await db.applications.find(
+                {"user_id": application_request.user_id}, {"job_id": 1}
+            ).to_list(None)
+        applied_groups = {job_duplicate_index.canonical_id(app["job_id"]) for app in previous_applications}
+        
         for job_id in application_request.job_ids:
             # Get job details
-            job = await db.jobs.find_one({"id": job_id})
+            with profile_span("mongo.jobs.find"):
+                job = await find_job(job_id)
             if not job:
                 continue
                 
-            job_listing = JobListing(**job)
+            with profile_span("pydantic.job"):
+                job_listing = JobListing(**job)
+            
+            group = job_listing.duplicate_of or job_duplicate_index.canonical_id(job_id)
+            if group in applied_groups and not application_request.allow_duplicates:
+                skipped_duplicates.append(job_id)
+                continue
+            applied_groups.add(group)
             
             # Generate cover letter
             job_posting = JobPosting(
@@ -755,17 +4080,14 @@ async def apply_to_jobs(application_request: JobApplicationRequest, background_t
                 requirements=job_listing.requirements
             )
             
-            cover_letter_content = await generate_cover_letter_with_ai(resume_content, job_posting)
-            
-            # Create cover letter record
-            cover_letter = CoverLetter(
-                resume_id=application_request.resume_id,
-                job_posting=job_listing.description,
-                company_name=job_listing.company,
-                position_title=job_listing.title,
-                content=cover_letter_content
-            )
-            await db.cover_letters.insert_one(cover_letter.dict())
+            # Retries reuse the letters generated on the previous attempt
+            with profile_span("cover_letter"):
+                cover_letter, cached = await get_or_generate_cover_letter(
+                    resume_content, job_posting, application_request.regenerate_cover_letters
+                )
+            cover_letter_content = cover_letter.content
+            if cached:
+                cached_cover_letters += 1
             
             # Create application record
             application = JobApplication(
@@ -777,59 +4099,540 @@ async def apply_to_jobs(application_request: JobApplicationRequest, background_t
                 cover_letter_id=cover_letter.id
             )
             
-            await db.applications.insert_one(application.dict())
+            with profile_span("mongo.applications.insert"):
+                await db.applications.insert_one(application.dict())
             applications.append(application)
+            applied_jobs.append(job)
             
             # Send email if requested
             if application_request.send_emails:
-                # Try to get company contact info
-                company_contact = await db.company_contacts.find_one({"company_name": job_listing.company})
-                if company_contact:
-                    recipient_emails = company_contact["email_addresses"]
-                else:
-                    # Generate likely email addresses
-                    company_domain = job_listing.company.lower().replace(" ", "").replace(",", "").replace(".", "") + ".com"
-                    recipient_emails = [f"hr@{company_domain}", f"jobs@{company_domain}"]
+                recipient_emails = company_directory.recipient_emails(job_listing.company)
                 
-                background_tasks.add_task(
-                    send_application_email,
-                    application.id,
-                    applicant_name,
-                    job_listing.company,
-                    job_listing.title,
-                    cover_letter_content,
-                    recipient_emails
-                )
+                outbox_emails.append(OutboxEmail(
+                    application_id=application.id,
+                    user_id=application_request.user_id,
+                    applicant_name=applicant_name,
+                    company_name=job_listing.company,
+                    position=job_listing.title,
+                    cover_letter=cover_letter_content,
+                    recipient_emails=recipient_emails,
+                    attachment_key=attachment_key,
+                    attachment_filename=attachment_filename
+                ))
+        
+        if applications:
+            with profile_span("mongo.user_stats.update"):
+                await increment_user_stats(application_request.user_id, {
+                    "applications_total": len(applications),
+                    "applications_by_status.pending": len(applications)
+                })
         
-        return {"applications": [app.dict() for app in applications], "count": len(applications)}
+        # Applied-to jobs are kept in the archive after the hot collection expires them
+        if applied_jobs:
+            with profile_span("mongo.jobs_archive.bulk_write"):
+                await db.jobs_archive.bulk_write([archive_job_operation(job) for job in applied_jobs], ordered=False)
+        
+        # Emails are delivered by the outbox dispatcher and survive worker restarts
+        if outbox_emails:
+            with profile_span("mongo.email_outbox.insert"):
+                await db.email_outbox.insert_many([email.dict() for email in outbox_emails])
+            email_outbox_dispatcher.notify()
+        
+        return {
+            "applications": [app.dict() for app in applications],
+            "count": len(applications),
+            "cached_cover_letters": cached_cover_letters,
+            "skipped_duplicates": skipped_duplicates
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error applying to jobs: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error applying to jobs: {str(e)}")
 
-async def send_application_email(application_id: str, applicant_name: str, company_name: str, position: str, cover_letter: str, recipient_emails: List[str]):
-    """Background task to send application email"""
+class AsyncRateLimiter:
+    """Spaces out calls so that at most `rate` start per second"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_slot = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self.lock:
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            delay = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class EmailOutboxDispatcher:
+    """Delivers queued application emails from db.email_outbox
+
+    Batches are claimed with find_one_and_update leases, so several workers can
+    run a dispatcher at once and a crashed worker's emails are picked up again
+    once its lease expires. Failed sends are retried with exponential backoff.
+    """
+
+    def __init__(self):
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.semaphore = asyncio.Semaphore(OUTBOX_CONCURRENCY)
+        self.rate_limiter = AsyncRateLimiter(OUTBOX_RATE_PER_SECOND)
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def notify(self):
+        """Wake the dispatcher after new emails were enqueued"""
+        self.wakeup.set()
+
+    async def run(self):
+        while True:
+            # Leave emails unclaimed while Resend's circuit is open so they do not use up attempts
+            resend_guard = provider_guards["resend"]
+            if resend_guard.state == "open":
+                await asyncio.sleep(resend_guard.retry_after())
+                continue
+            try:
+                batch = await self.claim_batch()
+                if batch:
+                    await self.dispatch_batch(batch)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Email outbox dispatcher error: {str(e)}")
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=OUTBOX_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+
+    async def claim_batch(self) -> List[Dict[str, Any]]:
+        batch = []
+        while len(batch) < OUTBOX_BATCH_SIZE:
+            now = datetime.utcnow()
+            email = await db.email_outbox.find_one_and_update(
+                {"$or": [
+                    {"status": "pending", "next_attempt_at": {"$lte": now}},
+                    # Emails whose sender died mid-flight
+                    {"status": "sending", "lease_expires_at": {"$lte": now}}
+                ]},
+                {
+                    "$set": {
+                        "status": "sending",
+                        "locked_by": self.worker_id,
+                        "lease_expires_at": now + timedelta(seconds=OUTBOX_LEASE_SECONDS)
+                    },
+                    "$inc": {"attempts": 1}
+                },
+                sort=[("next_attempt_at", 1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if not email:
+                break
+            batch.append(email)
+        return batch
+
+    async def send_one(self, email: Dict[str, Any], attachments: Dict[str, bytes]) -> Tuple[Dict[str, Any], Optional[Dict], Optional[str]]:
+        async with self.semaphore:
+            await self.rate_limiter.wait()
+            try:
+                attachment = attachments.get(email.get("attachment_key"))
+                result = await send_job_application_email(
+                    applicant_name=email["applicant_name"],
+                    company_name=email["company_name"],
+                    position=email["position"],
+                    cover_letter=email["cover_letter"],
+                    recipient_emails=email["recipient_emails"],
+                    attachments=[{
+                        "filename": email.get("attachment_filename") or "resume.pdf",
+                        "content": list(attachment)
+                    }] if attachment else None,
+                    tags={"application_id": email["application_id"]} if email.get("application_id") else None,
+                    # A retry after a timeout may follow a send Resend already accepted; the key makes it a no-op
+                    idempotency_key=f"outbox/{email['id']}"
+                )
+                return email, result, None
+            except HTTPException as e:
+                return email, None, str(e.detail)
+            except Exception as e:
+                return email, None, str(e)
+
+    async def dispatch_batch(self, batch: List[Dict[str, Any]]):
+        # Emails from one apply request share a rendered resume, load each file once
+        attachment_keys = list({email["attachment_key"] for email in batch if email.get("attachment_key")})
+        attachments = {}
+        if attachment_keys:
+            async for export in db.resume_exports.find({"key": {"$in": attachment_keys}}):
+                attachments[export["key"]] = bytes(export["content"])
+            for key in set(attachment_keys) - set(attachments):
+                logging.warning(f"Resume export {key} has expired, sending without attachment")
+        results = await asyncio.gather(*(self.send_one(email, attachments) for email in batch))
+
+        now = datetime.utcnow()
+        outbox_updates = []
+        application_updates = []
+        stats_updates = []
+        for email, result, error in results:
+            lease = {"id": email["id"], "locked_by": self.worker_id}
+            if error is None:
+                email_id = result.get("id") if isinstance(result, dict) else None
+                outbox_updates.append(UpdateOne(lease, {"$set": {
+                    "status": "sent", "email_id": email_id, "sent_at": now,
+                    "lease_expires_at": None, "last_error": None
+                }}))
+                if email.get("application_id"):
+                    application_updates.append(UpdateOne(
+                        {"id": email["application_id"]},
+                        {"$set": {"email_sent": True, "email_id": email_id, "status": "sent"}}
+                    ))
+                if email.get("user_id"):
+                    stats_updates.append(user_stats_operation(email["user_id"], {
+                        "applications_by_status.pending": -1,
+                        "applications_by_status.sent": 1,
+                        "application_emails_sent": 1
+                    }))
+                logging.info(f"Application email sent for {email.get('application_id')}")
+            elif email["attempts"] >= OUTBOX_MAX_ATTEMPTS:
+                outbox_updates.append(UpdateOne(lease, {"$set": {
+                    "status": "failed", "last_error": error, "lease_expires_at": None
+                }}))
+                if email.get("application_id"):
+                    application_updates.append(UpdateOne(
+                        {"id": email["application_id"]},
+                        {"$set": {"status": "failed"}}
+                    ))
+                if email.get("user_id"):
+                    stats_updates.append(user_stats_operation(email["user_id"], {
+                        "applications_by_status.pending": -1,
+                        "applications_by_status.failed": 1
+                    }))
+                logging.error(f"Giving up on application email for {email.get('application_id')}: {error}")
+            else:
+                backoff = min(
+                    OUTBOX_BACKOFF_MAX_SECONDS,
+                    OUTBOX_BACKOFF_BASE_SECONDS * 2 ** (email["attempts"] - 1)
+                )
+                # Jitter keeps retries from a burst of failures from lining up again
+                backoff *= random.uniform(0.8, 1.2)
+                outbox_updates.append(UpdateOne(lease, {"$set": {
+                    "status": "pending", "last_error": error, "lease_expires_at": None,
+                    "next_attempt_at": now + timedelta(seconds=backoff)
+                }}))
+                logging.warning(f"Retrying application email for {email.get('application_id')} in {backoff:.0f}s: {error}")
+
+        if outbox_updates:
+            await db.email_outbox.bulk_write(outbox_updates, ordered=False)
+        if application_updates:
+            await db.applications.bulk_write(application_updates, ordered=False)
+        if stats_updates:
+            await db.user_stats.bulk_write(stats_updates, ordered=False)
+
+email_outbox_dispatcher = EmailOutboxDispatcher()
+
+# Webhook event types: the campaign counter they increment and the application status they move to
+EMAIL_EVENT_CAMPAIGN_COUNTERS = {
+    "email.delivered": "emails_delivered",
+    "email.opened": "emails_opened",
+    "email.bounced": "emails_bounced",
+    "email.replied": "replies_received",
+}
+EMAIL_EVENT_APPLICATION_STATUSES = {
+    "email.delivered": "delivered",
+    "email.opened": "opened",
+    "email.bounced": "bounced",
+    "email.replied": "replied",
+}
+# Events only move an application forward; statuses not listed here (interview, failed, ...) are final
+EMAIL_EVENT_STATUS_RANK = {"pending": 0, "sent": 1, "delivered": 2, "opened": 3, "bounced": 3, "replied": 4}
+
+def verify_webhook_signature(headers: Any, body: bytes) -> bool:
+    """Check a Svix-style signature, as sent by Resend, against RESEND_WEBHOOK_SECRET"""
+    message_id = headers.get("svix-id", "")
+    timestamp = headers.get("svix-timestamp", "")
+    signatures = headers.get("svix-signature", "")
     try:
-        email_result = await send_job_application_email(
-            applicant_name=applicant_name,
-            company_name=company_name,
-            position=position,
-            cover_letter=cover_letter,
-            recipient_emails=recipient_emails
-        )
-        
-        # Update application with email info
-        await db.applications.update_one(
-            {"id": application_id},
-            {"$set": {"email_sent": True, "email_id": email_result.get("id"), "status": "sent"}}
-        )
-        
-        logging.info(f"Application email sent for {application_id}")
+        if abs(time.time() - int(timestamp)) > EMAIL_WEBHOOK_TOLERANCE_SECONDS:
+            return False
+    except ValueError:
+        return False
+    secret = base64.b64decode(RESEND_WEBHOOK_SECRET.split("_", 1)[-1])
+    expected = base64.b64encode(
+        hmac.new(secret, f"{message_id}.{timestamp}.".encode("utf-8") + body, hashlib.sha256).digest()
+    ).decode("ascii")
+    return any(
+        hmac.compare_digest(signature.split(",", 1)[-1], expected)
+        for signature in signatures.split()
+    )
+
+def email_event_tags(data: Dict[str, Any]) -> Dict[str, str]:
+    """Tags of an event, given as a {name: value} object or a [{name, value}] list"""
+    tags = data.get("tags") or {}
+    if isinstance(tags, list):
+        return {tag.get("name"): tag.get("value") for tag in tags if isinstance(tag, dict)}
+    return tags if isinstance(tags, dict) else {}
+
+class EmailEventBuffer:
+    """Aggregates webhook events in memory and applies them as a few bulk writes
+
+    Campaign counters become one $inc per campaign and each application one
+    status change per flush, so a burst of events costs a handful of writes per
+    interval. Events still buffered when a worker dies are lost; counters can
+    be recomputed from the provider if that matters.
+    """
+
+    def __init__(self):
+        self.campaign_counts: Dict[str, Dict[str, int]] = {}
+        self.application_events: Dict[str, str] = {}  # application id -> furthest status reached
+        self.email_events: Dict[str, str] = {}  # untagged events by provider email id
+        self.seen_ids: OrderedDict = OrderedDict()  # recent webhook ids, providers retry deliveries
+        self.buffered = 0
+        self.pending_stats: List[UpdateOne] = []  # user_stats moves of applied status changes not yet written
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.stats = {"received": 0, "ignored": 0, "duplicates": 0, "flushes": 0, "writes": 0}
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self.flush()
+
+    @staticmethod
+    def advance(current: Optional[str], status: str) -> str:
+        if current is None or EMAIL_EVENT_STATUS_RANK[status] > EMAIL_EVENT_STATUS_RANK[current]:
+            return status
+        return current
+
+    def add(self, event: Dict[str, Any], event_id: Optional[str] = None) -> bool:
+        """Buffer one event; returns False for duplicates and event types that change nothing"""
+        self.stats["received"] += 1
+        if event_id:
+            if event_id in self.seen_ids:
+                self.stats["duplicates"] += 1
+                return False
+            self.seen_ids[event_id] = True
+            if len(self.seen_ids) > 10 * EMAIL_EVENT_BUFFER_MAX:
+                self.seen_ids.popitem(last=False)
+
+        event_type = event.get("type")
+        data = event.get("data") or {}
+        if event_type not in EMAIL_EVENT_CAMPAIGN_COUNTERS:
+            self.stats["ignored"] += 1
+            return False
+        tags = email_event_tags(data)
+        status = EMAIL_EVENT_APPLICATION_STATUSES[event_type]
+        if tags.get("campaign_id"):
+            counts = self.campaign_counts.setdefault(tags["campaign_id"], {})
+            counter = EMAIL_EVENT_CAMPAIGN_COUNTERS[event_type]
+            counts[counter] = counts.get(counter, 0) + 1
+        elif tags.get("application_id"):
+            application_id = tags["application_id"]
+            self.application_events[application_id] = self.advance(self.application_events.get(application_id), status)
+        elif data.get("email_id"):
+            email_id = data["email_id"]
+            self.email_events[email_id] = self.advance(self.email_events.get(email_id), status)
+        else:
+            self.stats["ignored"] += 1
+            return False
+
+        self.buffered += 1
+        if self.buffered >= EMAIL_EVENT_BUFFER_MAX:
+            self.wakeup.set()
+        return True
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=EMAIL_EVENT_FLUSH_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Error flushing email events: {str(e)}")
+
+    def restore(self, campaign_counts: Dict[str, Dict[str, int]], application_events: Dict[str, str], email_events: Dict[str, str]):
+        """Put back events a failed flush did not write, merged with those buffered since"""
+        for campaign_id, counts in campaign_counts.items():
+            merged = self.campaign_counts.setdefault(campaign_id, {})
+            for counter, count in counts.items():
+                merged[counter] = merged.get(counter, 0) + count
+        for application_id, status in application_events.items():
+            self.application_events[application_id] = self.advance(self.application_events.get(application_id), status)
+        for email_id, status in email_events.items():
+            self.email_events[email_id] = self.advance(self.email_events.get(email_id), status)
+        self.buffered += len(campaign_counts) + len(application_events) + len(email_events)
+
+    async def apply_statuses(self, application_events: Dict[str, str], email_events: Dict[str, str]) -> int:
+        """Move applications to their new statuses; queues user_stats moves for the changes that applied"""
+        # One read resolves untagged events and the current status the changes start from
+        planned = {}
+        async for application in db.applications.find(
+            {"$or": [{"id": {"$in": list(application_events)}}, {"email_id": {"$in": list(email_events)}}]},
+            {"_id": 0, "id": 1, "email_id": 1, "status": 1, "user_id": 1}
+        ):
+            status = application_events.get(application["id"])
+            if application.get("email_id") in email_events:
+                status = self.advance(status, email_events[application["email_id"]])
+            current = application.get("status")
+            if current in EMAIL_EVENT_STATUS_RANK and self.advance(current, status) != current:
+                planned[application["id"]] = (current, status, application["user_id"])
+        if not planned:
+            return 0
+
+        # Matching on the status read keeps a concurrent change from being overwritten; the
+        # flush id marks which updates matched, so only those move the user's counters
+        flush_id = uuid.uuid4().hex
+        await db.applications.bulk_write([
+            UpdateOne(
+                {"id": application_id, "status": current},
+                {"$set": {"status": status, "status_updated_at": datetime.utcnow(), "email_event_flush": flush_id}}
+            )
+            for application_id, (current, status, _) in planned.items()
+        ], ordered=False)
+        async for application in db.applications.find(
+            {"id": {"$in": list(planned)}, "email_event_flush": flush_id}, {"_id": 0, "id": 1}
+        ):
+            current, status, user_id = planned[application["id"]]
+            self.pending_stats.append(user_stats_operation(user_id, {
+                f"applications_by_status.{current}": -1,
+                f"applications_by_status.{status}": 1
+            }))
+        return len(planned)
+
+    async def flush(self):
+        if not self.buffered and not self.pending_stats:
+            return
+        campaign_counts, self.campaign_counts = self.campaign_counts, {}
+        application_events, self.application_events = self.application_events, {}
+        email_events, self.email_events = self.email_events, {}
+        self.buffered = 0
+
+        # Webhook ids are already marked seen, so events that fail to write are buffered again
+        # for the next flush rather than dropped
+        writes = 0
+        try:
+            if campaign_counts:
+                await db.email_campaigns.bulk_write([
+                    UpdateOne({"id": campaign_id}, {"$inc": counts})
+                    for campaign_id, counts in campaign_counts.items()
+                ], ordered=False)
+                writes += len(campaign_counts)
+        except Exception:
+            self.restore(campaign_counts, application_events, email_events)
+            raise
+        try:
+            if application_events or email_events:
+                writes += await self.apply_statuses(application_events, email_events)
+        except Exception:
+            # Status changes are guarded by the current status, so re-applying them is safe
+            self.restore({}, application_events, email_events)
+            raise
+        if self.pending_stats:
+            stats_updates, self.pending_stats = self.pending_stats, []
+            try:
+                await db.user_stats.bulk_write(stats_updates, ordered=False)
+            except Exception:
+                self.pending_stats = stats_updates + self.pending_stats
+                raise
+            writes += len(stats_updates)
+        self.stats["flushes"] += 1
+        self.stats["writes"] += writes
+
+email_event_buffer = EmailEventBuffer()
+
+@api_router.post("/email/webhook")
+async def receive_email_events(request: Request):
+    """Accept delivery, open, bounce and reply events, one event or a list of them"""
+    body = await request.body()
+    if RESEND_WEBHOOK_SECRET:
+        if not verify_webhook_signature(request.headers, body):
+            raise HTTPException(status_code=401, detail="Invalid webhook signature")
+    elif not RESEND_WEBHOOK_ALLOW_UNSIGNED:
+        # Unsigned events could move application statuses and counters for anyone
+        raise HTTPException(status_code=503, detail="Email webhook is not configured")
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Webhook body must be JSON")
+    events = payload if isinstance(payload, list) else [payload]
+    if not all(isinstance(event, dict) for event in events):
+        raise HTTPException(status_code=400, detail="Webhook events must be JSON objects")
+    # A signed delivery carries one event; its id identifies retries
+    event_id = request.headers.get("svix-id") if len(events) == 1 else None
+    accepted = sum(1 for event in events if email_event_buffer.add(event, event_id))
+    return {"accepted": accepted, "received": len(events)}
+
+@api_router.get("/email/webhook/stats")
+async def get_email_event_stats():
+    """Get webhook event counters and the number of events waiting to be flushed in this worker"""
+    return {**email_event_buffer.stats, "buffered": email_event_buffer.buffered}
+
+@api_router.get("/cache/stats")
+async def get_cache_stats():
+    """Get cache counters per namespace for this worker"""
+    return {
+        "backend": CACHE_BACKEND,
+        "namespaces": {
+            namespace: {
+                **stats,
+                "hit_rate": stats["hits"] / (stats["hits"] + stats["misses"]) if stats["hits"] + stats["misses"] else 0.0
+            }
+            for namespace, stats in cache.stats.items()
+        }
+    }
+
+@api_router.get("/providers/health")
+async def get_provider_health():
+    """Get circuit state, call counters and latency of each external provider for this worker"""
+    return {
+        name: {
+            "state": guard.state,
+            "retry_after": round(guard.retry_after(), 1),
+            "consecutive_failures": guard.consecutive_failures,
+            "hedge_delay_ms": round(guard.hedge_delay() * 1000) if guard.hedge_delay() is not None else None,
+            **guard.stats
+        }
+        for name, guard in provider_guards.items()
+    }
+
+@api_router.get("/email/outbox/stats")
+async def get_email_outbox_stats():
+    """Get the number of outbox emails in each status"""
+    try:
+        counts = await db.email_outbox.aggregate([
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+        ]).to_list(None)
+        return {entry["_id"]: entry["count"] for entry in counts}
     except Exception as e:
-        logging.error(f"Error sending application email for {application_id}: {str(e)}")
-        await db.applications.update_one(
-            {"id": application_id},
-            {"$set": {"status": "failed"}}
-        )
+        logging.error(f"Error getting email outbox stats: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error getting email outbox stats: {str(e)}")
 
 @api_router.get("/applications/{user_id}")
 async def get_user_applications(user_id: str):
@@ -841,11 +4644,224 @@ async def get_user_applications(user_id: str):
         logging.error(f"Error getting user applications: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error getting user applications: {str(e)}")
 
+def response_rate(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Add send and response rates to an analytics group"""
+    sent = entry.get("sent", 0)
+    applications = entry.get("applications", 0)
+    entry["send_rate"] = sent / applications if applications else 0.0
+    entry["response_rate"] = entry.get("responses", 0) / sent if sent else 0.0
+    return entry
+
+@api_router.get("/applications/{user_id}/analytics")
+async def get_application_analytics(
+    user_id: str,
+    since_days: Optional[int] = Query(None, ge=1),
+    top_companies: int = Query(20, ge=1, le=100)
+):
+    """Summarize a user's applications by status, company and week in one aggregation"""
+    try:
+        match: Dict[str, Any] = {"user_id": user_id}
+        if since_days:
+            match["application_date"] = {"$gte": datetime.utcnow() - timedelta(days=since_days)}
+        
+        group_metrics = {
+            "applications": {"$sum": 1},
+            "sent": {"$sum": {"$cond": ["$sent", 1, 0]}},
+            "failed": {"$sum": {"$cond": [{"$eq": ["$status", "failed"]}, 1, 0]}},
+            "responses": {"$sum": {"$cond": ["$responded", 1, 0]}}
+        }
+        pipeline = [
+            # Served by the (user_id, application_date) index
+            {"$match": match},
+            # Only whether the outbox sent the email matters, so bring back at most one status
+            {"$lookup": {
+                "from": "email_outbox",
+                "let": {"application_id": "$id"},
+                "pipeline": [
+                    {"$match": {"$expr": {"$and": [
+                        {"$eq": ["$application_id", "$$application_id"]},
+                        {"$eq": ["$status", "sent"]}
+                    ]}}},
+                    {"$project": {"_id": 0, "status": 1}},
+                    {"$limit": 1}
+                ],
+                "as": "outbox"
+            }},
+            {"$project": {
+                "status": 1,
+                "company_name": 1,
+                "sent": {"$or": [
+                    "$email_sent",
+                    {"$gt": [{"$size": "$outbox"}, 0]}
+                ]},
+                "responded": {"$in": ["$status", APPLICATION_RESPONSE_STATUSES]},
+                "week": {"$concat": [
+                    {"$toString": {"$isoWeekYear": "$application_date"}},
+                    "-W",
+                    {"$cond": [
+                        {"$lt": [{"$isoWeek": "$application_date"}, 10]},
+                        {"$concat": ["0", {"$toString": {"$isoWeek": "$application_date"}}]},
+                        {"$toString": {"$isoWeek": "$application_date"}}
+                    ]}
+                ]}
+            }},
+            {"$facet": {
+                "totals": [{"$group": {"_id": None, **group_metrics}}],
+                "by_status": [
+                    {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+                    {"$sort": {"count": -1}}
+                ],
+                "by_company": [
+                    {"$group": {"_id": "$company_name", **group_metrics}},
+                    {"$sort": {"applications": -1, "_id": 1}},
+                    {"$limit": top_companies}
+                ],
+                "by_week": [
+                    {"$group": {"_id": "$week", **group_metrics}},
+                    {"$sort": {"_id": 1}}
+                ]
+            }}
+        ]
+        result = (await db.applications.aggregate(pipeline).to_list(1))[0]
+        
+        totals = result["totals"][0] if result["totals"] else {"applications": 0, "sent": 0, "failed": 0, "responses": 0}
+        totals.pop("_id", None)
+        return {
+            "user_id": user_id,
+            "totals": response_rate(totals),
+            "by_status": {entry["_id"]: entry["count"] for entry in result["by_status"]},
+            "by_company": [response_rate({"company": entry.pop("_id"), **entry}) for entry in result["by_company"]],
+            "by_week": [response_rate({"week": entry.pop("_id"), **entry}) for entry in result["by_week"]]
+        }
+    except Exception as e:
+        logging.error(f"Error getting application analytics: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error getting application analytics: {str(e)}")
+
+# Legal-form suffixes ignored when matching company names
+COMPANY_NAME_SUFFIXES = {
+    "inc", "incorporated", "llc", "llp", "ltd", "limited", "corp", "corporation",
+    "co", "company", "plc", "gmbh", "ag", "sa", "bv", "pty", "group", "holdings",
+}
+
+def normalize_company_name(name: str) -> str:
+    """Normalize a company name for matching: case, punctuation and legal suffixes"""
+    words = re.sub(r"[^a-z0-9&]+", " ", name.lower().replace("'", "")).split()
+    while len(words) > 1 and words[-1] in COMPANY_NAME_SUFFIXES:
+        words.pop()
+    if len(words) > 1 and words[0] == "the":
+        words.pop(0)
+    return " ".join(words)
+
+def email_domain_for_company(name: str) -> str:
+    """Best-guess email domain for a company, e.g. 'Acme, Inc.' -> 'acme.com'"""
+    return normalize_company_name(name).replace(" ", "").replace("&", "") + ".com"
+
+def extract_domain(value: str) -> Optional[str]:
+    """Domain part of an email address or website URL"""
+    if "@" in value:
+        value = value.rsplit("@", 1)[1]
+    value = re.sub(r"^[a-z]+://", "", value.strip().lower()).split("/", 1)[0]
+    if value.startswith("www."):
+        value = value[4:]
+    return value or None
+
+class CompanyDirectory:
+    """In-memory index of db.company_contacts by normalized name and email domain
+
+    Lookups never touch Mongo. The index follows inserts through a change
+    stream when the deployment supports one, and is reloaded every
+    COMPANY_DIRECTORY_REFRESH_SECONDS otherwise.
+    """
+
+    def __init__(self):
+        self.by_name: Dict[str, CompanyContact] = {}
+        self.by_domain: Dict[str, CompanyContact] = {}
+        self.task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def index(contact: CompanyContact, by_name: Dict[str, CompanyContact], by_domain: Dict[str, CompanyContact]):
+        by_name[normalize_company_name(contact.company_name)] = contact
+        domains = [str(email) for email in contact.email_addresses]
+        if contact.website:
+            domains.insert(0, contact.website)
+        for value in domains:
+            domain = extract_domain(value)
+            if domain:
+                by_domain.setdefault(domain, contact)
+
+    def add(self, contact: CompanyContact):
+        self.index(contact, self.by_name, self.by_domain)
+
+    async def reload(self):
+        """Rebuild the index aside and swap it in, so lookups never see a partial one"""
+        by_name: Dict[str, CompanyContact] = {}
+        by_domain: Dict[str, CompanyContact] = {}
+        async for contact in db.company_contacts.find().sort("created_at", 1):
+            self.index(CompanyContact(**contact), by_name, by_domain)
+        self.by_name, self.by_domain = by_name, by_domain
+
+    def resolve(self, company_name: str) -> Optional[CompanyContact]:
+        """Find the contact for a company by normalized name, then by guessed domain"""
+        contact = self.by_name.get(normalize_company_name(company_name))
+        if contact is None:
+            contact = self.by_domain.get(email_domain_for_company(company_name))
+        return contact
+
+    def resolve_many(self, company_names: List[str]) -> Dict[str, Optional[CompanyContact]]:
+        return {name: self.resolve(name) for name in company_names}
+
+    def recipient_emails(self, company_name: str) -> List[str]:
+        """Known contact addresses for a company, or likely HR addresses"""
+        contact = self.resolve(company_name)
+        if contact:
+            return [str(email) for email in contact.email_addresses]
+        company_domain = email_domain_for_company(company_name)
+        return [f"hr@{company_domain}", f"jobs@{company_domain}"]
+
+    async def start(self):
+        await self.reload()
+        if self.task is None:
+            self.task = asyncio.create_task(self.follow())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def follow(self):
+        try:
+            async with db.company_contacts.watch(full_document="updateLookup") as stream:
+                async for change in stream:
+                    if change.get("operationType") == "insert":
+                        self.add(CompanyContact(**change["fullDocument"]))
+                    else:
+                        # Updates can rename a contact and deletes carry no document, rebuild from scratch
+                        await self.reload()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Standalone servers do not support change streams
+            logging.info(f"Company directory falling back to polling: {str(e)}")
+
+        while True:
+            await asyncio.sleep(COMPANY_DIRECTORY_REFRESH_SECONDS)
+            try:
+                await self.reload()
+            except Exception as e:
+                logging.error(f"Error refreshing company directory: {str(e)}")
+
+company_directory = CompanyDirectory()
+
 @api_router.post("/companies/contacts")
 async def add_company_contact(contact: CompanyContact):
     """Add company contact information"""
     try:
         await db.company_contacts.insert_one(contact.dict())
+        company_directory.add(contact)
         return contact
     except Exception as e:
         logging.error(f"Error adding company contact: {str(e)}")
@@ -865,16 +4881,23 @@ async def get_company_contacts():
 async def create_email_campaign(campaign_request: EmailCampaignRequest):
     """Create an email campaign"""
     try:
+        validate_campaign_templates(campaign_request.email_subject, campaign_request.email_template)
+        
         campaign = EmailCampaign(
             user_id=campaign_request.user_id,
             campaign_name=campaign_request.campaign_name,
             email_subject=campaign_request.email_subject,
             email_template=campaign_request.email_template,
-            target_companies=campaign_request.target_companies
+            target_companies=campaign_request.target_companies,
+            position=campaign_request.position,
+            resume_id=campaign_request.resume_id
         )
         
         await db.email_campaigns.insert_one(campaign.dict())
+        await increment_user_stats(campaign.user_id, {"campaigns": 1})
         return campaign
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error creating email campaign: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error creating email campaign: {str(e)}")
@@ -888,34 +4911,70 @@ async def send_email_campaign(campaign_id: str, background_tasks: BackgroundTask
             raise HTTPException(status_code=404, detail="Campaign not found")
         
         email_campaign = EmailCampaign(**campaign)
+        # Campaigns stored before templates were checked at creation may not compile
+        validate_campaign_templates(email_campaign.email_subject, email_campaign.email_template)
         
         # Send emails to target companies
         background_tasks.add_task(execute_email_campaign, email_campaign)
         
         return {"status": "campaign_started", "campaign_id": campaign_id}
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error sending email campaign: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error sending email campaign: {str(e)}")
 
+async def campaign_applicant_name(campaign: EmailCampaign) -> str:
+    """Applicant name from the campaign's resume, or the user's most recently updated one"""
+    query = {"id": campaign.resume_id} if campaign.resume_id else {"user_id": campaign.user_id}
+    resume = await db.resumes.find_one(query, {"personal_info": 1}, sort=[("updated_at", -1)])
+    return ((resume or {}).get("personal_info") or {}).get("name") or "Job Seeker"
+
+def render_campaign_messages(campaign: EmailCampaign, contacts: Dict[str, Optional[CompanyContact]], applicant_name: str) -> List[Dict[str, Any]]:
+    """Personalize the campaign subject and body for every company with a known contact"""
+    subject_template = compile_campaign_template(campaign.email_subject)
+    body_template = compile_campaign_template(campaign.email_template)
+    messages = []
+    for company_name, contact in contacts.items():
+        if not contact:
+            continue
+        values = {
+            "company": company_name,
+            "contact_person": contact.contact_person or "Hiring Manager",
+            "position": campaign.position,
+            "applicant_name": applicant_name,
+        }
+        messages.append({
+            "company_name": company_name,
+            # Subjects are a single header line
+            "subject": " ".join(subject_template.render(values).split()),
+            "body": body_template.render(values),
+            "recipient_emails": [str(email) for email in contact.email_addresses],
+        })
+    return messages
+
 async def execute_email_campaign(campaign: EmailCampaign):
     """Execute email campaign in background"""
     try:
         emails_sent = 0
         
-        for company_name in campaign.target_companies:
-            # Get company contact info
-            company_contact = await db.company_contacts.find_one({"company_name": company_name})
-            if not company_contact:
-                continue
-                
+        applicant_name = await campaign_applicant_name(campaign)
+        messages = render_campaign_messages(
+            campaign, company_directory.resolve_many(campaign.target_companies), applicant_name
+        )
+        for message in messages:
+            company_name = message["company_name"]
+            
             # Send email
             try:
                 email_result = await send_job_application_email(
-                    applicant_name="Job Seeker",  # This should come from user profile
+                    applicant_name=applicant_name,
                     company_name=company_name,
-                    position="Open Position",
-                    cover_letter=campaign.email_template,
-                    recipient_emails=company_contact["email_addresses"]
+                    position=campaign.position,
+                    cover_letter=message["body"],
+                    recipient_emails=message["recipient_emails"],
+                    subject=message["subject"],
+                    tags={"campaign_id": campaign.id}
                 )
                 emails_sent += 1
                 
@@ -926,18 +4985,383 @@ async def execute_email_campaign(campaign: EmailCampaign):
                 logging.error(f"Error sending email to {company_name}: {str(e)}")
                 continue
         
-        # Update campaign status
+        # Update campaign status; re-sending a campaign adds to its total
         await db.email_campaigns.update_one(
             {"id": campaign.id},
-            {"$set": {"status": "completed", "emails_sent": emails_sent}}
+            {"$set": {"status": "completed"}, "$inc": {"emails_sent": emails_sent}}
         )
+        await increment_user_stats(campaign.user_id, {"campaign_emails_sent": emails_sent})
         
     except Exception as e:
         logging.error(f"Error executing email campaign: {str(e)}")
 
+# Admission control
+class AdmissionRejected(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__("Too many requests")
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """Per-user and global concurrency limits with a bounded, fair wait queue
+
+    Waiting requests queue per user, and freed slots are granted round-robin
+    across users, so a user's burst waits behind their own requests rather than
+    everyone else's. Requests are shed when the queues are full or the wait
+    would exceed ADMISSION_MAX_WAIT_SECONDS.
+    """
+
+    def __init__(self):
+        self.active = 0
+        self.active_by_user: Dict[str, int] = {}
+        self.queues: OrderedDict = OrderedDict()  # user -> deque of waiting futures, in round-robin order
+        self.queued = 0
+        self.service_times = deque(maxlen=200)
+        self.wait_times = deque(maxlen=1000)
+        self.stats = {"admitted": 0, "waited": 0, "rejected": 0, "timed_out": 0}
+
+    def can_run(self, user: str) -> bool:
+        return self.active < ADMISSION_GLOBAL_LIMIT and self.active_by_user.get(user, 0) < ADMISSION_PER_USER_LIMIT
+
+    def grant(self, user: str):
+        self.active += 1
+        self.active_by_user[user] = self.active_by_user.get(user, 0) + 1
+        self.stats["admitted"] += 1
+
+    def retry_after(self) -> float:
+        service_time = sum(self.service_times) / len(self.service_times) if self.service_times else 1.0
+        return max(1.0, service_time * (self.queued + 1) / ADMISSION_GLOBAL_LIMIT)
+
+    async def acquire(self, user: str):
+        # Queued requests are never runnable after dispatch(), so admitting a runnable newcomer is fair
+        if self.can_run(user):
+            self.grant(user)
+            return
+        queue = self.queues.get(user)
+        if self.queued >= ADMISSION_QUEUE_SIZE or (queue and len(queue) >= ADMISSION_PER_USER_QUEUE_SIZE):
+            self.stats["rejected"] += 1
+            raise AdmissionRejected(self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        self.queues.setdefault(user, deque()).append(future)
+        self.queued += 1
+        self.stats["waited"] += 1
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(future, ADMISSION_MAX_WAIT_SECONDS)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # Granted just as the wait was given up
+                self.release(user, 0.0)
+            else:
+                self.remove_waiter(user, future)
+            if isinstance(e, asyncio.TimeoutError):
+                self.stats["timed_out"] += 1
+                raise AdmissionRejected(self.retry_after())
+            raise
+        finally:
+            self.queued -= 1
+        self.wait_times.append(time.perf_counter() - started)
+
+    def remove_waiter(self, user: str, future: asyncio.Future):
+        queue = self.queues.get(user)
+        if queue is not None:
+            try:
+                queue.remove(future)
+            except ValueError:
+                pass
+            if not queue:
+                del self.queues[user]
+
+    def release(self, user: str, service_time: float):
+        self.active -= 1
+        self.active_by_user[user] -= 1
+        if not self.active_by_user[user]:
+            del self.active_by_user[user]
+        if service_time:
+            self.service_times.append(service_time)
+        self.dispatch()
+
+    def dispatch(self):
+        granted = True
+        while granted and self.active < ADMISSION_GLOBAL_LIMIT:
+            granted = False
+            for user in list(self.queues):
+                if not self.can_run(user):
+                    continue
+                queue = self.queues[user]
+                future = queue.popleft()
+                if queue:
+                    self.queues.move_to_end(user)
+                else:
+                    del self.queues[user]
+                if not future.done():
+                    self.grant(user)
+                    future.set_result(None)
+                granted = True
+                break
+
+    def snapshot(self) -> Dict[str, Any]:
+        waits = sorted(self.wait_times)
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "active_users": len(self.active_by_user),
+            "queued_users": len(self.queues),
+            "wait_p50_ms": waits[len(waits) // 2] * 1000 if waits else 0.0,
+            "wait_p99_ms": waits[min(len(waits) - 1, int(len(waits) * 0.99))] * 1000 if waits else 0.0,
+            **self.stats
+        }
+
+admission_controller = AdmissionController()
+
+# Routes that call the LLM; everything else bypasses admission control
+ADMISSION_ROUTES = [
+    ("POST", re.compile(r"^/api/resume/parse-upload$")),
+    ("POST", re.compile(r"^/api/resume/(?P<resume_id>[^/]+)/analyze$")),
+    ("POST", re.compile(r"^/api/resume/(?P<resume_id>[^/]+)/cover-letter$")),
+    ("POST", re.compile(r"^/api/jobs/apply$")),
+]
+
+def match_admission_route(method: str, path: str) -> Optional[re.Match]:
+    for route_method, pattern in ADMISSION_ROUTES:
+        match = pattern.match(path) if route_method == method else None
+        if match:
+            return match
+    return None
+
+# Resumes never change owner, so their user ids are remembered
+resume_owners: OrderedDict = OrderedDict()
+
+async def resume_owner(resume_id: str) -> Optional[str]:
+    if resume_id in resume_owners:
+        return resume_owners[resume_id]
+    resume = await db.resumes.find_one({"id": resume_id}, {"user_id": 1})
+    if resume:
+        resume_owners[resume_id] = resume["user_id"]
+        if len(resume_owners) > 10000:
+            resume_owners.popitem(last=False)
+        return resume["user_id"]
+    return None
+
+class AdmissionControlMiddleware:
+    """ASGI middleware that admits LLM-backed requests through admission_controller
+
+    The user is taken from the X-User-Id header, the user_id query parameter, a
+    small JSON body's user_id, or the resume's owner, falling back to the client
+    address.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ADMISSION_CONTROL_ENABLED:
+            return await self.app(scope, receive, send)
+        match = match_admission_route(scope["method"], scope["path"])
+        if match is None:
+            return await self.app(scope, receive, send)
+
+        receive, user = await self.identify_user(scope, receive, match)
+        try:
+            await admission_controller.acquire(user)
+        except AdmissionRejected as e:
+            response = JSONResponse(
+                {"detail": "Server is busy, please retry shortly"},
+                status_code=429,
+                headers={"Retry-After": str(math.ceil(e.retry_after))}
+            )
+            return await response(scope, receive, send)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission_controller.release(user, time.perf_counter() - started)
+
+    async def identify_user(self, scope, receive, match):
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        if headers.get("x-user-id"):
+            return receive, headers["x-user-id"]
+        query = dict(parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+        if query.get("user_id"):
+            return receive, query["user_id"]
+
+        content_length = headers.get("content-length", "0")
+        if (headers.get("content-type", "").startswith("application/json")
+                and content_length.isdigit() and int(content_length) <= ADMISSION_BODY_PEEK_BYTES):
+            # Read the body once and replay it to the endpoint. Chunked bodies carry no
+            # Content-Length, so stop peeking once past the limit rather than buffer them whole
+            messages = []
+            body = b""
+            complete = False
+            while len(body) <= ADMISSION_BODY_PEEK_BYTES:
+                message = await receive()
+                messages.append(message)
+                if message["type"] != "http.request":
+                    break
+                body += message.get("body", b"")
+                if not message.get("more_body"):
+                    complete = True
+                    break
+
+            upstream = receive
+
+            async def replay():
+                return messages.pop(0) if messages else await upstream()
+
+            try:
+                user_id = json.loads(body or b"{}").get("user_id") if complete else None
+            except (ValueError, AttributeError):
+                user_id = None
+            if user_id:
+                return replay, str(user_id)
+            receive = replay
+
+        if match.groupdict().get("resume_id"):
+            owner = await resume_owner(match.group("resume_id"))
+            if owner:
+                return receive, owner
+        client = scope.get("client")
+        return receive, f"client:{client[0]}" if client else "anonymous"
+
+@api_router.get("/admission/stats")
+async def get_admission_stats():
+    """Get admission control queue metrics for this worker"""
+    return admission_controller.snapshot()
+
+# Sampling settings of this worker, changed through PUT /admin/profiling
+profiling_settings = {
+    "enabled": PROFILING_ENABLED,
+    "sample_rate": PROFILING_SAMPLE_RATE,
+    "backend": PROFILING_BACKEND,
+    "path_prefix": "/api/",
+}
+profiling_stats = {"profiled": 0, "store_errors": 0}
+
+def is_admin_token(value: Optional[str]) -> bool:
+    """Admin access is off unless ADMIN_TOKEN is configured"""
+    return bool(ADMIN_TOKEN) and bool(value) and hmac.compare_digest(value, ADMIN_TOKEN)
+
+def require_admin(request: Request):
+    if not is_admin_token(request.headers.get("x-admin-token")):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+def profiling_trigger(path: str, headers: Dict[str, str]) -> Optional[str]:
+    """Why a request should be profiled, or None"""
+    if is_admin_token(headers.get("x-profile")):
+        return "header"
+    if (profiling_settings["enabled"] and path.startswith(profiling_settings["path_prefix"])
+            and random.random() < profiling_settings["sample_rate"]):
+        return "sampled"
+    return None
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles requests selected by profiling_trigger
+
+    Spans recorded with profile_span during the request are stored with the
+    backend's report in db.request_profiles once the response has been sent;
+    the response carries the profile's id in X-Profile-Id.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        trigger = profiling_trigger(scope["path"], headers)
+        if trigger is None:
+            return await self.app(scope, receive, send)
+
+        # Only an admin asking for a profile picks the backend
+        backend = headers.get("x-profile-backend") if trigger == "header" else None
+        profile = RequestProfile(scope["method"], scope["path"], backend or profiling_settings["backend"], trigger)
+        status_code = 500
+
+        async def send_with_profile_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile.id.encode("latin-1"))]
+            await send(message)
+
+        token = current_profile.set(profile)
+        profile.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profile.stop()
+            current_profile.reset(token)
+            profiling_stats["profiled"] += 1
+            try:
+                await db.request_profiles.insert_one(profile.to_document(status_code))
+            except Exception as e:
+                profiling_stats["store_errors"] += 1
+                logging.error(f"Error storing request profile: {str(e)}")
+
+@api_router.get("/admin/profiling")
+async def get_profiling_settings(request: Request):
+    """Get this worker's profiling settings and counters"""
+    require_admin(request)
+    return {**profiling_settings, **profiling_stats, "backends": list(PROFILING_BACKENDS)}
+
+@api_router.put("/admin/profiling")
+async def update_profiling_settings(settings: ProfilingSettingsRequest, request: Request):
+    """Turn sampled profiling on or off for this worker"""
+    require_admin(request)
+    changes = {key: value for key, value in settings.dict().items() if value is not None}
+    if "backend" in changes and changes["backend"] not in PROFILING_BACKENDS:
+        raise HTTPException(status_code=400, detail=f"backend must be one of {', '.join(PROFILING_BACKENDS)}")
+    if "sample_rate" in changes and not 0 <= changes["sample_rate"] <= 1:
+        raise HTTPException(status_code=400, detail="sample_rate must be between 0 and 1")
+    profiling_settings.update(changes)
+    return {**profiling_settings, **profiling_stats, "backends": list(PROFILING_BACKENDS)}
+
+@api_router.get("/admin/profiles")
+async def list_request_profiles(request: Request, path: Optional[str] = None, min_duration_ms: Optional[float] = None, limit: int = 50):
+    """Summaries of the newest stored profiles, slowest span totals included"""
+    require_admin(request)
+    try:
+        query: Dict[str, Any] = {}
+        if path:
+            query["path"] = path
+        if min_duration_ms is not None:
+            query["duration_ms"] = {"$gte": min_duration_ms}
+        # A capped collection keeps insertion order, newest last
+        return await db.request_profiles.find(
+            query, {"_id": 0, "spans": 0, "sampler": 0, "functions": 0}
+        ).sort("$natural", -1).limit(min(limit, 500)).to_list(None)
+    except Exception as e:
+        logging.error(f"Error listing request profiles: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error listing request profiles: {str(e)}")
+
+@api_router.get("/admin/profiles/{profile_id}")
+async def get_request_profile(profile_id: str, request: Request):
+    """Get one stored profile with its spans and backend report"""
+    require_admin(request)
+    try:
+        profile = await db.request_profiles.find_one({"id": profile_id}, {"_id": 0})
+        if not profile:
+            raise HTTPException(status_code=404, detail="Profile not found")
+        return profile
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error getting request profile: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error getting request profile: {str(e)}")
+
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(AdmissionControlMiddleware)
+
+# Outside admission control so profiles include time spent queued for a slot
+app.add_middleware(ProfilingMiddleware)
+
+# Job and application lists are large and repetitive; small responses are sent as-is
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -953,6 +5377,247 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+async def ensure_ttl_index(collection, field: str, expire_after_seconds: int):
+    """Create a TTL index, or update its expiry if it exists with another one"""
+    try:
+        await collection.create_index(field, expireAfterSeconds=expire_after_seconds)
+    except OperationFailure as e:
+        if e.code != 85:  # IndexOptionsConflict
+            raise
+        await db.command(
+            "collMod", collection.name,
+            index={"keyPattern": {field: 1}, "expireAfterSeconds": expire_after_seconds}
+        )
+
+async def ensure_index(collection, keys, **options):
+    """Create an index, replacing one on the same keys that was created with other options"""
+    try:
+        await collection.create_index(keys, **options)
+    except OperationFailure as e:
+        if e.code not in (85, 86):  # IndexOptionsConflict, IndexKeySpecsConflict
+            raise
+        await collection.drop_index(keys)
+        await collection.create_index(keys, **options)
+
+@app.on_event("startup")
+async def ensure_indexes():
+    try:
+        await db.create_collection("request_profiles", capped=True, size=PROFILE_STORE_BYTES)
+    except CollectionInvalid:
+        pass  # Already exists
+    await db.request_profiles.create_index("id")
+    await db.resumes.create_index("id", unique=True)
+    await db.resume_history.create_index([("resume_id", 1), ("version", -1)], unique=True)
+    await db.analyses.create_index([("resume_id", 1), ("created_at", -1)])
+    await db.analyses.create_index("id")
+    await db.jobs.create_index("id", unique=True)
+    # Legacy jobs without an external_id are left out of the uniqueness check
+    await ensure_index(
+        db.jobs, [("source", 1), ("external_id", 1)],
+        unique=True, partialFilterExpression={"external_id": {"$type": "string"}}
+    )
+    await db.jobs.create_index("fingerprint")
+    await db.jobs.create_index(
+        [("title", "text"), ("company", "text"), ("location", "text"), ("description", "text")],
+        weights={"title": 10, "company": 5, "location": 3, "description": 1},
+        name="jobs_text"
+    )
+    # The TTL indexes also serve the posted_date and created_at sorts
+    await ensure_ttl_index(db.jobs, "posted_date", JOB_POSTING_TTL_DAYS * 86400)
+    await ensure_ttl_index(db.jobs, "created_at", JOB_RETENTION_DAYS * 86400)
+    await db.jobs.create_index("skills")
+    await db.jobs.create_index([("seniority", 1), ("min_years_experience", 1)])
+    await db.jobs.create_index("extraction_version")
+    await db.jobs_archive.create_index("id", unique=True)
+    await db.applications.create_index([("user_id", 1), ("application_date", -1)])
+    await db.applications.create_index("email_id")
+    await db.applications.create_index("id")
+    await db.saved_job_queries.create_index([("enabled", 1), ("next_run_at", 1)])
+    await db.crawler_runs.create_index("started_at")
+    await db.user_stats.create_index("user_id", unique=True)
+    await db.resumes.create_index("user_id")
+    await db.email_campaigns.create_index("user_id")
+    await db.email_outbox.create_index([("status", 1), ("next_attempt_at", 1)])
+    await db.email_outbox.create_index("application_id")
+    await db.email_outbox.create_index([("status", 1), ("lease_expires_at", 1)])
+    # Letters created before the cache have no hashes and are left out of the unique index
+    await db.cover_letters.create_index(
+        [("resume_id", 1), ("resume_hash", 1), ("job_hash", 1), ("prompt_version", 1)],
+        unique=True,
+        partialFilterExpression={"job_hash": {"$exists": True}}
+    )
+    await db.resume_exports.create_index("key", unique=True)
+    await ensure_ttl_index(db.resume_exports, "created_at", RESUME_EXPORT_CACHE_DAYS * 86400)
+    # Resumes created before versioning start at version 1
+    await db.resumes.update_many({"version": {"$exists": False}}, {"$set": {"version": 1}})
+
+@app.on_event("startup")
+async def start_email_outbox_dispatcher():
+    if OUTBOX_DISPATCHER_ENABLED:
+        email_outbox_dispatcher.start()
+
+@app.on_event("startup")
+async def start_email_event_buffer():
+    email_event_buffer.start()
+
+@app.on_event("startup")
+async def start_company_directory():
+    await company_directory.start()
+
+@app.on_event("startup")
+async def start_job_duplicate_index():
+    await job_duplicate_index.start()
+
+@app.on_event("startup")
+async def start_job_details_backfill():
+    global job_details_backfill_task
+    if JOB_EXTRACTION_BACKFILL_ENABLED:
+        job_details_backfill_task = asyncio.create_task(run_job_details_backfill())
+
+@app.on_event("startup")
+async def start_job_compaction():
+    global job_compaction_task
+    if JOB_COMPACTION_ENABLED:
+        job_compaction_task = asyncio.create_task(run_job_compaction_forever())
+
+@app.on_event("startup")
+async def start_job_crawler():
+    if CRAWLER_ENABLED:
+        job_crawler.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    await email_outbox_dispatcher.stop()
+    await email_event_buffer.stop()
+    await company_directory.stop()
+    await job_crawler.stop()
+    await job_duplicate_index.stop()
+    if job_compaction_task is not None:
+        job_compaction_task.cancel()
+    if job_details_backfill_task is not None:
+        job_details_backfill_task.cancel()
+    await cache.backend.close()
+    if resume_export_executor is not None:
+        resume_export_executor.shutdown(wait=False, cancel_futures=True)
+    client.close()
+
+async def run_crawler_service():
+    """Run the job crawler without the API, for a dedicated crawler process"""
+    await ensure_indexes()
+    await job_duplicate_index.start()
+    try:
+        await job_crawler.run_forever()
+    finally:
+        await job_duplicate_index.stop()
+        client.close()
+
+async def migrate_storage(dry_run: bool = False, batch_size: int = 200):
+    """Re-encode stored resumes in the compact format and cap analysis histories"""
+    before = after = migrated = 0
+    batch = []
+    async for document in db.resumes.find({}):
+        encoded = {section: encode_resume_section(section, decode_resume_section(section, document[section]))
+                   for section in RESUME_SECTIONS if section in document}
+        rewritten = {**document, **encoded}
+        before += len(bson.encode(document))
+        after += len(bson.encode(rewritten))
+        if rewritten != document:
+            migrated += 1
+            batch.append(UpdateOne({"_id": document["_id"]}, {"$set": encoded}))
+        if len(batch) >= batch_size:
+            if not dry_run:
+                await db.resumes.bulk_write(batch, ordered=False)
+            batch = []
+    if batch and not dry_run:
+        await db.resumes.bulk_write(batch, ordered=False)
+
+    analyses_before = await db.analyses.count_documents({})
+    if not dry_run:
+        resume_ids = await db.analyses.distinct("resume_id")
+        owners = {
+            resume["id"]: resume["user_id"]
+            async for resume in db.resumes.find({"id": {"$in": resume_ids}}, {"id": 1, "user_id": 1})
+        }
+        for resume_id in resume_ids:
+            await compact_analysis_history(resume_id, owners.get(resume_id))
+    analyses_after = await db.analyses.count_documents({})
+
+    print(f"resumes: {migrated} re-encoded, {before} -> {after} bytes"
+          f"{' (dry run)' if dry_run else ''}")
+    print(f"analyses: {analyses_before} -> {analyses_after} documents")
+
+async def benchmark_storage(copies: int = 500):
+    """Compare size and read latency of legacy and compact resume documents on scratch collections"""
+    sample = await db.resumes.find_one({})
+    if not sample:
+        print("no resumes to benchmark")
+        return
+    # The sample as stored, only decompressed, so the legacy side is not shrunk by normalization
+    legacy = {
+        key: inflate_resume_section(value) if key in RESUME_SECTIONS else value
+        for key, value in sample.items() if key != "_id"
+    }
+    compact = resume_to_document(ResumeContent(**legacy))
+    compact.pop("_id", None)
+
+    benchmark_db = client[BENCHMARK_DB_NAME]
+    for name, document in (("legacy", legacy), ("compact", compact)):
+        scratch = benchmark_db[f"storage_benchmark_{name}"]
+        await scratch.drop()
+        await scratch.insert_many([{**document, "id": str(uuid.uuid4())} for _ in range(copies)])
+        stats = await benchmark_db.command("collStats", scratch.name)
+
+        started = time.perf_counter()
+        async for document in scratch.find({}):
+            if name == "compact":
+                resume_from_document(document)
+            else:
+                ResumeContent(**document)
+        elapsed = time.perf_counter() - started
+
+        print(f"{name}: {len(bson.encode(document))} bytes/doc, "
+              f"{stats.get('storageSize', 0)} bytes on disk, "
+              f"{elapsed / copies * 1000:.3f} ms/read")
+        await scratch.drop()
+
+def webhook_signature_headers(body: bytes) -> Dict[str, str]:
+    """Svix headers for a webhook body, signed with RESEND_WEBHOOK_SECRET like Resend would"""
+    headers = {"svix-id": f"msg_{uuid.uuid4().hex}", "svix-timestamp": str(int(time.time()))}
+    if RESEND_WEBHOOK_SECRET:
+        secret = base64.b64decode(RESEND_WEBHOOK_SECRET.split("_", 1)[-1])
+        signed = f"{headers['svix-id']}.{headers['svix-timestamp']}.".encode("utf-8") + body
+        headers["svix-signature"] = "v1," + base64.b64encode(hmac.new(secret, signed, hashlib.sha256).digest()).decode("ascii")
+    return headers
+
+async def replay_email_events(path: str, url: str = "http://localhost:8001/api/email/webhook"):
+    """Post recorded webhook events (a JSON list or NDJSON) to a running server, signed like Resend would"""
+    with open(path) as events_file:
+        text = events_file.read()
+    events = json.loads(text) if text.lstrip().startswith("[") else [json.loads(line) for line in text.splitlines() if line.strip()]
+    started = time.perf_counter()
+    async with httpx.AsyncClient(timeout=30) as http_client:
+        for event in events:
+            body = json.dumps(event).encode("utf-8")
+            headers = {"Content-Type": "application/json", **webhook_signature_headers(body)}
+            response = await http_client.post(url, content=body, headers=headers)
+            response.raise_for_status()
+    elapsed = time.perf_counter() - started
+    print(f"events: {len(events)} replayed in {elapsed:.2f}s ({len(events) / elapsed if elapsed else 0:.0f}/s)")
+
+if __name__ == "__main__":
+    # python server.py crawl | migrate-storage [--dry-run] | benchmark-storage | backfill-jobs
+    #                  | replay-email-events FILE [URL]
+    command = sys.argv[1:]
+    if command == ["crawl"]:
+        asyncio.run(run_crawler_service())
+    elif command[:1] == ["migrate-storage"]:
+        asyncio.run(migrate_storage(dry_run="--dry-run" in command))
+    elif command == ["benchmark-storage"]:
+        asyncio.run(benchmark_storage())
+    elif command == ["backfill-jobs"]:
+        print(f"jobs: {asyncio.run(backfill_job_details())} re-extracted")
+    elif command[:1] == ["replay-email-events"] and len(command) in (2, 3):
+        asyncio.run(replay_email_events(*command[1:]))
+    else:
+        print("usage: python server.py crawl | migrate-storage [--dry-run] | benchmark-storage | backfill-jobs"
+              " | replay-email-events FILE [URL]")
\ No newline at end of file
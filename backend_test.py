@@ -1,8 +1,11 @@
 #!/usr/bin/env python3
 import requests
+import asyncio
+import gzip
 import json
 import os
 import sys
+import tempfile
 import time
 from dotenv import load_dotenv
 from pathlib import Path
@@ -22,6 +25,24 @@ if not BACKEND_URL:
 API_URL = f"{BACKEND_URL}/api"
 print(f"Testing backend API at: {API_URL}")
 
+# Checks of server internals run in-process against the backend's own .env and database
+BACKEND_DIR = Path(__file__).parent / "backend"
+server = None
+server_loop = asyncio.new_event_loop()
+
+def load_server():
+    """Import backend/server.py once, for tests that exercise internals with no endpoint"""
+    global server
+    if server is None:
+        sys.path.insert(0, str(BACKEND_DIR))
+        import server as server_module
+        server = server_module
+    return server
+
+def run_async(coroutine):
+    """Run a coroutine on the loop the server's Mongo client is bound to"""
+    return server_loop.run_until_complete(coroutine)
+
 # Test user ID
 TEST_USER_ID = f"test-user-{uuid.uuid4()}"
 print(f"Using test user ID: {TEST_USER_ID}")
@@ -294,6 +315,45 @@ def test_update_resume():
         print(f"❌ Error updating resume: {str(e)}")
         return False
 
+def test_patch_resume():
+    """Test 4b: Patch only the skills section and check the recorded history"""
+    try:
+        current = requests.get(f"{API_URL}/resume/{created_resume_id}").json()
+        patch_data = {
+            "skills": current["skills"] + ["Looker"],
+            "base_version": current["version"]
+        }
+        
+        response = requests.patch(
+            f"{API_URL}/resume/{created_resume_id}",
+            json=patch_data
+        )
+        print_response(response)
+        
+        if response.status_code != 200 or response.json()["version"] != current["version"] + 1:
+            print("❌ Resume patch failed")
+            return False
+        
+        # Re-using the old base version must be rejected
+        stale_response = requests.patch(
+            f"{API_URL}/resume/{created_resume_id}",
+            json=patch_data
+        )
+        if stale_response.status_code != 409:
+            print("❌ Stale patch was not rejected")
+            return False
+        
+        history = requests.get(f"{API_URL}/resume/{created_resume_id}/history").json()
+        if history and history[0]["changed_sections"] == ["skills"]:
+            print("✅ Resume patched and history recorded")
+            return True
+        else:
+            print("❌ Resume history missing the skills change")
+            return False
+    except Exception as e:
+        print(f"❌ Error patching resume: {str(e)}")
+        return False
+
 def test_analyze_resume():
     """Test 5: Analyze resume for ATS scoring and suggestions"""
     try:
@@ -476,7 +536,7 @@ def test_job_application():
             isinstance(response.json()["applications"], list) and
             len(response.json()["applications"]) > 0):
             
-            print(f"✅ Job application successful")
+            print("✅ Job application successful")
             return True
         else:
             print("❌ Job application failed")
@@ -526,7 +586,7 @@ def test_email_sending():
             "campaign_name" in response.json() and
             response.json()["campaign_name"] == "Test Campaign"):
             
-            print(f"✅ Email campaign creation successful")
+            print("✅ Email campaign creation successful")
             return True
         else:
             print("❌ Email campaign creation failed")
@@ -535,10 +595,887 @@ def test_email_sending():
         print(f"❌ Error testing email functionality: {str(e)}")
         return False
 
+def test_user_stats():
+    """Test 13: Dashboard counters for the test user"""
+    try:
+        response = requests.get(f"{API_URL}/user/{TEST_USER_ID}/stats")
+        print_response(response)
+        
+        if response.status_code != 200:
+            print("❌ User stats request failed")
+            return False
+        
+        stats = response.json()
+        refreshed = requests.get(f"{API_URL}/user/{TEST_USER_ID}/stats", params={"refresh": "true"}).json()
+        if stats["resumes"] >= 1 and stats["applications_total"] == refreshed["applications_total"]:
+            print("✅ User stats match a full recount")
+            return True
+        else:
+            print("❌ User stats do not match a full recount")
+            return False
+    except Exception as e:
+        print(f"❌ Error getting user stats: {str(e)}")
+        return False
+
+def test_skill_extraction():
+    """Test 14: Synonyms normalize to canonical taxonomy skills"""
+    try:
+        response = requests.post(f"{API_URL}/skills/extract", json={"text": "Senior JS dev: React.js, k8s, Postgres and Node.js"})
+        print_response(response)
+        
+        if response.status_code != 200:
+            print("❌ Skill extraction request failed")
+            return False
+        
+        skills = response.json()["skills"]
+        if skills == ["JavaScript", "React", "Kubernetes", "PostgreSQL", "Node.js"]:
+            print("✅ Skills extracted and normalized")
+            return True
+        else:
+            print(f"❌ Unexpected skills: {skills}")
+            return False
+    except Exception as e:
+        print(f"❌ Error extracting skills: {str(e)}")
+        return False
+
+def test_circuit_breaker_rejections():
+    """Test 15: 4xx errors from each provider leave the circuit closed, 5xx errors open it"""
+    try:
+        srv = load_server()
+        import httpx
+        import litellm
+        from resend.exceptions import ResendError
+
+        def adzuna_error(status):
+            request = httpx.Request("GET", "https://api.adzuna.com/v1/api/jobs/us/search/1")
+            return httpx.HTTPStatusError("rejected", request=request, response=httpx.Response(status, request=request))
+
+        rejections = {
+            "adzuna": adzuna_error(400),
+            "resend": ResendError(code=422, error_type="validation_error", message="Invalid `to` field", suggested_action=""),
+            "gemini": litellm.exceptions.BadRequestError(message="Invalid prompt", model="gemini-2.0-flash", llm_provider="gemini"),
+        }
+
+        async def fail_with(guard, error, times):
+            async def attempt():
+                raise error
+            for _ in range(times):
+                try:
+                    await guard.call(attempt)
+                except Exception:
+                    pass
+
+        for provider, error in rejections.items():
+            guard = srv.ProviderGuard(f"test-{provider}", 5)
+            run_async(fail_with(guard, error, srv.CIRCUIT_FAILURE_THRESHOLD + 1))
+            if guard.state != "closed":
+                print(f"❌ A {provider} 4xx opened the circuit")
+                return False
+
+        guard = srv.ProviderGuard("test-outage", 5)
+        run_async(fail_with(guard, adzuna_error(503), srv.CIRCUIT_FAILURE_THRESHOLD))
+        if guard.state == "open":
+            print("✅ Rejected requests leave the circuit closed, outages open it")
+            return True
+        else:
+            print("❌ Provider 5xx errors did not open the circuit")
+            return False
+    except Exception as e:
+        print(f"❌ Error testing the circuit breaker: {str(e)}")
+        return False
+
+def test_analysis_compaction_stats():
+    """Test 16: Compacting analysis history moves the analyses counter with the deleted entries"""
+    srv = load_server()
+    user_id = f"test-user-{uuid.uuid4()}"
+    resume_id = str(uuid.uuid4())
+    try:
+        extra = 4
+        now = srv.datetime.utcnow()
+        analyses = [
+            {"id": str(uuid.uuid4()), "resume_id": resume_id, "ats_score": 70, "created_at": now - srv.timedelta(seconds=i)}
+            for i in range(srv.ANALYSIS_HISTORY_FULL + extra)
+        ]
+
+        async def compact():
+            await srv.db.resumes.insert_one({"id": resume_id, "user_id": user_id})
+            await srv.db.analyses.insert_many(analyses)
+            await srv.increment_user_stats(user_id, {"resumes": 1, "analyses": len(analyses)})
+            await srv.compact_analysis_history(resume_id, user_id)
+            stored = await srv.db.user_stats.find_one({"user_id": user_id})
+            return stored, await srv.compute_user_stats(user_id)
+
+        stored, recount = run_async(compact())
+        # Same-day entries past the newest ones collapse into one
+        if stored["analyses"] == recount.analyses == srv.ANALYSIS_HISTORY_FULL + 1:
+            print("✅ Analyses counter matches a recount after compaction")
+            return True
+        else:
+            print(f"❌ Stored analyses {stored['analyses']}, recount {recount.analyses}")
+            return False
+    except Exception as e:
+        print(f"❌ Error testing analysis compaction: {str(e)}")
+        return False
+    finally:
+        async def cleanup():
+            await srv.db.resumes.delete_many({"id": resume_id})
+            await srv.db.analyses.delete_many({"resume_id": resume_id})
+            await srv.db.user_stats.delete_many({"user_id": user_id})
+        run_async(cleanup())
+
+def test_job_dedupe_within_source():
+    """Test 17: Same-titled openings of one source are all kept; another source's copy maps to the stored job"""
+    srv = load_server()
+    run_id = uuid.uuid4().hex
+
+    def posting(source, external_id, description):
+        return srv.prepare_job_listing({
+            "external_id": f"{run_id}-{external_id}",
+            "title": "Software Engineer",
+            "company": f"Dedupe Test {run_id} Inc",
+            "location": "Austin, TX",
+            "description": description,
+            "posted_date": srv.datetime.utcnow(),
+            "application_url": "https://example.com/apply",
+            "source": source,
+        })
+
+    try:
+        payments = posting("test-board-a", "1", "Build payment APIs for merchants.")
+        search = posting("test-board-a", "2", "Improve search ranking for the storefront.")
+        mirrored = posting("test-board-b", "77", "Build payment APIs for merchants.")
+
+        async def store():
+            first = await srv.store_job_page([payments, search])
+            again = await srv.store_job_page([posting("test-board-a", "1", "Build payment APIs for merchants.")])
+            other = await srv.store_job_page([mirrored])
+            return first, again, other
+
+        first, again, other = run_async(store())
+        if len({job.id for job in first}) != 2:
+            print("❌ Distinct openings with the same title were collapsed")
+            return False
+        if again[0].id != payments.id:
+            print("❌ Re-ingesting the same posting created a second job")
+            return False
+        if other[0].id in {payments.id, search.id}:
+            print("✅ Openings kept apart within a source and matched across sources")
+            return True
+        else:
+            print("❌ The other source's copy was stored as a new job")
+            return False
+    except Exception as e:
+        print(f"❌ Error testing job dedupe: {str(e)}")
+        return False
+    finally:
+        run_async(srv.db.jobs.delete_many({"external_id": {"$regex": f"^{run_id}-"}}))
+
+def test_email_webhook_signatures():
+    """Test 18: Unsigned or forged webhook events are rejected, signed ones are accepted"""
+    try:
+        srv = load_server()
+        body = json.dumps({"type": "email.delivered", "data": {"email_id": f"test-email-{uuid.uuid4()}"}}).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+
+        unsigned = requests.post(f"{API_URL}/email/webhook", data=body, headers=headers)
+        print_response(unsigned)
+        if not srv.RESEND_WEBHOOK_SECRET:
+            expected = 200 if srv.RESEND_WEBHOOK_ALLOW_UNSIGNED else 503
+            if unsigned.status_code == expected:
+                print("✅ Webhook without a secret follows RESEND_WEBHOOK_ALLOW_UNSIGNED")
+                return True
+            else:
+                print(f"❌ Expected {expected} for an unsigned event without a secret")
+                return False
+        if unsigned.status_code != 401:
+            print("❌ Unsigned event was not rejected")
+            return False
+
+        forged = {**headers, **srv.webhook_signature_headers(body), "svix-signature": "v1,Zm9yZ2Vk"}
+        if requests.post(f"{API_URL}/email/webhook", data=body, headers=forged).status_code != 401:
+            print("❌ Forged signature was not rejected")
+            return False
+
+        signed = requests.post(f"{API_URL}/email/webhook", data=body, headers={**headers, **srv.webhook_signature_headers(body)})
+        if signed.status_code == 200 and signed.json()["received"] == 1:
+            print("✅ Only signed webhook events are accepted")
+            return True
+        else:
+            print("❌ Signed event was not accepted")
+            return False
+    except Exception as e:
+        print(f"❌ Error testing webhook signatures: {str(e)}")
+        return False
+
+def test_admission_body_peek():
+    """Test 19: Admission reads a small JSON body's user_id but stops peeking at a large chunked one"""
+    try:
+        srv = load_server()
+
+        async def identify(chunks):
+            pending = list(chunks)
+            reads = []
+
+            async def receive():
+                reads.append(1)
+                return {"type": "http.request", "body": pending.pop(0), "more_body": bool(pending)}
+
+            scope = {
+                "type": "http", "method": "POST", "path": "/api/jobs/apply",
+                "headers": [(b"content-type", b"application/json")], "client": ("203.0.113.7", 5000)
+            }
+            middleware = srv.AdmissionControlMiddleware(None)
+            replay, user = await middleware.identify_user(scope, receive, srv.match_admission_route("POST", "/api/jobs/apply"))
+            peeked = len(reads)
+            body = b""
+            while True:
+                message = await replay()
+                body += message["body"]
+                if not message["more_body"]:
+                    break
+            return user, peeked, body
+
+        user, _, body = run_async(identify([b'{"user_id": ', b'"test-user"}']))
+        if user != "test-user" or body != b'{"user_id": "test-user"}':
+            print(f"❌ Small body identified as {user}")
+            return False
+
+        chunks = [b" " * 1024] * 200
+        user, peeked, body = run_async(identify(chunks))
+        if user == "client:203.0.113.7" and peeked <= srv.ADMISSION_BODY_PEEK_BYTES // 1024 + 1 and len(body) == 200 * 1024:
+            print("✅ Large chunked body is not buffered and is replayed whole")
+            return True
+        else:
+            print(f"❌ Peeked {peeked} chunks as {user}, replayed {len(body)} bytes")
+            return False
+    except Exception as e:
+        print(f"❌ Error testing admission body peeking: {str(e)}")
+        return False
+
+def test_job_application_errors():
+    """Test 20: Applying with an unknown resume is a 404, not a 500"""
+    try:
+        response = requests.post(f"{API_URL}/jobs/apply", json={
+            "user_id": TEST_USER_ID,
+            "resume_id": f"missing-{uuid.uuid4()}",
+            "job_ids": [],
+            "send_emails": False
+        })
+        print_response(response)
+        
+        if response.status_code == 404:
+            print("✅ Unknown resume is reported as not found")
+            return True
+        else:
+            print("❌ Unknown resume was not reported as a 404")
+            return False
+    except Exception as e:
+        print(f"❌ Error testing job application errors: {str(e)}")
+        return False
+
+def test_duplicate_index_late_commits():
+    """Test 21: A job committed between two refreshes with an older created_at still gets indexed"""
+    srv = load_server()
+    run_id = uuid.uuid4().hex
+
+    def stored_job(external_id, created_at):
+        job = srv.prepare_job_listing({
+            "external_id": f"{run_id}-{external_id}",
+            "title": f"Data Engineer {external_id}",
+            "company": f"Index Test {run_id}",
+            "location": "Denver, CO",
+            "description": f"Own the {external_id} pipelines and warehouse models.",
+            "posted_date": created_at,
+            "application_url": "https://example.com/apply",
+            "source": "test-board-a",
+        })
+        job.created_at = created_at
+        return {**job.dict(), "minhash": job.minhash}
+
+    try:
+        index = srv.JobDuplicateIndex()
+        now = srv.datetime.utcnow()
+        newer = stored_job("newer", now)
+        late = stored_job("late", now - srv.timedelta(seconds=10))
+
+        async def refresh_twice():
+            await srv.db.jobs.insert_one(newer)
+            await index.refresh()
+            # Another worker commits a job created before the one already seen
+            await srv.db.jobs.insert_one(late)
+            await index.refresh()
+
+        run_async(refresh_twice())
+        if newer["id"] in index.signatures and late["id"] in index.signatures:
+            print("✅ Late-committed job was indexed on the next refresh")
+            return True
+        else:
+            print("❌ Late-committed job was skipped by the refresh")
+            return False
+    except Exception as e:
+        print(f"❌ Error testing duplicate index refresh: {str(e)}")
+        return False
+    finally:
+        run_async(srv.db.jobs.delete_many({"external_id": {"$regex": f"^{run_id}-"}}))
+
+def test_crawler_leases_and_watermarks():
+    """Test 22: A leased query cannot be run twice, and postings sharing the watermark are still stored"""
+    srv = load_server()
+    run_id = uuid.uuid4().hex
+    query = srv.SavedJobQuery(name=f"lease test {run_id}", keywords="platform engineer", sources=["test-board-crawl"])
+    posted = srv.datetime.utcnow().replace(microsecond=0)
+
+    class StaticSource(srv.JobSource):
+        name = "test-board-crawl"
+        page_size = 50
+
+        def __init__(self, external_ids):
+            self.external_ids = external_ids
+
+        async def fetch_page(self, http_client, search, page, per_page):
+            return [{
+                "external_id": f"{run_id}-{external_id}",
+                "title": f"Platform Engineer {external_id}",
+                "company": f"Crawler Test {run_id}",
+                "location": "Remote",
+                "description": "Run the Kubernetes platform.",
+                "posted_date": posted,
+                "application_url": "https://example.com/apply",
+                "source": self.name,
+            } for external_id in self.external_ids] if page == 1 else []
+
+    try:
+        first, second = srv.JobCrawler(), srv.JobCrawler()
+
+        async def claims():
+            await srv.db.saved_job_queries.insert_one(query.dict())
+            return await first.claim({"id": query.id}), await second.claim({"id": query.id})
+
+        leased, rejected = run_async(claims())
+        if leased is None or rejected is not None:
+            print("❌ Two crawlers claimed the same query")
+            return False
+        busy = requests.post(f"{API_URL}/crawler/queries/{query.id}/run")
+        if busy.status_code != 409:
+            print("❌ Running a leased query was not rejected")
+            print_response(busy)
+            return False
+
+        async def crawl(external_ids, watermarks):
+            run = srv.CrawlRun(query_id=query.id, query_name=query.name)
+            crawled = srv.SavedJobQuery(**{**query.dict(), "watermarks": watermarks})
+            newest = await first.crawl_source(None, crawled, StaticSource(external_ids), run, [])
+            return newest, run
+
+        watermark, _ = run_async(crawl(["1"], {}))
+        # A second posting with the same timestamp shows up on the next run
+        _, run = run_async(crawl(["1", "2"], {"test-board-crawl": watermark}))
+        if run.jobs_stored == 1:
+            print("✅ Queries are leased and postings at the watermark are picked up once")
+            return True
+        else:
+            print(f"❌ Second crawl stored {run.jobs_stored} jobs, expected 1")
+            return False
+    except Exception as e:
+        print(f"❌ Error testing crawler leases: {str(e)}")
+        return False
+    finally:
+        async def cleanup():
+            await srv.db.saved_job_queries.delete_many({"id": query.id})
+            await srv.db.jobs.delete_many({"external_id": {"$regex": f"^{run_id}-"}})
+        run_async(cleanup())
+
+def test_application_analytics():
+    """Test 23: Application analytics report send and response rates and validate their parameters"""
+    try:
+        response = requests.get(f"{API_URL}/applications/{TEST_USER_ID}/analytics", params={"top_companies": 5})
+        print_response(response)
+        
+        if response.status_code != 200 or "send_rate" not in response.json()["totals"]:
+            print("❌ Application analytics request failed")
+            return False
+        
+        invalid = [
+            requests.get(f"{API_URL}/applications/{TEST_USER_ID}/analytics", params=params).status_code
+            for params in ({"top_companies": 0}, {"top_companies": 1000}, {"since_days": 0})
+        ]
+        if invalid == [422, 422, 422]:
+            print("✅ Analytics returned and out-of-range parameters rejected")
+            return True
+        else:
+            print(f"❌ Out-of-range parameters returned {invalid}")
+            return False
+    except Exception as e:
+        print(f"❌ Error getting application analytics: {str(e)}")
+        return False
+
+def test_cover_letter_prompt_budget():
+    """Test 24: A posting with a very long requirements list still yields a prompt within the token budget"""
+    try:
+        srv = load_server()
+        long_posting = {
+            **sample_job_posting,
+            "job_description": " ".join(f"Sentence {i} about our data platform and analytics culture." for i in range(300)),
+            "requirements": [f"Experience with internal tool number {i} and its reporting workflows" for i in range(400)]
+        }
+        response = requests.post(f"{API_URL}/resume/{created_resume_id}/cover-letter", json=long_posting)
+        print_response(response)
+        
+        stats = requests.get(f"{API_URL}/llm/prompt-stats").json().get("cover_letter")
+        # The budget covers resume and job content; the fixed instructions come on top
+        limit = srv.COVER_LETTER_PROMPT_TOKEN_BUDGET + 600
+        if stats and stats["truncated"] >= 1 and stats["max_tokens"] <= limit:
+            print(f"✅ Largest cover letter prompt was {stats['max_tokens']} tokens")
+            return True
+        else:
+            print(f"❌ Cover letter prompt stats over the {limit} token limit: {stats}")
+            return False
+    except Exception as e:
+        print(f"❌ Error testing the cover letter prompt budget: {str(e)}")
+        return False
+
+def test_patch_resume_conflicts():
+    """Test 25: An empty patch with a stale base version is a conflict, an unknown resume is not found"""
+    try:
+        current = requests.get(f"{API_URL}/resume/{created_resume_id}").json()
+        stale = requests.patch(f"{API_URL}/resume/{created_resume_id}", json={"base_version": current["version"] - 1})
+        print_response(stale)
+        if stale.status_code != 409:
+            print("❌ Stale empty patch was not reported as a conflict")
+            return False
+        
+        missing = requests.patch(f"{API_URL}/resume/missing-{uuid.uuid4()}", json={"base_version": 1})
+        if missing.status_code == 404:
+            print("✅ Version conflicts and missing resumes are told apart")
+            return True
+        else:
+            print("❌ Patching an unknown resume was not a 404")
+            return False
+    except Exception as e:
+        print(f"❌ Error testing patch conflicts: {str(e)}")
+        return False
+
+def test_resume_export_revalidation():
+    """Test 26: Exports revalidate with a 304, change ETag after an edit and reject unknown formats"""
+    try:
+        export_url = f"{API_URL}/resume/{created_resume_id}/export"
+        response = requests.get(export_url, params={"format": "pdf"})
+        print(f"Status Code: {response.status_code}, {len(response.content)} bytes")
+        etag = response.headers.get("ETag")
+        if response.status_code != 200 or not etag or not response.content.startswith(b"%PDF"):
+            print("❌ PDF export failed")
+            return False
+        
+        if requests.get(export_url, params={"format": "pdf"}, headers={"If-None-Match": etag}).status_code != 304:
+            print("❌ Unchanged export was not a 304")
+            return False
+        
+        current = requests.get(f"{API_URL}/resume/{created_resume_id}").json()
+        requests.patch(f"{API_URL}/resume/{created_resume_id}", json={
+            "summary": current["summary"] + " Open to remote roles.",
+            "base_version": current["version"]
+        })
+        changed = requests.get(export_url, params={"format": "pdf"}, headers={"If-None-Match": etag})
+        if changed.status_code != 200 or changed.headers.get("ETag") == etag:
+            print("❌ Edited resume still revalidated against the old export")
+            return False
+        
+        if requests.get(export_url, params={"format": "odt"}).status_code == 400:
+            print("✅ Export revalidation follows resume edits and unknown formats are rejected")
+            return True
+        else:
+            print("❌ Unknown export format was not rejected")
+            return False
+    except Exception as e:
+        print(f"❌ Error testing export revalidation: {str(e)}")
+        return False
+
+def test_campaign_template_validation():
+    """Test 27: Unknown campaign placeholders are rejected when the campaign is created or loaded"""
+    srv = load_server()
+    try:
+        campaign_data = {
+            "user_id": TEST_USER_ID,
+            "campaign_name": "Broken Template Campaign",
+            "email_subject": "Application for {{ position }}",
+            "email_template": "Hello {{ recruiter }}, I would like to apply.",
+            "target_companies": ["Test Company"]
+        }
+        response = requests.post(f"{API_URL}/email/campaign", json=campaign_data)
+        if response.status_code != 422:
+            print("❌ Campaign with an unknown placeholder was not rejected")
+            print_response(response)
+            return False
+        
+        # A campaign stored before templates were checked at creation
+        legacy = srv.EmailCampaign(**campaign_data)
+        run_async(srv.db.email_campaigns.insert_one(legacy.dict()))
+        response = requests.post(f"{API_URL}/email/campaign/{legacy.id}/send")
+        print_response(response)
+        
+        if response.status_code == 422 and "recruiter" in response.json().get("detail", ""):
+            print("✅ Campaign templates are validated on creation and on load")
+            return True
+        else:
+            print("❌ Legacy campaign with an unknown placeholder was sent")
+            return False
+    except Exception as e:
+        print(f"❌ Error testing campaign template validation: {str(e)}")
+        return False
+
+def test_section_reanalysis():
+    """Test 28: An unchanged resume reuses its analysis and an unusable re-analysis is a 502"""
+    srv = load_server()
+    send_llm_message = srv.send_llm_message
+    try:
+        analyze_url = f"{API_URL}/resume/{created_resume_id}/analyze"
+        first = requests.post(analyze_url)
+        second = requests.post(analyze_url)
+        print_response(second)
+        if first.status_code != 200 or second.status_code != 200 or first.json()["id"] != second.json()["id"]:
+            print("❌ Unchanged resume was analyzed again")
+            return False
+        
+        async def unusable_response(session_id, message, hedge=False):
+            return "The resume looks fine."
+        
+        srv.send_llm_message = unusable_response
+        resume = srv.ResumeContent(**sample_resume)
+        cached = {"skills": {"score": 80.0}}
+        try:
+            run_async(srv.reanalyze_resume_sections_with_ai(resume, ["summary"], cached, {"section_results": cached}, srv.compute_section_hashes(resume)))
+        except srv.HTTPException as e:
+            if e.status_code == 502:
+                print("✅ Unchanged resumes reuse their analysis and unusable re-analyses are rejected")
+                return True
+        print("❌ Unusable re-analysis was not rejected")
+        return False
+    except Exception as e:
+        print(f"❌ Error testing section re-analysis: {str(e)}")
+        return False
+    finally:
+        srv.send_llm_message = send_llm_message
+
+def test_cover_letter_cache():
+    """Test 29: Repeated cover letters for the same resume and job come from the cache"""
+    try:
+        cover_letter_url = f"{API_URL}/resume/{created_resume_id}/cover-letter"
+        hits_before = requests.get(f"{API_URL}/cover-letters/cache-stats").json()["hits"]
+        first = requests.post(cover_letter_url, json=sample_job_posting)
+        second = requests.post(cover_letter_url, json=sample_job_posting)
+        print_response(second)
+        if (first.status_code != 200 or second.headers.get("X-Cache") != "HIT" or
+                first.json()["id"] != second.json()["id"]):
+            print("❌ Repeated cover letter was not served from the cache")
+            return False
+        
+        stats = requests.get(f"{API_URL}/cover-letters/cache-stats").json()
+        regenerated = requests.post(cover_letter_url, params={"regenerate": "true"}, json=sample_job_posting)
+        if (stats["hits"] <= hits_before or regenerated.headers.get("X-Cache") != "MISS" or
+                regenerated.json()["id"] != first.json()["id"]):
+            print("❌ Cache stats or regeneration were wrong")
+            print_response(regenerated)
+            return False
+        
+        missing = requests.post(f"{API_URL}/resume/{uuid.uuid4()}/cover-letter", json=sample_job_posting)
+        if missing.status_code == 404:
+            print("✅ Cover letters are cached per resume and job")
+            return True
+        else:
+            print("❌ Cover letter for an unknown resume was not a 404")
+            return False
+    except Exception as e:
+        print(f"❌ Error testing cover letter cache: {str(e)}")
+        return False
+
+def test_company_directory():
+    """Test 30: Company contacts resolve by normalized name or domain, with guessed addresses otherwise"""
+    srv = load_server()
+    try:
+        directory = srv.CompanyDirectory()
+        directory.add(srv.CompanyContact(company_name="Acme Robotics, Inc.", email_addresses=["talent@acmerobotics.com"]))
+        directory.add(srv.CompanyContact(company_name="Globex Labs", email_addresses=["hr@globex.com"], website="https://www.globexlabs.io"))
+        
+        by_name = directory.resolve("ACME Robotics Inc")
+        by_domain = directory.resolve_many(["Globex Corporation"])["Globex Corporation"]
+        if (not by_name or by_name.company_name != "Acme Robotics, Inc." or
+                not by_domain or by_domain.company_name != "Globex Labs" or "globexlabs.io" not in directory.by_domain):
+            print("❌ Known company contacts were not resolved")
+            return False
+        
+        if directory.resolve("Umbrella Corporation") is not None:
+            print("❌ Unknown company resolved to a contact")
+            return False
+        
+        if directory.recipient_emails("Umbrella Corporation") == ["hr@umbrella.com", "jobs@umbrella.com"]:
+            print("✅ Company directory resolves contacts and guesses addresses for unknown companies")
+            return True
+        else:
+            print("❌ Unknown company did not get guessed addresses")
+            return False
+    except Exception as e:
+        print(f"❌ Error testing company directory: {str(e)}")
+        return False
+
+def test_local_job_search():
+    """Test 31: Stored jobs are searched locally with totals and pages, and unknown sources are rejected"""
+    srv = load_server()
+    token = f"quokka{uuid.uuid4().hex[:8]}"
+
+    def stored_job(name):
+        job = srv.prepare_job_listing({
+            "external_id": f"{token}-{name}",
+            "title": f"{name} Analyst {token}",
+            "company": f"Local Search Test {name}",
+            "location": "Austin, TX",
+            "description": f"Build {name} reporting for the {token} team.",
+            "posted_date": srv.datetime.utcnow(),
+            "application_url": "https://example.com/apply",
+            "source": "test-board-a",
+        })
+        return {**job.dict(), "minhash": job.minhash}
+
+    try:
+        run_async(srv.db.jobs.insert_many([stored_job("Pricing"), stored_job("Revenue")]))
+        search = {"keywords": token, "source": "local", "limit": 1, "collapse_duplicates": False}
+        first = requests.post(f"{API_URL}/jobs/search", json={**search, "page": 1})
+        second = requests.post(f"{API_URL}/jobs/search", json={**search, "page": 2})
+        print_response(first)
+        if (first.status_code != 200 or second.status_code != 200 or
+                first.json()["total"] != 2 or first.json()["count"] != 1 or second.json()["page"] != 2 or
+                first.json()["jobs"][0]["id"] == second.json()["jobs"][0]["id"]):
+            print("❌ Local search did not page through the stored jobs")
+            return False
+        
+        response = requests.post(f"{API_URL}/jobs/search", json={"keywords": token, "source": "everywhere"})
+        if response.status_code == 400:
+            print("✅ Local job search is ranked and paginated, and unknown sources are rejected")
+            return True
+        else:
+            print("❌ Unknown search source was not rejected")
+            print_response(response)
+            return False
+    except Exception as e:
+        print(f"❌ Error testing local job search: {str(e)}")
+        return False
+
+def test_job_compaction():
+    """Test 32: Compaction archives applied-to jobs so they resolve after the hot copy expires"""
+    srv = load_server()
+    try:
+        job = srv.prepare_job_listing({
+            "external_id": f"compaction-{uuid.uuid4()}",
+            "title": "Support Engineer",
+            "company": "Compaction Test Co",
+            "location": "Remote",
+            "description": "Answer customer questions about the platform.",
+            "posted_date": srv.datetime.utcnow(),
+            "application_url": "https://example.com/apply",
+            "source": "test-board-a",
+        })
+
+        async def store_applied_job():
+            await srv.db.jobs.insert_one({**job.dict(), "minhash": job.minhash})
+            # An application written before applied-to jobs were archived
+            await srv.db.applications.insert_one({"id": str(uuid.uuid4()), "user_id": TEST_USER_ID, "job_id": job.id})
+
+        run_async(store_applied_job())
+        response = requests.post(f"{API_URL}/jobs/compact")
+        print_response(response)
+        if response.status_code != 200 or not {"archived", "hot_jobs", "archived_jobs"} <= set(response.json()):
+            print("❌ Job compaction failed")
+            return False
+
+        async def expire_and_find():
+            await srv.db.jobs.delete_one({"id": job.id})
+            return await srv.find_job(job.id), await srv.find_job(str(uuid.uuid4()))
+
+        archived, unknown = run_async(expire_and_find())
+        if archived and archived["title"] == "Support Engineer" and unknown is None:
+            print("✅ Applied-to jobs are archived and still resolve after expiring")
+            return True
+        else:
+            print("❌ Applied-to job was not found in the archive")
+            return False
+    except Exception as e:
+        print(f"❌ Error testing job compaction: {str(e)}")
+        return False
+
+def test_cache_backends():
+    """Test 33: Memory and disk caches expire and invalidate by tag, and backend failures are misses"""
+    srv = load_server()
+
+    class FailingBackend(srv.MemoryCacheBackend):
+        async def get(self, key):
+            raise ConnectionError("cache is down")
+
+    async def exercise(cache):
+        await cache.set("jobs", "page-1", {"jobs": [1, 2]}, tags=("jobs",))
+        await cache.set("jobs", "page-2", {"jobs": [3]}, tags=("jobs",))
+        await cache.set("jobs", "brief", {"jobs": []}, ttl=0.05)
+        hit = await cache.get("jobs", "page-1")
+        await asyncio.sleep(0.1)
+        expired = await cache.get("jobs", "brief")
+        await cache.invalidate("jobs", "jobs")
+        return hit, expired, await cache.get("jobs", "page-2")
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            backends = {
+                "memory": srv.MemoryCacheBackend(100),
+                "disk": srv.DiskCacheBackend(os.path.join(directory, "cache.sqlite3"), 100),
+            }
+            for name, backend in backends.items():
+                cache = srv.Cache(backend)
+                hit, expired, invalidated = run_async(exercise(cache))
+                if hit != {"jobs": [1, 2]} or expired is not None or invalidated is not None:
+                    print(f"❌ {name} cache returned stale entries")
+                    return False
+                if cache.stats["jobs"]["invalidated"] != 2:
+                    print(f"❌ {name} cache invalidated {cache.stats['jobs']['invalidated']} entries, expected 2")
+                    return False
+        
+        failing = srv.Cache(FailingBackend(100))
+        if run_async(failing.get("jobs", "page-1")) is None and failing.stats["jobs"]["errors"] == 1:
+            print("✅ Cache backends expire and invalidate entries, and failures are treated as misses")
+            return True
+        else:
+            print("❌ Cache backend failure was not treated as a miss")
+            return False
+    except Exception as e:
+        print(f"❌ Error testing cache backends: {str(e)}")
+        return False
+
+def test_resume_docx_export():
+    """Test 34: Resumes export to DOCX with either template, and unknown templates or resumes are rejected"""
+    try:
+        export_url = f"{API_URL}/resume/{created_resume_id}/export"
+        response = requests.get(export_url, params={"format": "docx", "template": "compact"})
+        print(f"Status Code: {response.status_code}, {len(response.content)} bytes")
+        if (response.status_code != 200 or not response.content.startswith(b"PK") or
+                ".docx" not in response.headers.get("Content-Disposition", "")):
+            print("❌ DOCX export failed")
+            return False
+        
+        if requests.get(export_url, params={"format": "docx", "template": "fancy"}).status_code != 400:
+            print("❌ Unknown export template was not rejected")
+            return False
+        
+        missing = requests.get(f"{API_URL}/resume/{uuid.uuid4()}/export", params={"format": "docx"})
+        if missing.status_code == 404:
+            print("✅ DOCX export works and unknown templates or resumes are rejected")
+            return True
+        else:
+            print("❌ Export of an unknown resume was not a 404")
+            return False
+    except Exception as e:
+        print(f"❌ Error testing DOCX export: {str(e)}")
+        return False
+
+def test_job_detail_extraction():
+    """Test 35: Ingested jobs get requirements, seniority, years and skills; vague postings get none"""
+    srv = load_server()
+    try:
+        details = srv.extract_job_details({
+            "title": "Data Engineer",
+            "description": "Join our platform team.\nRequirements:\n- 5+ years of experience building pipelines\n- Strong Python and SQL\n\nWe offer remote work.",
+        })
+        print(f"Extracted: {details}")
+        if (details["requirements"] != ["5+ years of experience building pipelines", "Strong Python and SQL"] or
+                details["min_years_experience"] != 5 or details["seniority"] != "senior" or
+                not {"Python", "SQL"} <= set(details["skills"])):
+            print("❌ Job details were not extracted")
+            return False
+        
+        if (srv.extract_seniority("Account Manager", None) is not None or
+                srv.extract_seniority("Staff Engineer", None) != "lead" or
+                srv.extract_seniority("Support Analyst", 1) != "junior"):
+            print("❌ Seniority was not inferred from the title and years")
+            return False
+        
+        vague = srv.extract_job_details({"title": "Team Member", "description": "Great culture and snacks."})
+        if vague["requirements"] == [] and vague["seniority"] is None and vague["min_years_experience"] is None:
+            print("✅ Job details are extracted at ingest and vague postings are left blank")
+            return True
+        else:
+            print(f"❌ Vague posting got details: {vague}")
+            return False
+    except Exception as e:
+        print(f"❌ Error testing job detail extraction: {str(e)}")
+        return False
+
+def test_user_data_export():
+    """Test 36: A user's data streams as NDJSON, gzipped on request, and unknown collections are rejected"""
+    try:
+        export_url = f"{API_URL}/user/{TEST_USER_ID}/export"
+        response = requests.get(export_url, params={"collections": "resumes"})
+        print(f"Status Code: {response.status_code}, {len(response.content)} bytes")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        if (response.status_code != 200 or not lines or
+                any(line["collection"] != "resumes" for line in lines) or
+                created_resume_id not in {line["id"] for line in lines}):
+            print("❌ NDJSON export of resumes failed")
+            return False
+        
+        compressed = requests.get(export_url, params={"collections": "resumes,analyses", "compress": "true"})
+        collections = {json.loads(line)["collection"] for line in gzip.decompress(compressed.content).splitlines()}
+        if compressed.status_code != 200 or collections != {"resumes", "analyses"}:
+            print(f"❌ Gzipped export had collections {collections}")
+            return False
+        
+        unknown = requests.get(export_url, params={"collections": "resumes,passwords"})
+        if unknown.status_code == 400:
+            print("✅ User data exports as NDJSON and unknown collections are rejected")
+            return True
+        else:
+            print("❌ Unknown export collection was not rejected")
+            print_response(unknown)
+            return False
+    except Exception as e:
+        print(f"❌ Error testing user data export: {str(e)}")
+        return False
+
+def test_profiling_admin_access():
+    """Test 37: Profiling needs the admin token; with it, a profiled request can be read back"""
+    srv = load_server()
+    try:
+        for headers in ({}, {"X-Admin-Token": "not-the-token"}):
+            response = requests.get(f"{API_URL}/admin/profiling", headers=headers)
+            if response.status_code != 403:
+                print("❌ Profiling settings were served without the admin token")
+                print_response(response)
+                return False
+        if "X-Profile-Id" in requests.get(f"{API_URL}/", headers={"X-Profile": "not-the-token"}).headers:
+            print("❌ Request was profiled without the admin token")
+            return False
+        
+        if not srv.ADMIN_TOKEN:
+            print("✅ Profiling is closed without ADMIN_TOKEN (not set, so profile reads were skipped)")
+            return True
+        profiled = requests.get(f"{API_URL}/", headers={"X-Profile": srv.ADMIN_TOKEN})
+        profile_id = profiled.headers.get("X-Profile-Id")
+        # Profiles are stored once the response has been sent
+        for _ in range(10):
+            response = requests.get(f"{API_URL}/admin/profiles/{profile_id}", headers={"X-Admin-Token": srv.ADMIN_TOKEN})
+            if response.status_code != 404:
+                break
+            time.sleep(0.2)
+        print_response(response)
+        
+        if response.status_code == 200 and response.json()["trigger"] == "header":
+            print("✅ Profiling is restricted to the admin token and profiles can be read back")
+            return True
+        else:
+            print("❌ Profiled request could not be read back")
+            return False
+    except Exception as e:
+        print(f"❌ Error testing profiling access: {str(e)}")
+        return False
+
 def run_all_tests():
     """Run all tests in sequence"""
     print("\n" + "="*80)
-    print(f"RESUME BUILDER API TEST SUITE")
+    print("RESUME BUILDER API TEST SUITE")
     print(f"Backend URL: {API_URL}")
     print("="*80 + "\n")
     
@@ -551,6 +1488,7 @@ def run_all_tests():
     run_test("Create Resume", test_create_resume)
     run_test("Get Resume", test_get_resume)
     run_test("Update Resume", test_update_resume)
+    run_test("Patch Resume", test_patch_resume)
     run_test("Analyze Resume", test_analyze_resume)
     run_test("Get Resume Analysis", test_get_resume_analysis)
     run_test("Generate Cover Letter", test_generate_cover_letter)
@@ -559,6 +1497,31 @@ def run_all_tests():
     run_test("Get Recent Jobs", test_get_recent_jobs)
     run_test("Job Application", test_job_application)
     run_test("Email Functionality (Resend API)", test_email_sending)
+    run_test("User Stats", test_user_stats)
+    run_test("Skill Extraction", test_skill_extraction)
+    run_test("Circuit Breaker Ignores Rejected Requests", test_circuit_breaker_rejections)
+    run_test("Analysis Compaction Keeps Stats", test_analysis_compaction_stats)
+    run_test("Job Dedupe Keeps Distinct Openings", test_job_dedupe_within_source)
+    run_test("Email Webhook Signatures", test_email_webhook_signatures)
+    run_test("Admission Body Peek Is Bounded", test_admission_body_peek)
+    run_test("Job Application Errors", test_job_application_errors)
+    run_test("Duplicate Index Picks Up Late Commits", test_duplicate_index_late_commits)
+    run_test("Crawler Leases And Watermarks", test_crawler_leases_and_watermarks)
+    run_test("Application Analytics", test_application_analytics)
+    run_test("Cover Letter Prompt Budget", test_cover_letter_prompt_budget)
+    run_test("Patch Resume Conflicts", test_patch_resume_conflicts)
+    run_test("Resume Export Revalidation", test_resume_export_revalidation)
+    run_test("Campaign Template Validation", test_campaign_template_validation)
+    run_test("Section Re-analysis", test_section_reanalysis)
+    run_test("Cover Letter Cache", test_cover_letter_cache)
+    run_test("Company Directory", test_company_directory)
+    run_test("Local Job Search", test_local_job_search)
+    run_test("Job Compaction", test_job_compaction)
+    run_test("Cache Backends", test_cache_backends)
+    run_test("Resume DOCX Export", test_resume_docx_export)
+    run_test("Job Detail Extraction", test_job_detail_extraction)
+    run_test("User Data Export", test_user_data_export)
+    run_test("Profiling Admin Access", test_profiling_admin_access)
     
     # Print summary
     print("\n" + "="*80)
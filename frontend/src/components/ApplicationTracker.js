@@ -6,6 +6,7 @@ const API = `${BACKEND_URL}/api`;
 
 function ApplicationTracker({ currentUser }) {
   const [applications, setApplications] = useState([]);
+  const [stats, setStats] = useState(null);
   const [loading, setLoading] = useState(true);
   const [filterStatus, setFilterStatus] = useState('all');
 
@@ -18,8 +19,12 @@ function ApplicationTracker({ currentUser }) {
   const fetchApplications = async () => {
     try {
       setLoading(true);
-      const response = await axios.get(`${API}/applications/${currentUser}`);
+      const [response, statsResponse] = await Promise.all([
+        axios.get(`${API}/applications/${currentUser}`),
+        axios.get(`${API}/user/${currentUser}/stats`)
+      ]);
       setApplications(response.data);
+      setStats(statsResponse.data);
     } catch (error) {
       console.error("Error fetching applications:", error);
     } finally {
@@ -137,24 +142,24 @@ function ApplicationTracker({ currentUser }) {
         {/* Stats */}
         <div className="grid grid-cols-1 md:grid-cols-4 gap-4 mb-6">
           <div className="bg-blue-50 rounded-lg p-4">
-            <div className="text-2xl font-bold text-blue-600">{applications.length}</div>
+            <div className="text-2xl font-bold text-blue-600">{stats ? stats.applications_total : applications.length}</div>
             <div className="text-sm text-blue-600">Total Applications</div>
           </div>
           <div className="bg-green-50 rounded-lg p-4">
             <div className="text-2xl font-bold text-green-600">
-              {applications.filter(app => app.status === 'sent').length}
+              {stats ? (stats.applications_by_status.sent || 0) : applications.filter(app => app.status === 'sent').length}
             </div>
             <div className="text-sm text-green-600">Sent</div>
           </div>
           <div className="bg-yellow-50 rounded-lg p-4">
             <div className="text-2xl font-bold text-yellow-600">
-              {applications.filter(app => app.status === 'pending').length}
+              {stats ? (stats.applications_by_status.pending || 0) : applications.filter(app => app.status === 'pending').length}
             </div>
             <div className="text-sm text-yellow-600">Pending</div>
           </div>
           <div className="bg-purple-50 rounded-lg p-4">
             <div className="text-2xl font-bold text-purple-600">
-              {applications.filter(app => app.email_sent).length}
+              {stats ? stats.application_emails_sent : applications.filter(app => app.email_sent).length}
             </div>
             <div className="text-sm text-purple-600">Emails Sent</div>
           </div>
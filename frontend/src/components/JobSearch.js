@@ -3,6 +3,8 @@ import axios from "axios";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+const REMOTE_PENDING_RETRIES = 3;
+const REMOTE_PENDING_DELAY_MS = 2000;
 
 function JobSearch({ selectedResume, onJobApplication }) {
   const [searchKeywords, setSearchKeywords] = useState("");
@@ -27,20 +29,33 @@ function JobSearch({ selectedResume, onJobApplication }) {
     }
   };
 
+  const searchJobs = (source) =>
+    axios.post(`${API}/jobs/search`, {
+      keywords: searchKeywords,
+      location: searchLocation || null,
+      salary_min: salaryMin ? parseFloat(salaryMin) : null,
+      limit: 20,
+      source
+    });
+
   const handleJobSearch = async (e) => {
     e.preventDefault();
     if (!searchKeywords.trim()) return;
 
     setLoading(true);
     try {
-      const response = await axios.post(`${API}/jobs/search`, {
-        keywords: searchKeywords,
-        location: searchLocation || null,
-        salary_min: salaryMin ? parseFloat(salaryMin) : null,
-        limit: 20
-      });
-
+      const response = await searchJobs("hybrid");
       setJobs(response.data.jobs || []);
+
+      // Job boards were still answering; their pages are stored as they arrive,
+      // so re-read stored jobs instead of starting another remote search
+      if (response.data.remote_pending) {
+        for (let attempt = 0; attempt < REMOTE_PENDING_RETRIES; attempt++) {
+          await new Promise((resolve) => setTimeout(resolve, REMOTE_PENDING_DELAY_MS));
+          const refreshed = await searchJobs("local");
+          setJobs(refreshed.data.jobs || []);
+        }
+      }
     } catch (error) {
       console.error("Error searching jobs:", error);
       alert("Error searching jobs. Please try again.");
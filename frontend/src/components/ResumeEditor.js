@@ -38,7 +38,14 @@ const ResumeEditor = ({ selectedResume, onResumeUpdate }) => {
 
     try {
       setSaving(true);
-      await axios.put(`${API}/resume/${selectedResume.id}`, resumeData);
+      // Only send the sections that differ from the stored resume
+      const changedSections = Object.keys(resumeData).reduce((changes, section) => {
+        if (JSON.stringify(resumeData[section]) !== JSON.stringify(selectedResume[section])) {
+          changes[section] = resumeData[section];
+        }
+        return changes;
+      }, {});
+      await axios.patch(`${API}/resume/${selectedResume.id}`, changedSections);
       setLastSaved(new Date());
       onResumeUpdate();
     } catch (error) {
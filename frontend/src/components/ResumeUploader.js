@@ -49,6 +49,7 @@ const ResumeUploader = ({ currentUser, onResumeUploaded }) => {
       const response = await axios.post(`${API}/resume/parse-upload`, formData, {
         headers: {
           'Content-Type': 'multipart/form-data',
+          'X-User-Id': currentUser,
         },
       });
       